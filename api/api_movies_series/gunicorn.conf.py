@@ -0,0 +1,13 @@
+# Multi-worker WSGI serving, e.g.:
+#
+#     gunicorn -c gunicorn.conf.py "movies_series:create_app()"
+#
+# The settings are shared by all services (common/gunicorn_settings.py).
+from common.gunicorn_settings import *  # noqa: F401,F403
+
+
+def post_worker_init(worker):
+    # Build the similarity index before the first /similar request needs it.
+    from movies_series import refresh_similarity_index
+
+    refresh_similarity_index()
@@ -1,33 +1,343 @@
+import logging
 import os
-import json
-
-from flask import Flask, jsonify, request
-from pymongo import MongoClient
-import redis
-
-
-app = Flask(__name__)
-app.config["JSON_SORT_KEYS"] = False
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from functools import partial
+
+import click
+from bson import ObjectId
+from flask import Blueprint, Flask, jsonify, request
+from pymongo import ASCENDING, IndexModel, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from common.backfill import Backfill
+from common.cache import (
+    append_ids,
+    cache_get,
+    cache_get_many,
+    cache_set,
+    cache_set_many,
+    cache_stats,
+    cached,
+    cached_fill,
+    cached_ids,
+    dumps,
+    execute,
+    invalidate_tags,
+    json_response,
+    loads,
+    local_entry,
+    make_entry,
+    namespace_tags,
+    namespace_version,
+    namespaced_key,
+    publish_invalidation,
+)
+from common.clients import LazyCollection, LazyRedis, register_health_routes
+from common.fields import canonical_fields, parse_fields
+from common.indexes import HotQuery, prepare_indexes, register_index_commands
+from common.logs import get_logger, log_event
+from common.metrics import register_metrics
+from common.movies import MOVIE_CARD_FIELDS, MOVIES_CACHE_NAMESPACE, movie_detail_key, movie_detail_tags
+from similarity import FIELD_WEIGHTS, SimilarityIndex
 
 
-client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"))
-db = client["api_movies_series"]
-movies_collection = db["movies_series"]
+bp = Blueprint("movies_series", __name__, cli_group=None)
+register_health_routes(bp)
+register_metrics(bp)
+log = get_logger("movies_series")
 
 
-r = redis.Redis(
-    host=os.environ.get("REDIS_HOST", "localhost"),
-    port=int(os.environ.get("REDIS_PORT", 6379)),
-    db=int(os.environ.get("REDIS_DB", 0)),
-)
+movies_collection = LazyCollection("api_movies_series", "movies_series")
+r = LazyRedis()
 
 CACHE_TTL_SECONDS = int(os.environ.get("CACHE_TTL_SECONDS", 60))
+CACHE_NAMESPACE = MOVIES_CACHE_NAMESPACE
 CACHE_KEYS = {
     "all": "movies_series_all",
     "movies": "movies_only",
     "series": "series_only",
 }
-MOVIE_DETAIL_CACHE_PREFIX = "movie_detail:"
+# Cache tags: an insert evicts the lists the title joins and the similar
+# titles it may rank in; cached details of other titles stay.
+LIST_TAGS = {"all": "list:all", "movies": "type:movie", "series": "type:series"}
+SIMILAR_TAG = "similar"
+# Full lists are cached as id lists that inserts append to (see write_through()).
+ID_LIST_TAGS = {"all": "ids:all", "movies": "ids:movie", "series": "ids:series"}
+# Detail presets cached as soon as a title is inserted.
+WRITE_THROUGH_FIELDS = ("full", "card")
+DEFAULT_PAGE_SIZE = int(os.environ.get("DEFAULT_PAGE_SIZE", 50))
+MAX_PAGE_SIZE = int(os.environ.get("MAX_PAGE_SIZE", 200))
+MAX_BATCH_IDS = int(os.environ.get("MAX_BATCH_IDS", 100))
+DEFAULT_SIMILAR = 10
+MAX_SIMILAR = 50
+SIMILARITY_REFRESH_SECONDS = float(os.environ.get("SIMILARITY_REFRESH_SECONDS", 60))
+# Titles inserted this long before the last refresh are looked at again, for
+# clock skew between workers and inserts in flight.
+SIMILARITY_CATCH_UP_MARGIN_SECONDS = 60
+BULK_CHUNK_SIZE = int(os.environ.get("BULK_CHUNK_SIZE", 1000))
+MAX_BULK_DOCUMENTS = int(os.environ.get("MAX_BULK_DOCUMENTS", 100000))
+NDJSON_MIMETYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+# Named projections for ?fields=; None means the whole document.
+FIELD_PRESETS = {
+    "card": MOVIE_CARD_FIELDS,
+    "full": None,
+}
+
+# The typed list a title is in ("movies" when imdb_type is "movie" in any
+# case, else "series"; see list_kind()), stored so that both lists are an
+# indexed equality match. Must be refreshed whenever imdb_type is written.
+LIST_KIND_FIELD = "list_kind"
+INTERNAL_FIELDS = {LIST_KIND_FIELD}
+
+MOVIES_FILTER = {LIST_KIND_FIELD: "movies"}
+SERIES_FILTER = {LIST_KIND_FIELD: "series"}
+LIST_FILTERS = {"movies": MOVIES_FILTER, "series": SERIES_FILTER}
+# The titles of each typed list that the list_kind backfill has not reached
+# yet, by the imdb_type list_kind() reads.
+MOVIE_TYPE_PATTERN = re.compile(r"^movie$", re.IGNORECASE)
+UNKINDED_FILTERS = {
+    "movies": {LIST_KIND_FIELD: {"$exists": False}, "imdb_type": MOVIE_TYPE_PATTERN},
+    "series": {LIST_KIND_FIELD: {"$exists": False}, "imdb_type": {"$not": MOVIE_TYPE_PATTERN}},
+}
+
+
+def detail_query(movie_id):
+    return {"$or": [{"_id": movie_id}, {"imdb_id": movie_id}]}
+
+
+# Pages are walked in _id order (always indexed); with an equality match on
+# list_kind, the compound index returns the typed lists in that same order
+# without an in-memory sort.
+INDEX_REGISTRY = [
+    (
+        movies_collection,
+        [
+            IndexModel([("imdb_id", ASCENDING)]),
+            IndexModel([(LIST_KIND_FIELD, ASCENDING), ("_id", ASCENDING)]),
+        ],
+        [
+            HotQuery("detail by _id or imdb_id", detail_query("tt0000000")),
+            HotQuery(
+                "batch by _id or imdb_id",
+                {"$or": [{"_id": {"$in": ["tt0000000"]}}, {"imdb_id": {"$in": ["tt0000000"]}}]},
+            ),
+            HotQuery("movies list", MOVIES_FILTER),
+            HotQuery("series list", SERIES_FILTER),
+            HotQuery("list page", {"_id": {"$gt": "ms000000000000"}}, [("_id", ASCENDING)]),
+            HotQuery(
+                "series page",
+                {"$and": [SERIES_FILTER, {"_id": {"$gt": "ms000000000000"}}]},
+                [("_id", ASCENDING)],
+            ),
+        ],
+    ),
+]
+register_index_commands(bp, INDEX_REGISTRY)
+
+
+def backfill_list_kinds(refresh_all=False):
+    """Migration: store list_kind on titles written before the field existed."""
+    query = {} if refresh_all else {LIST_KIND_FIELD: {"$exists": False}}
+    updates = []
+    for document in movies_collection.find(query, {"imdb_type": 1, LIST_KIND_FIELD: 1}):
+        kind = list_kind(document)
+        if document.get(LIST_KIND_FIELD) != kind:
+            updates.append(UpdateOne({"_id": document["_id"]}, {"$set": {LIST_KIND_FIELD: kind}}))
+    if updates:
+        movies_collection.bulk_write(updates, ordered=False)
+    return len(updates)
+
+
+list_kinds_backfill = Backfill("list_kind", backfill_list_kinds)
+
+
+def list_filter(kind):
+    """
+    Filter of the typed list `kind`. While the list_kind backfill is
+    pending it also matches the titles still missing the field, so a list
+    is never served (or cached) without them.
+    """
+    if list_kinds_backfill.pending:
+        return {"$or": [LIST_FILTERS[kind], UNKINDED_FILTERS[kind]]}
+    return LIST_FILTERS[kind]
+
+
+@bp.cli.command("backfill-list-kinds")
+def backfill_list_kinds_command():
+    """Recompute list_kind on every title."""
+    click.echo(f"updated {backfill_list_kinds(refresh_all=True)} titles")
+
+
+def prepare_database():
+    prepare_indexes(INDEX_REGISTRY)
+    list_kinds_backfill.start()
+
+
+similarity_index = SimilarityIndex()
+SIMILARITY_PROJECTION = {field: 1 for field in ("imdb_id", *FIELD_WEIGHTS)}
+# The refresh thread of this process, and when the index last matched the catalog.
+_similarity_refresh = {"thread": None, "synced_at": None}
+_similarity_refresh_lock = threading.Lock()
+
+
+def get_similarity_index():
+    """
+    Return the similarity index. It is refreshed in the background every
+    SIMILARITY_REFRESH_SECONDS while requests keep using the current one;
+    only the very first use waits for the index to be built.
+    """
+    if similarity_index.signature is None:
+        refresh_similarity_index(wait=True)
+    elif similarity_index.is_stale(SIMILARITY_REFRESH_SECONDS):
+        refresh_similarity_index()
+    return similarity_index
+
+
+def refresh_similarity_index(wait=False):
+    """Start sync_similarity_index() in a background thread unless one is running; `wait` joins it."""
+    with _similarity_refresh_lock:
+        thread = _similarity_refresh["thread"]
+        if thread is None or not thread.is_alive():
+            similarity_index.touch()
+            thread = threading.Thread(target=sync_similarity_index, name="similarity-refresh", daemon=True)
+            _similarity_refresh["thread"] = thread
+            thread.start()
+    if wait:
+        thread.join()
+
+
+def sync_similarity_index():
+    """
+    Bring the similarity index up to date with the catalog. Titles other
+    workers inserted are found by the time in their ObjectId and added
+    incrementally; the catalog is only indexed from scratch on first use or
+    when that does not account for the collection's count (e.g. titles
+    inserted with ids of their own).
+    """
+    started = datetime.now(timezone.utc)
+    try:
+        signature = movies_collection.estimated_document_count()
+        if signature == similarity_index.signature:
+            return
+
+        if similarity_index.signature is not None:
+            since = _similarity_refresh["synced_at"] - timedelta(seconds=SIMILARITY_CATCH_UP_MARGIN_SECONDS)
+            query = {"_id": {"$gte": ObjectId.from_datetime(since)}}
+            documents = list(movies_collection.find(query, SIMILARITY_PROJECTION))
+            similarity_index.add_many(documents)
+            if len(similarity_index) >= signature:
+                similarity_index.signature = signature
+                _similarity_refresh["synced_at"] = started
+                log_event(log, "similarity_index_caught_up", sample=True, titles=len(similarity_index))
+                return
+
+        similarity_index.build(movies_collection.find({}, SIMILARITY_PROJECTION), signature)
+        _similarity_refresh["synced_at"] = started
+        log_event(log, "similarity_index_rebuilt", titles=len(similarity_index))
+    except PyMongoError as exc:
+        log_event(log, "similarity_refresh_failed", logging.WARNING, error=str(exc))
+
+
+def index_new_document(document):
+    """Add a title inserted by this worker without rebuilding the index."""
+    if similarity_index.signature is not None:
+        similarity_index.add(document)
+        similarity_index.signature += 1
+
+
+def index_new_documents(documents):
+    if similarity_index.signature is not None:
+        similarity_index.add_many(documents)
+        similarity_index.signature += len(documents)
+
+
+def movies_cache_key(*parts, version=None):
+    if version is None:
+        version = namespace_version(r, CACHE_NAMESPACE)
+    return namespaced_key(CACHE_NAMESPACE, version, *parts)
+
+
+def movie_tags(*tags):
+    return namespace_tags(CACHE_NAMESPACE, *tags)
+
+
+def list_kind(document):
+    """The typed list a title is in, from its imdb_type (see LIST_KIND_FIELD)."""
+    return "movies" if str(document.get("imdb_type") or "").lower() == "movie" else "series"
+
+
+def type_tag(document):
+    return LIST_TAGS[list_kind(document)]
+
+
+def insert_tags(documents):
+    tags = {LIST_TAGS["all"], SIMILAR_TAG, *(type_tag(document) for document in documents)}
+    return movie_tags(*sorted(tags))
+
+
+def invalidate_cache(documents):
+    """Evict the cached pages and similar titles that inserting `documents` changes."""
+    invalidate_tags(r, insert_tags(documents))
+
+
+def detail_key(fields_key, movie_id, version=None):
+    if version is None:
+        version = namespace_version(r, CACHE_NAMESPACE)
+    return movie_detail_key(fields_key, movie_id, version)
+
+
+def ids_key(kind, version=None):
+    return movies_cache_key(CACHE_KEYS[kind], "ids", version=version)
+
+
+def ids_tag(kind):
+    return movie_tags(ID_LIST_TAGS[kind])[0]
+
+
+def detail_value(document, fields_key):
+    """A serialized title as its FIELD_PRESETS[fields_key] projection reads it from Mongo."""
+    fields = FIELD_PRESETS[fields_key]
+    value = {"_id": document["_id"]}
+    value.update(
+        (key, item) for key, item in document.items() if key != "_id" and (fields is None or key in fields)
+    )
+    return value
+
+
+def write_through(documents):
+    """
+    Cache freshly inserted titles: write their WRITE_THROUGH_FIELDS details
+    and append their ids to the cached id lists they join, in one round
+    trip whatever the size of the lists. Pages and similar titles are
+    still evicted by invalidate_cache().
+    """
+    version = namespace_version(r, CACHE_NAMESPACE)
+    pipe = r.pipeline(transaction=False)
+    appended = {"all": []}
+    for document in map(serialize_document, documents):
+        for fields_key in WRITE_THROUGH_FIELDS:
+            cache_set(
+                r,
+                detail_key(fields_key, document["_id"], version),
+                detail_value(document, fields_key),
+                CACHE_TTL_SECONDS,
+                pipe=pipe,
+                tags=movie_detail_tags(document["_id"]),
+                local=False,
+            )
+        appended["all"].append(document["_id"])
+        appended.setdefault(list_kind(document), []).append(document["_id"])
+    for kind, ids in appended.items():
+        append_ids(pipe, ids_key(kind, version), ids, ids_tag(kind))
+    if execute(pipe) is None:
+        # The lists may have missed the appends: drop them rather than serve them short.
+        invalidate_tags(r, [ids_tag(kind) for kind in appended])
+    # Workers drop the ids and the responses assembled from them from L1.
+    publish_invalidation(r, prefixes=[movies_cache_key(CACHE_KEYS[kind], version=version) + ":" for kind in appended])
+
 
 def build_payload(data, forced_type=None):
     if not data or not isinstance(data, dict) or "title" not in data:
@@ -38,6 +348,7 @@ def build_payload(data, forced_type=None):
         payload["imdb_type"] = forced_type
     else:
         payload.setdefault("imdb_type", "Movie")
+    payload[LIST_KIND_FIELD] = list_kind(payload)
     return payload
 
 
@@ -47,6 +358,8 @@ def serialize_document(doc):
 
     serialized = {}
     for key, value in doc.items():
+        if key in INTERNAL_FIELDS:
+            continue
         if key == "_id":
             serialized[key] = str(value)
         else:
@@ -54,91 +367,358 @@ def serialize_document(doc):
     return serialized
 
 
-def fetch_documents(filter_query=None):
-    items = movies_collection.find(filter_query or {})
+def ndjson_items(lines):
+    """(index, item, error) per non-blank line of an NDJSON body."""
+    index = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            item, error = loads(line), None
+        except ValueError:
+            item, error = None, "invalid JSON"
+        yield index, item, error
+        index += 1
+
+
+def read_bulk_items():
+    """
+    (index, item, error) for every document of the request body: a JSON
+    array, or with an NDJSON content type one document per line, read as it
+    streams in. Raises ValueError when the body is neither.
+    """
+    if request.mimetype in NDJSON_MIMETYPES:
+        return ndjson_items(request.stream)
+    items = request.get_json(silent=True)
+    if not isinstance(items, list):
+        raise ValueError("please provide a JSON array of documents or NDJSON")
+    return ((index, item, None) for index, item in enumerate(items))
+
+
+def bulk_chunks(items):
+    """
+    Validate bulk items with build_payload and yield them in chunks of
+    BULK_CHUNK_SIZE: (payloads, their item indexes, errors of the rejected items).
+    """
+    payloads, indexes, errors = [], [], []
+    for index, item, error in items:
+        if index >= MAX_BULK_DOCUMENTS:
+            errors.append({"index": index, "error": f"at most {MAX_BULK_DOCUMENTS} documents per request"})
+            break
+        payload = None if error else build_payload(item)
+        if payload is None:
+            errors.append({"index": index, "error": error or "please provide at least a title"})
+            continue
+        payloads.append(payload)
+        indexes.append(index)
+        if len(payloads) >= BULK_CHUNK_SIZE:
+            yield payloads, indexes, errors
+            payloads, indexes, errors = [], [], []
+    if payloads or errors:
+        yield payloads, indexes, errors
+
+
+def chunk_outcome(payloads, indexes, exc=None):
+    """
+    Split an unordered insert_many chunk into the inserted documents and the
+    errors of the ones its BulkWriteError `exc` rejected.
+    """
+    failed = {}
+    if exc is not None:
+        failed = {error["index"]: error.get("errmsg", "write failed") for error in exc.details.get("writeErrors", [])}
+    inserted = [payload for position, payload in enumerate(payloads) if position not in failed]
+    errors = [{"index": indexes[position], "error": message} for position, message in failed.items()]
+    return inserted, errors
+
+
+def abort_bulk(chunks, indexes, exc):
+    """
+    Errors of a bulk insert stopped by a chunk that failed outright (`exc`,
+    e.g. Mongo unreachable): that chunk's documents at `indexes`, which may
+    or may not be stored, and those of the remaining `chunks`, never sent.
+    """
+    errors = [{"index": index, "error": f"insert failed, the document may not be stored: {exc}"} for index in indexes]
+    for _, remaining, rejected in chunks:
+        errors.extend(rejected)
+        errors.extend({"index": index, "error": "not inserted, an earlier chunk failed"} for index in remaining)
+    return errors
+
+
+def bulk_result(inserted, errors, aborted=False):
+    """
+    Response body and status of a bulk insert; one `aborted` by a failed
+    chunk answers 207 when earlier chunks were stored, 500 otherwise.
+    """
+    body = {
+        "inserted": len(inserted),
+        "failed": len(errors),
+        "ids": [str(document["_id"]) for document in inserted],
+        "errors": sorted(errors, key=lambda error: error["index"]),
+    }
+    if aborted:
+        body["error"] = "the bulk insert stopped at a failed chunk"
+        return body, 207 if inserted else 500
+    return body, 201 if inserted else 400
+
+
+def fetch_documents(filter_query=None, projection=None):
+    items = movies_collection.find(filter_query or {}, projection)
     return [serialize_document(item) for item in items]
 
-def fetch_single(movie_id):
-    cache_key = f"{MOVIE_DETAIL_CACHE_PREFIX}{movie_id}"
-    cached = r.get(cache_key)
-    if cached:
-        print("movie detail cache hit!")
-        return json.loads(cached)
 
-    query = {"$or": [{"_id": movie_id}, {"imdb_id": movie_id}]}
-    document = movies_collection.find_one(query)
+def cache_details(documents, fields_key, version=None):
+    """Cache serialized `documents` as their `fields_key` details, outside L1; returns {_id: CacheEntry}."""
+    keys = {document["_id"]: detail_key(fields_key, document["_id"], version) for document in documents}
+    entries = cache_set_many(
+        r,
+        {keys[document["_id"]]: document for document in documents},
+        CACHE_TTL_SECONDS,
+        tags={keys[document["_id"]]: movie_detail_tags(document["_id"]) for document in documents},
+        local=False,
+    )
+    return {movie_id: entries[key] for movie_id, key in keys.items()}
+
+
+def similar_limit(value):
+    try:
+        limit = int(value or DEFAULT_SIMILAR)
+    except ValueError:
+        limit = DEFAULT_SIMILAR
+    return min(max(limit, 1), MAX_SIMILAR)
+
+
+# Query parameters of /similar responses, with their canonical forms.
+SIMILAR_QUERY = {"fields": partial(canonical_fields, FIELD_PRESETS), "limit": similar_limit}
+
+
+def parse_page_args(args=None):
+    """Return (after, limit) when the request asks for a page, else None."""
+    args = request.args if args is None else args
+    after = args.get("after")
+    limit_param = args.get("limit")
+    if after is None and limit_param is None:
+        return None
+
+    try:
+        limit = int(limit_param) if limit_param else DEFAULT_PAGE_SIZE
+    except ValueError:
+        limit = DEFAULT_PAGE_SIZE
+    return after or None, min(max(limit, 1), MAX_PAGE_SIZE)
+
+
+def build_cursor_filter(after):
+    # Seeded titles use string ids while API inserts get ObjectIds; Mongo sorts
+    # strings before ObjectIds, so a string cursor must also let them through.
+    if ObjectId.is_valid(after):
+        return {"_id": {"$gt": ObjectId(after)}}
+    return {"$or": [{"_id": {"$gt": after}}, {"_id": {"$type": "objectId"}}]}
+
+
+def page_query(filter_query, after):
+    query = filter_query or {}
+    if after:
+        cursor_filter = build_cursor_filter(after)
+        query = {"$and": [query, cursor_filter]} if query else cursor_filter
+    return query
+
+
+def page_payload(documents, limit):
+    """Page body from up to limit + 1 serialized documents."""
+    has_more = len(documents) > limit
+    documents = documents[:limit]
+    return {
+        "items": documents,
+        "next_cursor": documents[-1]["_id"] if has_more else None,
+        "limit": limit,
+    }
+
+
+def fetch_page(filter_query, after, limit, projection=None):
+    query = page_query(filter_query, after)
+    items = movies_collection.find(query, projection).sort("_id", ASCENDING).limit(limit + 1)
+    return page_payload([serialize_document(item) for item in items], limit)
+
+
+def list_response(kind, filter_query=None):
+    try:
+        fields_key, projection = parse_fields(FIELD_PRESETS)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    page_args = parse_page_args()
+    if page_args is None:
+        return json_response(list_entry(kind, filter_query, fields_key, projection))
+
+    after, limit = page_args
+
+    def load_page():
+        log_event(log, "page_cache_miss", sample=True, kind=kind)
+        return fetch_page(filter_query, after, limit, projection)
+
+    cache_key = movies_cache_key(CACHE_KEYS[kind], fields_key, "page", after or "start", limit)
+    return json_response(cached_fill(r, cache_key, CACHE_TTL_SECONDS, load_page, movie_tags(LIST_TAGS[kind])))
+
+
+def list_entry(kind, filter_query, fields_key, projection):
+    """
+    The whole list `kind`, assembled from its cached id list and the cached
+    details of its titles. Inserts append to the id list, so it stays warm;
+    the assembled body is only kept in L1.
+    """
+    version = namespace_version(r, CACHE_NAMESPACE)
+    filled = {}
+
+    def load_ids():
+        log_event(log, "list_cache_miss", sample=True, kind=kind)
+        filled.update(cache_details(fetch_documents(filter_query, projection), fields_key, version))
+        return list(filled)
+
+    def assemble():
+        ids = cached_ids(r, ids_key(kind, version), CACHE_TTL_SECONDS, load_ids, ids_tag(kind))
+        # A title inserted while the list was filled may also have been appended.
+        ids = list(dict.fromkeys(ids))
+        found = filled or fetch_many(ids, fields_key, projection, local=False)
+        return make_entry(b"[" + b",".join(found[movie_id].body for movie_id in ids if movie_id in found) + b"]")
+
+    return local_entry(r, movies_cache_key(CACHE_KEYS[kind], fields_key, version=version), assemble)
+
+
+def fetch_single(movie_id, fields_key="full", projection=None):
+    """Return the cache entry of one title, or None when it does not exist."""
+    cache_key = detail_key(fields_key, movie_id)
+    entry = cache_get(r, cache_key)
+    if entry is not None:
+        return entry
+
+    document = movies_collection.find_one(detail_query(movie_id), projection)
     if not document:
         return None
 
-    serialized = serialize_document(document)
-    r.setex(cache_key, CACHE_TTL_SECONDS, json.dumps(serialized))
-    return serialized
+    return cache_set(r, cache_key, serialize_document(document), CACHE_TTL_SECONDS, tags=movie_detail_tags(document["_id"]))
+
+
+def fetch_many(movie_ids, fields_key="full", projection=None, local=True):
+    """
+    Resolve many _id/imdb_id values to cache entries with one MGET and one
+    $in query. Without `local` the entries are not kept in L1.
+    """
+    version = namespace_version(r, CACHE_NAMESPACE)
+    cache_keys = [detail_key(fields_key, movie_id, version) for movie_id in movie_ids]
+    found = {}
+    for movie_id, entry in zip(movie_ids, cache_get_many(r, cache_keys, local=local)):
+        if entry is not None:
+            found[movie_id] = entry
+
+    misses = {movie_id for movie_id in movie_ids if movie_id not in found}
+    if not misses:
+        return found
+
+    id_values = list(misses) + [ObjectId(value) for value in misses if ObjectId.is_valid(value)]
+    query = {"$or": [{"_id": {"$in": id_values}}, {"imdb_id": {"$in": list(misses)}}]}
+    # imdb_id is needed to map documents back to the requested ids; it is
+    # dropped again when the projection did not ask for it.
+    mapping_only = bool(projection) and "imdb_id" not in projection
+    if mapping_only:
+        projection = {**projection, "imdb_id": 1}
+    loaded = {}
+    for document in movies_collection.find(query, projection):
+        serialized = serialize_document(document)
+        movie_ids = (serialized["_id"], serialized.pop("imdb_id", None) if mapping_only else serialized.get("imdb_id"))
+        for movie_id in movie_ids:
+            if movie_id in misses and movie_id not in loaded:
+                loaded[movie_id] = serialized
+
+    keys = {movie_id: detail_key(fields_key, movie_id, version) for movie_id in loaded}
+    entries = cache_set_many(
+        r,
+        {keys[movie_id]: value for movie_id, value in loaded.items()},
+        CACHE_TTL_SECONDS,
+        tags={keys[movie_id]: movie_detail_tags(value["_id"]) for movie_id, value in loaded.items()},
+        local=local,
+    )
+    found.update((movie_id, entries[keys[movie_id]]) for movie_id in loaded)
+    return found
 
-def invalidate_detail_cache():
-    pattern = f"{MOVIE_DETAIL_CACHE_PREFIX}*"
-    for key in r.scan_iter(pattern):
-        r.delete(key)
 
+@bp.route("/cache/stats", methods=["GET"])
+def get_cache_stats():
+    return jsonify(cache_stats())
 
-@app.route("/movies-series", methods=["GET"])
+
+@bp.route("/movies-series", methods=["GET"])
 def get_movies_series():
-    cache_key = CACHE_KEYS["all"]
-    cached = r.get(cache_key)
-    if cached:
-        print("cache hit!")
-        return jsonify(json.loads(cached))
+    return list_response("all")
+
+
+@bp.route("/movies-series/batch", methods=["GET"])
+def get_movie_batch():
+    movie_ids = [value.strip() for value in request.args.get("ids", "").split(",")]
+    movie_ids = [value for value in movie_ids if value]
+    if not movie_ids:
+        return jsonify({"error": "please provide ids"}), 400
+
+    unique_ids = list(dict.fromkeys(movie_ids))
+    if len(unique_ids) > MAX_BATCH_IDS:
+        return jsonify({"error": f"at most {MAX_BATCH_IDS} ids per request"}), 400
+
+    try:
+        fields_key, projection = parse_fields(FIELD_PRESETS)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
 
-    print("cache miss Fetching from MongoDB...")
-    items = fetch_documents()
-    r.setex(cache_key, CACHE_TTL_SECONDS, json.dumps(items))
-    return jsonify(items)
+    # Cached details are spliced into the response without being decoded.
+    found = fetch_many(unique_ids, fields_key, projection)
+    items = b",".join(found[movie_id].body if movie_id in found else b"null" for movie_id in movie_ids)
+    not_found = dumps([movie_id for movie_id in unique_ids if movie_id not in found])
+    return json_response(make_entry(b'{"items":[' + items + b'],"not_found":' + not_found + b"}"))
 
 
-@app.route("/movies-series/<movie_id>", methods=["GET"])
+@bp.route("/movies-series/<movie_id>", methods=["GET"])
 def get_movie_detail(movie_id):
-    document = fetch_single(movie_id)
-    if not document:
+    try:
+        fields_key, projection = parse_fields(FIELD_PRESETS)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    document = fetch_single(movie_id, fields_key, projection)
+    if document is None:
         return jsonify({"error": "Movie not found"}), 404
 
-    return jsonify(document)
+    return json_response(document)
 
 
-@app.route("/movies", methods=["GET"])
-def get_movies():
-    cache_key = CACHE_KEYS["movies"]
-    cached = r.get(cache_key)
-    if cached:
-        print("cache hit!")
-        return jsonify(json.loads(cached))
+# Per title; every insert evicts them, as a new title may rank.
+@bp.route("/movies-series/<movie_id>/similar", methods=["GET"])
+@cached(CACHE_NAMESPACE, CACHE_TTL_SECONDS, query=SIMILAR_QUERY, tags=movie_tags(SIMILAR_TAG))
+def get_similar(movie_id):
+    try:
+        fields_key, projection = parse_fields(FIELD_PRESETS)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    limit = similar_limit(request.args.get("limit"))
+
+    matches = get_similarity_index().similar(movie_id, limit)
+    if matches is None:
+        return jsonify({"error": "Movie not found"}), 404
+    found = fetch_many([other for other, _ in matches], fields_key, projection)
+    return [
+        {**loads(found[other].body), "score": round(score, 4)}
+        for other, score in matches
+        if other in found
+    ]
 
-    print("cache miss Fetching from MongoDB...")
-    items = fetch_documents({"imdb_type": {"$regex": "^movie$", "$options": "i"}})
-    r.setex(cache_key, CACHE_TTL_SECONDS, json.dumps(items))
-    return jsonify(items)
+
+@bp.route("/movies", methods=["GET"])
+def get_movies():
+    return list_response("movies", list_filter("movies"))
 
 
-@app.route("/series", methods=["GET"])
+@bp.route("/series", methods=["GET"])
 def get_series():
-    cache_key = CACHE_KEYS["series"]
-    cached = r.get(cache_key)
-    if cached:
-        print("cache hit!")
-        return jsonify(json.loads(cached))
-
-    print("cache miss Fetching from MongoDB...")
-    items = fetch_documents(
-        {
-            "$or": [
-                {"imdb_type": {"$regex": "^tv", "$options": "i"}},
-                {"imdb_type": {"$not": {"$regex": "^movie$", "$options": "i"}}},
-            ]
-        }
-    )
-    r.setex(cache_key, CACHE_TTL_SECONDS, json.dumps(items))
-    return jsonify(items)
+    return list_response("series", list_filter("series"))
 
 
-@app.route("/movies-series", methods=["POST"])
+@bp.route("/movies-series", methods=["POST"])
 def add_movies_series():
     payload = build_payload(request.get_json(silent=True))
     if not payload:
@@ -146,12 +726,54 @@ def add_movies_series():
 
     result = movies_collection.insert_one(payload)
     document = movies_collection.find_one({"_id": result.inserted_id})
-    r.delete(*CACHE_KEYS.values())
-    invalidate_detail_cache()
+    write_through([document])
+    invalidate_cache([document])
+    index_new_document(document)
     return jsonify(serialize_document(document)), 201
 
 
-@app.route("/movies", methods=["POST"])
+# Unordered insert_many and write-through per chunk, one invalidation for the
+# whole request; documents are not read back, their ids are returned instead.
+@bp.route("/movies-series/bulk", methods=["POST"])
+def bulk_add_movies_series():
+    try:
+        items = read_bulk_items()
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    inserted, errors, aborted = [], [], False
+    chunks = bulk_chunks(items)
+    try:
+        for payloads, indexes, rejected in chunks:
+            errors.extend(rejected)
+            if not payloads:
+                continue
+            try:
+                movies_collection.insert_many(payloads, ordered=False)
+                outcome = chunk_outcome(payloads, indexes)
+            except BulkWriteError as exc:
+                outcome = chunk_outcome(payloads, indexes, exc)
+            except PyMongoError as exc:
+                log_event(log, "bulk_chunk_failed", logging.ERROR, first_index=indexes[0], error=str(exc))
+                errors.extend(abort_bulk(chunks, indexes, exc))
+                aborted = True
+                break
+            if outcome[0]:
+                write_through(outcome[0])
+            inserted.extend(outcome[0])
+            errors.extend(outcome[1])
+    finally:
+        # Also when a later chunk fails outright: earlier ones are stored.
+        if inserted:
+            invalidate_cache(inserted)
+            index_new_documents(inserted)
+
+    log_event(log, "bulk_insert", inserted=len(inserted), failed=len(errors), aborted=aborted)
+    body, status = bulk_result(inserted, errors, aborted)
+    return jsonify(body), status
+
+
+@bp.route("/movies", methods=["POST"])
 def add_movies():
     payload = build_payload(request.get_json(silent=True), forced_type="Movie")
     if not payload:
@@ -159,12 +781,13 @@ def add_movies():
 
     result = movies_collection.insert_one(payload)
     document = movies_collection.find_one({"_id": result.inserted_id})
-    r.delete(*CACHE_KEYS.values())
-    invalidate_detail_cache()
+    write_through([document])
+    invalidate_cache([document])
+    index_new_document(document)
     return jsonify(serialize_document(document)), 201
 
 
-@app.route("/series", methods=["POST"])
+@bp.route("/series", methods=["POST"])
 def add_series():
     payload = build_payload(request.get_json(silent=True), forced_type="TVSeries")
     if not payload:
@@ -172,10 +795,20 @@ def add_series():
 
     result = movies_collection.insert_one(payload)
     document = movies_collection.find_one({"_id": result.inserted_id})
-    r.delete(*CACHE_KEYS.values())
-    invalidate_detail_cache()
+    write_through([document])
+    invalidate_cache([document])
+    index_new_document(document)
     return jsonify(serialize_document(document)), 201
 
 
+def create_app():
+    app = Flask(__name__)
+    app.config["JSON_SORT_KEYS"] = False
+    app.register_blueprint(bp)
+    if os.environ.get("PREPARE_DATABASE", "1") != "0":
+        prepare_database()
+    return app
+
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    create_app().run(host="0.0.0.0", port=5000, debug=os.environ.get("FLASK_DEBUG") == "1")
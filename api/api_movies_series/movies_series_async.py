@@ -0,0 +1,522 @@
+"""
+Async serving mode of the movies API: the routes and cache semantics of
+movies_series.py on Quart, async PyMongo and redis.asyncio, so a worker
+keeps serving other requests while one waits on Mongo or Redis.
+
+Run it with an ASGI server, e.g.:
+
+    hypercorn "movies_series_async:create_app()" --bind 0.0.0.0:5000
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError, PyMongoError
+from quart import Blueprint, Quart, Response, g, jsonify, request
+
+from common.cache import append_ids, cache_stats, dumps, loads, make_entry, namespaced_key, view_key_parts
+from common.cache_async import (
+    cache_get,
+    cache_get_many,
+    cache_set,
+    cache_set_many,
+    cached_fill,
+    cached_ids,
+    execute,
+    invalidate_tags,
+    json_response,
+    listen_for_invalidations,
+    local_entry,
+    namespace_version,
+    publish_invalidation,
+)
+from common.clients_async import LazyCollection, LazyRedis, register_health_routes
+from common.fields import parse_fields
+from common.logs import get_logger, log_event
+from common.metrics import (
+    current_route,
+    observe_request,
+    render_metrics,
+    route_of,
+)
+from common.movies import movie_detail_key, movie_detail_tags
+from movies_series import (
+    CACHE_KEYS,
+    CACHE_NAMESPACE,
+    CACHE_TTL_SECONDS,
+    FIELD_PRESETS,
+    LIST_TAGS,
+    MAX_BATCH_IDS,
+    NDJSON_MIMETYPES,
+    SIMILAR_QUERY,
+    SIMILAR_TAG,
+    SIMILARITY_CATCH_UP_MARGIN_SECONDS,
+    SIMILARITY_PROJECTION,
+    SIMILARITY_REFRESH_SECONDS,
+    WRITE_THROUGH_FIELDS,
+    abort_bulk,
+    build_payload,
+    bulk_chunks,
+    bulk_result,
+    chunk_outcome,
+    detail_query,
+    detail_value,
+    ids_tag,
+    insert_tags,
+    list_filter,
+    list_kind,
+    movie_tags,
+    ndjson_items,
+    page_payload,
+    page_query,
+    parse_page_args,
+    prepare_database,
+    serialize_document,
+    similar_limit,
+)
+from similarity import SimilarityIndex
+
+
+bp = Blueprint("movies_series_async", __name__)
+register_health_routes(bp)
+log = get_logger("movies_series_async")
+
+
+movies_collection = LazyCollection("api_movies_series", "movies_series")
+r = LazyRedis()
+
+similarity_index = SimilarityIndex()
+# The refresh task of this process, and when the index last matched the catalog.
+_similarity_refresh = {"task": None, "synced_at": None}
+_background = set()
+
+
+class MovieNotFound(Exception):
+    """Unknown title in a cache fill; the 404 is not cached, as in the sync app."""
+
+
+@bp.before_app_serving
+async def start_invalidation_listener():
+    task = asyncio.get_running_loop().create_task(listen_for_invalidations(r))
+    _background.add(task)
+
+
+@bp.after_app_serving
+async def stop_invalidation_listener():
+    for task in _background:
+        task.cancel()
+
+
+# Every request runs in its own context, so the route stays with its task.
+@bp.before_app_request
+async def start_request_timer():
+    g.request_started = time.perf_counter()
+    current_route.set(route_of(request.url_rule))
+
+
+@bp.after_app_request
+async def record_request(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        observe_request(request.method, response.status_code, time.perf_counter() - started, response.content_length)
+    return response
+
+
+async def movies_cache_key(*parts, version=None):
+    if version is None:
+        version = await namespace_version(r, CACHE_NAMESPACE)
+    return namespaced_key(CACHE_NAMESPACE, version, *parts)
+
+
+async def fetch_documents(filter_query=None, projection=None):
+    return [serialize_document(item) async for item in movies_collection.find(filter_query or {}, projection)]
+
+
+async def cache_details(documents, fields_key, version):
+    keys = {
+        movie_id: movie_detail_key(fields_key, movie_id, version)
+        for movie_id in (document["_id"] for document in documents)
+    }
+    entries = await cache_set_many(
+        r,
+        {keys[document["_id"]]: document for document in documents},
+        CACHE_TTL_SECONDS,
+        tags={keys[document["_id"]]: movie_detail_tags(document["_id"]) for document in documents},
+        local=False,
+    )
+    return {movie_id: entries[key] for movie_id, key in keys.items()}
+
+
+async def fetch_page(filter_query, after, limit, projection=None):
+    cursor = movies_collection.find(page_query(filter_query, after), projection)
+    items = cursor.sort("_id", ASCENDING).limit(limit + 1)
+    return page_payload([serialize_document(item) async for item in items], limit)
+
+
+async def list_response(kind, filter_query=None):
+    try:
+        fields_key, projection = parse_fields(FIELD_PRESETS, request.args)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    page_args = parse_page_args(request.args)
+    if page_args is None:
+        return await json_response(await list_entry(kind, filter_query, fields_key, projection))
+
+    after, limit = page_args
+
+    async def load_page():
+        log_event(log, "page_cache_miss", sample=True, kind=kind)
+        return await fetch_page(filter_query, after, limit, projection)
+
+    cache_key = await movies_cache_key(CACHE_KEYS[kind], fields_key, "page", after or "start", limit)
+    tags = movie_tags(LIST_TAGS[kind])
+    return await json_response(await cached_fill(r, cache_key, CACHE_TTL_SECONDS, load_page, tags))
+
+
+async def list_entry(kind, filter_query, fields_key, projection):
+    """list_entry() of the sync app."""
+    version = await namespace_version(r, CACHE_NAMESPACE)
+    filled = {}
+
+    async def load_ids():
+        log_event(log, "list_cache_miss", sample=True, kind=kind)
+        filled.update(await cache_details(await fetch_documents(filter_query, projection), fields_key, version))
+        return list(filled)
+
+    async def assemble():
+        ids_key = namespaced_key(CACHE_NAMESPACE, version, CACHE_KEYS[kind], "ids")
+        ids = list(dict.fromkeys(await cached_ids(r, ids_key, CACHE_TTL_SECONDS, load_ids, ids_tag(kind))))
+        found = filled or await fetch_many(ids, fields_key, projection, local=False)
+        return make_entry(b"[" + b",".join(found[movie_id].body for movie_id in ids if movie_id in found) + b"]")
+
+    return await local_entry(namespaced_key(CACHE_NAMESPACE, version, CACHE_KEYS[kind], fields_key), assemble)
+
+
+async def fetch_single(movie_id, fields_key="full", projection=None):
+    cache_key = movie_detail_key(fields_key, movie_id, await namespace_version(r, CACHE_NAMESPACE))
+    cached = await cache_get(r, cache_key)
+    if cached is not None:
+        return cached
+
+    document = await movies_collection.find_one(detail_query(movie_id), projection)
+    if not document:
+        return None
+
+    return await cache_set(
+        r, cache_key, serialize_document(document), CACHE_TTL_SECONDS, tags=movie_detail_tags(document["_id"])
+    )
+
+
+async def fetch_many(movie_ids, fields_key="full", projection=None, local=True):
+    """
+    fetch_many() of the sync app. The misses are looked up by _id and by
+    imdb_id concurrently, and cached while the response is being sent.
+    """
+    version = await namespace_version(r, CACHE_NAMESPACE)
+    cache_keys = [
+        movie_detail_key(fields_key, movie_id, version)
+        for movie_id in movie_ids
+    ]
+    found = {}
+    for movie_id, cached in zip(movie_ids, await cache_get_many(r, cache_keys, local=local)):
+        if cached is not None:
+            found[movie_id] = cached
+
+    misses = {movie_id for movie_id in movie_ids if movie_id not in found}
+    if not misses:
+        return found
+
+    id_values = list(misses) + [ObjectId(value) for value in misses if ObjectId.is_valid(value)]
+    mapping_only = bool(projection) and "imdb_id" not in projection
+    if mapping_only:
+        projection = {**projection, "imdb_id": 1}
+    by_id, by_imdb_id = await asyncio.gather(
+        movies_collection.find({"_id": {"$in": id_values}}, projection).to_list(None),
+        movies_collection.find({"imdb_id": {"$in": list(misses)}}, projection).to_list(None),
+    )
+
+    loaded = {}
+    for document in by_id + by_imdb_id:
+        serialized = serialize_document(document)
+        movie_ids = (serialized["_id"], serialized.pop("imdb_id", None) if mapping_only else serialized.get("imdb_id"))
+        for movie_id in movie_ids:
+            if movie_id in misses and movie_id not in loaded:
+                loaded[movie_id] = serialized
+
+    pipe = r.pipeline(transaction=False)
+    for movie_id, serialized in loaded.items():
+        found[movie_id] = await cache_set(
+            r,
+            movie_detail_key(fields_key, movie_id, version),
+            serialized,
+            CACHE_TTL_SECONDS,
+            pipe=pipe,
+            tags=movie_detail_tags(serialized["_id"]),
+            local=local,
+        )
+    task = asyncio.get_running_loop().create_task(execute(pipe))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+    return found
+
+
+async def get_similarity_index():
+    """Async get_similarity_index(): one refresh task at a time, only the first use awaits it."""
+    if similarity_index.signature is None:
+        await asyncio.shield(refresh_similarity_index())
+    elif similarity_index.is_stale(SIMILARITY_REFRESH_SECONDS):
+        refresh_similarity_index()
+    return similarity_index
+
+
+def refresh_similarity_index():
+    """Start sync_similarity_index() as a task unless one is running; return the task."""
+    task = _similarity_refresh["task"]
+    if task is None or task.done():
+        similarity_index.touch()
+        task = asyncio.get_running_loop().create_task(sync_similarity_index())
+        _similarity_refresh["task"] = task
+    return task
+
+
+async def sync_similarity_index():
+    """Async sync_similarity_index() of movies_series."""
+    started = datetime.now(timezone.utc)
+    try:
+        signature = await movies_collection.estimated_document_count()
+        if signature == similarity_index.signature:
+            return
+
+        if similarity_index.signature is not None:
+            since = _similarity_refresh["synced_at"] - timedelta(seconds=SIMILARITY_CATCH_UP_MARGIN_SECONDS)
+            query = {"_id": {"$gte": ObjectId.from_datetime(since)}}
+            documents = await movies_collection.find(query, SIMILARITY_PROJECTION).to_list(None)
+            await asyncio.to_thread(similarity_index.add_many, documents)
+            if len(similarity_index) >= signature:
+                similarity_index.signature = signature
+                _similarity_refresh["synced_at"] = started
+                log_event(log, "similarity_index_caught_up", sample=True, titles=len(similarity_index))
+                return
+
+        documents = await movies_collection.find({}, SIMILARITY_PROJECTION).to_list(None)
+        # Building is CPU-bound; keep the event loop serving meanwhile.
+        await asyncio.to_thread(similarity_index.build, documents, signature)
+        _similarity_refresh["synced_at"] = started
+        log_event(log, "similarity_index_rebuilt", titles=len(similarity_index))
+    except PyMongoError as exc:
+        log_event(log, "similarity_refresh_failed", logging.WARNING, error=str(exc))
+
+
+async def invalidate_cache(documents):
+    await invalidate_tags(r, insert_tags(documents))
+
+
+async def write_through(documents):
+    """write_through() of the sync app."""
+    version = await namespace_version(r, CACHE_NAMESPACE)
+    pipe = r.pipeline(transaction=False)
+    appended = {"all": []}
+    for document in map(serialize_document, documents):
+        for fields_key in WRITE_THROUGH_FIELDS:
+            await cache_set(
+                r,
+                movie_detail_key(fields_key, document["_id"], version),
+                detail_value(document, fields_key),
+                CACHE_TTL_SECONDS,
+                pipe=pipe,
+                tags=movie_detail_tags(document["_id"]),
+                local=False,
+            )
+        appended["all"].append(document["_id"])
+        appended.setdefault(list_kind(document), []).append(document["_id"])
+    for kind, ids in appended.items():
+        append_ids(pipe, namespaced_key(CACHE_NAMESPACE, version, CACHE_KEYS[kind], "ids"), ids, ids_tag(kind))
+    if await execute(pipe) is None:
+        await invalidate_tags(r, [ids_tag(kind) for kind in appended])
+    await publish_invalidation(
+        r, prefixes=[namespaced_key(CACHE_NAMESPACE, version, CACHE_KEYS[kind]) + ":" for kind in appended]
+    )
+
+
+async def insert_response(payload):
+    if not payload:
+        return jsonify({"error": "please provide at least a title"}), 400
+
+    result = await movies_collection.insert_one(payload)
+    document = await movies_collection.find_one({"_id": result.inserted_id})
+    await write_through([document])
+    await invalidate_cache([document])
+    if similarity_index.signature is not None:
+        similarity_index.add(document)
+        similarity_index.signature += 1
+    return jsonify(serialize_document(document)), 201
+
+
+@bp.route("/cache/stats", methods=["GET"])
+async def get_cache_stats():
+    return jsonify(cache_stats())
+
+
+@bp.route("/metrics", methods=["GET"])
+async def get_metrics():
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+
+@bp.route("/movies-series", methods=["GET"])
+async def get_movies_series():
+    return await list_response("all")
+
+
+@bp.route("/movies-series/batch", methods=["GET"])
+async def get_movie_batch():
+    movie_ids = [value.strip() for value in request.args.get("ids", "").split(",")]
+    movie_ids = [value for value in movie_ids if value]
+    if not movie_ids:
+        return jsonify({"error": "please provide ids"}), 400
+
+    unique_ids = list(dict.fromkeys(movie_ids))
+    if len(unique_ids) > MAX_BATCH_IDS:
+        return jsonify({"error": f"at most {MAX_BATCH_IDS} ids per request"}), 400
+
+    try:
+        fields_key, projection = parse_fields(FIELD_PRESETS, request.args)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    found = await fetch_many(unique_ids, fields_key, projection)
+    items = b",".join(found[movie_id].body if movie_id in found else b"null" for movie_id in movie_ids)
+    not_found = dumps([movie_id for movie_id in unique_ids if movie_id not in found])
+    return await json_response(make_entry(b'{"items":[' + items + b'],"not_found":' + not_found + b"}"))
+
+
+@bp.route("/movies-series/<movie_id>", methods=["GET"])
+async def get_movie_detail(movie_id):
+    try:
+        fields_key, projection = parse_fields(FIELD_PRESETS, request.args)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    document = await fetch_single(movie_id, fields_key, projection)
+    if document is None:
+        return jsonify({"error": "Movie not found"}), 404
+
+    return await json_response(document)
+
+
+@bp.route("/movies-series/<movie_id>/similar", methods=["GET"])
+async def get_similar(movie_id):
+    try:
+        fields_key, projection = parse_fields(FIELD_PRESETS, request.args)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    limit = similar_limit(request.args.get("limit"))
+
+    async def load_similar():
+        matches = (await get_similarity_index()).similar(movie_id, limit)
+        if matches is None:
+            raise MovieNotFound(movie_id)
+        found = await fetch_many([other for other, _ in matches], fields_key, projection)
+        return [
+            {**loads(found[other].body), "score": round(score, 4)}
+            for other, score in matches
+            if other in found
+        ]
+
+    # The key of the sync app's @cached view, so both modes share entries.
+    parts = view_key_parts("movies_series.get_similar", {"movie_id": movie_id}, request.args, SIMILAR_QUERY)
+    cache_key = await movies_cache_key(*parts)
+    try:
+        return await json_response(
+            await cached_fill(r, cache_key, CACHE_TTL_SECONDS, load_similar, movie_tags(SIMILAR_TAG))
+        )
+    except MovieNotFound:
+        return jsonify({"error": "Movie not found"}), 404
+
+
+@bp.route("/movies", methods=["GET"])
+async def get_movies():
+    return await list_response("movies", list_filter("movies"))
+
+
+@bp.route("/series", methods=["GET"])
+async def get_series():
+    return await list_response("series", list_filter("series"))
+
+
+@bp.route("/movies-series", methods=["POST"])
+async def add_movies_series():
+    return await insert_response(build_payload(await request.get_json(silent=True)))
+
+
+@bp.route("/movies-series/bulk", methods=["POST"])
+async def bulk_add_movies_series():
+    # The body is read whole here; the sync app streams NDJSON line by line.
+    if request.mimetype in NDJSON_MIMETYPES:
+        items = ndjson_items((await request.get_data()).splitlines())
+    else:
+        documents = await request.get_json(silent=True)
+        if not isinstance(documents, list):
+            return jsonify({"error": "please provide a JSON array of documents or NDJSON"}), 400
+        items = ((index, item, None) for index, item in enumerate(documents))
+
+    inserted, errors, aborted = [], [], False
+    chunks = bulk_chunks(items)
+    try:
+        for payloads, indexes, rejected in chunks:
+            errors.extend(rejected)
+            if not payloads:
+                continue
+            try:
+                await movies_collection.insert_many(payloads, ordered=False)
+                outcome = chunk_outcome(payloads, indexes)
+            except BulkWriteError as exc:
+                outcome = chunk_outcome(payloads, indexes, exc)
+            except PyMongoError as exc:
+                log_event(log, "bulk_chunk_failed", logging.ERROR, first_index=indexes[0], error=str(exc))
+                errors.extend(abort_bulk(chunks, indexes, exc))
+                aborted = True
+                break
+            if outcome[0]:
+                await write_through(outcome[0])
+            inserted.extend(outcome[0])
+            errors.extend(outcome[1])
+    finally:
+        if inserted:
+            await invalidate_cache(inserted)
+            if similarity_index.signature is not None:
+                similarity_index.add_many(inserted)
+                similarity_index.signature += len(inserted)
+
+    log_event(log, "bulk_insert", inserted=len(inserted), failed=len(errors), aborted=aborted)
+    body, status = bulk_result(inserted, errors, aborted)
+    return jsonify(body), status
+
+
+@bp.route("/movies", methods=["POST"])
+async def add_movies():
+    return await insert_response(build_payload(await request.get_json(silent=True), forced_type="Movie"))
+
+
+@bp.route("/series", methods=["POST"])
+async def add_series():
+    return await insert_response(build_payload(await request.get_json(silent=True), forced_type="TVSeries"))
+
+
+def create_app():
+    app = Quart(__name__)
+    app.config["JSON_SORT_KEYS"] = False
+    app.register_blueprint(bp)
+    if os.environ.get("PREPARE_DATABASE", "1") != "0":
+        prepare_database()
+    return app
+
+
+if __name__ == "__main__":
+    create_app().run(host="0.0.0.0", port=5000)
@@ -0,0 +1,268 @@
+import math
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+
+# Feature weight per document field. One-hot fields count every shared value
+# the same; TF-IDF fields weight values by how rare they are in the catalog.
+FIELD_WEIGHTS = {
+    "genres": 1.0,
+    "directors": 1.0,
+    "main_actors": 0.6,
+    "keywords": 1.0,
+    "genre_interests": 0.6,
+}
+TFIDF_FIELDS = {"keywords", "genre_interests"}
+
+# Candidates are the titles sharing at least one feature held by at most
+# this share of the catalog (and never fewer than CANDIDATE_MIN_DF titles);
+# common features such as a genre only count when rescoring them. The
+# CANDIDATE_POOL best candidates on those rare features are rescored exactly.
+CANDIDATE_MAX_DF_RATIO = 0.01
+CANDIDATE_MIN_DF = 64
+CANDIDATE_POOL = 256
+
+# Titles inserted since the last full compaction are scored from a small
+# side matrix; past this many rows they are merged into the main one.
+COMPACT_AFTER_ROWS = 1024
+
+# Sparse matrix in both layouts: the rows holding column c are
+# col_rows[col_ptr[c]:col_ptr[c + 1]], the columns of row i are
+# row_cols[row_ptr[i]:row_ptr[i + 1]]; *_data are the matching weights.
+Matrix = namedtuple(
+    "Matrix",
+    ["n_rows", "n_cols", "col_ptr", "col_rows", "col_data", "row_ptr", "row_cols", "row_data"],
+)
+
+
+def feature_values(document, field):
+    values = document.get(field) or []
+    if isinstance(values, str):
+        values = [values]
+    return {str(value).strip().casefold() for value in values if str(value).strip()}
+
+
+def build_matrix(row_cols, row_weights, n_cols):
+    n_rows = len(row_cols)
+    counts = np.fromiter((len(cols) for cols in row_cols), dtype=np.int64, count=n_rows)
+    row_ptr = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(counts, out=row_ptr[1:])
+    cols = np.concatenate(row_cols) if n_rows else np.zeros(0, dtype=np.int32)
+    data = np.concatenate(row_weights) if n_rows else np.zeros(0, dtype=np.float32)
+
+    rows = np.repeat(np.arange(n_rows, dtype=np.int32), counts)
+    order = np.argsort(cols, kind="stable")
+    col_ptr = np.zeros(n_cols + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cols, minlength=n_cols), out=col_ptr[1:])
+    return Matrix(n_rows, n_cols, col_ptr, rows[order], data[order], row_ptr, cols, data)
+
+
+def gather(ptr, selected):
+    """Positions of the slices ptr[s]:ptr[s + 1] for every s in `selected`, and their lengths."""
+    starts = ptr[selected]
+    lengths = ptr[selected + 1] - starts
+    total = int(lengths.sum())
+    offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(total)
+    return offsets, lengths
+
+
+def full_scores(matrix, cols, weights):
+    """Dot product of the query with every row, through the query's columns."""
+    known = cols < matrix.n_cols
+    offsets, lengths = gather(matrix.col_ptr, cols[known])
+    contributions = matrix.col_data[offsets] * np.repeat(weights[known], lengths)
+    return np.arange(matrix.n_rows), np.bincount(
+        matrix.col_rows[offsets], weights=contributions, minlength=matrix.n_rows
+    )
+
+
+def candidate_scores(matrix, cols, weights, limit):
+    """
+    Exact cosine scores of the rows sharing the most rare features with the
+    query. Falls back to full_scores() when fewer than `limit` rows share one.
+    """
+    known = cols < matrix.n_cols
+    cols, weights = cols[known], weights[known]
+    max_df = max(CANDIDATE_MIN_DF, int(matrix.n_rows * CANDIDATE_MAX_DF_RATIO))
+    rare = (matrix.col_ptr[cols + 1] - matrix.col_ptr[cols]) <= max_df
+    offsets, lengths = gather(matrix.col_ptr, cols[rare])
+    candidates, owners = np.unique(matrix.col_rows[offsets], return_inverse=True)
+    if len(candidates) <= limit:
+        return full_scores(matrix, cols, weights)
+
+    pool = max(CANDIDATE_POOL, limit * 4)
+    if len(candidates) > pool:
+        contributions = matrix.col_data[offsets] * np.repeat(weights[rare], lengths)
+        partial = np.bincount(owners, weights=contributions, minlength=len(candidates))
+        candidates = candidates[np.argpartition(-partial, pool - 1)[:pool]]
+
+    # Rescore the candidates against all of the query's features.
+    query = np.zeros(matrix.n_cols, dtype=np.float32)
+    query[cols] = weights
+    offsets, lengths = gather(matrix.row_ptr, candidates)
+    owners = np.repeat(np.arange(len(candidates)), lengths)
+    contributions = matrix.row_data[offsets] * query[matrix.row_cols[offsets]]
+    return candidates, np.bincount(owners, weights=contributions, minlength=len(candidates))
+
+
+def top_k(rows, scores, limit):
+    """(rows, scores) of the `limit` best positive scores, best first."""
+    if len(rows) > limit:
+        best = np.argpartition(-scores, limit - 1)[:limit]
+        rows, scores = rows[best], scores[best]
+    order = np.argsort(-scores, kind="stable")
+    keep = scores[order] > 0
+    return rows[order][keep], scores[order][keep]
+
+
+class SimilarityIndex:
+    """
+    In-memory "more like this" index over the movie catalog.
+
+    Every title is an L2-normalized sparse vector of one-hot and TF-IDF
+    features, so the dot product of two rows is their cosine similarity.
+    A query only rescores the titles sharing the most of its rare features
+    (see CANDIDATE_MAX_DF_RATIO), which keeps it far below a full scan at
+    the price of occasionally missing a title alike only in common features.
+    Inserts are appended to a side matrix that is merged into the main one
+    every COMPACT_AFTER_ROWS titles; a build() recomputes all IDF weights.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+        self.signature = None
+        self.checked_at = 0.0
+
+    def _reset(self):
+        self._ids = []
+        self._rows = {}
+        self._vocab = {}
+        self._df = []
+        self._row_cols = []
+        self._row_weights = []
+        self._base = build_matrix([], [], 0)
+        self._delta = build_matrix([], [], 0)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def is_stale(self, max_age_seconds):
+        return time.monotonic() - self.checked_at >= max_age_seconds
+
+    def touch(self):
+        self.checked_at = time.monotonic()
+
+    def build(self, documents, signature=None):
+        """Index every document from scratch; queries keep using the old index meanwhile."""
+        staged = SimilarityIndex()
+        documents = [(str(doc["_id"]), doc.get("imdb_id"), staged._features(doc)) for doc in documents]
+        for _, _, features in documents:
+            staged._count(features)
+        for movie_id, imdb_id, features in documents:
+            staged._append(movie_id, imdb_id, features, len(documents))
+        staged._compact()
+
+        state = {key: value for key, value in vars(staged).items() if key.startswith("_") and key != "_lock"}
+        with self._lock:
+            vars(self).update(state)
+            self.signature = signature
+            self.checked_at = time.monotonic()
+
+    def add(self, document):
+        """Index one new title; its IDF weights use the current document frequencies."""
+        self.add_many([document])
+
+    def add_many(self, documents):
+        """Index new titles, rebuilding the side matrix once for the whole batch."""
+        with self._lock:
+            for document in documents:
+                movie_id = str(document["_id"])
+                if movie_id in self._rows:
+                    continue
+                features = self._features(document)
+                self._count(features)
+                self._append(movie_id, document.get("imdb_id"), features, len(self._ids) + 1)
+            start = self._base.n_rows
+            if len(self._ids) - start >= COMPACT_AFTER_ROWS:
+                self._compact()
+            else:
+                self._delta = build_matrix(self._row_cols[start:], self._row_weights[start:], len(self._vocab))
+
+    def similar(self, movie_id, limit):
+        """Return [(movie_id, score), ...] most similar to `movie_id`, or None if it is unknown."""
+        return self.similar_many([movie_id], limit).get(movie_id)
+
+    def similar_many(self, movie_ids, limit):
+        """Batched similar(): {movie_id: [(movie_id, score), ...]} for the known ids."""
+        with self._lock:
+            ids = self._ids
+            rows = self._rows
+            base, delta = self._base, self._delta
+            row_cols, row_weights = self._row_cols, self._row_weights
+
+        n_rows = base.n_rows + delta.n_rows
+        results = {}
+        for movie_id in dict.fromkeys(movie_ids):
+            row = rows.get(movie_id, n_rows)
+            # Titles added after the snapshot above are not in its matrices yet.
+            if row >= n_rows:
+                continue
+            cols, weights = row_cols[row], row_weights[row]
+            # One extra result, as the title itself is always among the best.
+            base_rows, base_scores = top_k(*candidate_scores(base, cols, weights, limit + 1), limit + 1)
+            delta_rows, delta_scores = full_scores(delta, cols, weights)
+            best_rows, best_scores = top_k(
+                np.concatenate([base_rows, delta_rows + base.n_rows]),
+                np.concatenate([base_scores, delta_scores]),
+                limit + 1,
+            )
+            results[movie_id] = [
+                (ids[other], float(score)) for other, score in zip(best_rows, best_scores) if other != row
+            ][:limit]
+        return results
+
+    def _features(self, document):
+        return {field: feature_values(document, field) for field in FIELD_WEIGHTS}
+
+    def _count(self, features):
+        for field, values in features.items():
+            for value in values:
+                key = (field, value)
+                column = self._vocab.get(key)
+                if column is None:
+                    column = self._vocab[key] = len(self._df)
+                    self._df.append(0)
+                self._df[column] += 1
+
+    def _append(self, movie_id, imdb_id, features, n_docs):
+        cols, weights = [], []
+        for field, values in features.items():
+            if not values:
+                continue
+            block_cols = [self._vocab[(field, value)] for value in values]
+            if field in TFIDF_FIELDS:
+                block = [math.log((1 + n_docs) / (1 + self._df[col])) + 1 for col in block_cols]
+            else:
+                block = [1.0] * len(block_cols)
+            # Each field contributes with its own weight however many values it has.
+            norm = math.sqrt(sum(weight * weight for weight in block))
+            cols.extend(block_cols)
+            weights.extend(FIELD_WEIGHTS[field] * weight / norm for weight in block)
+
+        weights = np.asarray(weights, dtype=np.float32)
+        norm = float(np.linalg.norm(weights))
+        row = len(self._ids)
+        self._ids.append(movie_id)
+        self._rows[movie_id] = row
+        if imdb_id:
+            self._rows.setdefault(str(imdb_id), row)
+        self._row_cols.append(np.asarray(cols, dtype=np.int32))
+        self._row_weights.append(weights / norm if norm else weights)
+
+    def _compact(self):
+        self._base = build_matrix(self._row_cols, self._row_weights, len(self._vocab))
+        self._delta = build_matrix([], [], len(self._vocab))
@@ -0,0 +1,13 @@
+# Multi-worker WSGI serving, e.g.:
+#
+#     gunicorn -c gunicorn.conf.py "people:create_app()"
+#
+# The settings are shared by all services (common/gunicorn_settings.py).
+from common.gunicorn_settings import *  # noqa: F401,F403
+
+
+def post_worker_init(worker):
+    # Build the name index before the first /people?q= request needs it.
+    from people import refresh_name_index
+
+    refresh_name_index()
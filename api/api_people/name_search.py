@@ -0,0 +1,147 @@
+import bisect
+import threading
+import time
+from collections import defaultdict
+
+
+FUZZY_MIN_SIMILARITY = 0.3
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def inner_trigrams(text):
+    """Trigrams a name must contain for `text` to be a substring of it."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def prefix_range(sorted_pairs, prefix):
+    start = bisect.bisect_left(sorted_pairs, (prefix,))
+    end = bisect.bisect_left(sorted_pairs, (prefix + "\uffff",))
+    return sorted_pairs[start:end]
+
+
+class NameIndex:
+    """
+    In-memory search index over normalized person names.
+
+    Exact and prefix matches are answered with binary searches over sorted
+    names and name tokens; substring and fuzzy matches go through a trigram
+    posting list. Indexes are rebuilt wholesale and swapped in atomically.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names = {}
+        self._sorted_names = []
+        self._sorted_tokens = []
+        self._postings = {}
+        self._trigram_counts = {}
+        self.signature = None
+        self.checked_at = 0.0
+
+    def __len__(self):
+        return len(self._names)
+
+    def build(self, rows, signature=None):
+        """Index (person_id, normalized_name) rows."""
+        names = {}
+        postings = defaultdict(set)
+        trigram_counts = {}
+        tokens = []
+        for person_id, name in rows:
+            if not name:
+                continue
+            names[person_id] = name
+            grams = trigrams(name)
+            trigram_counts[person_id] = len(grams)
+            for gram in grams:
+                postings[gram].add(person_id)
+            for token in set(name.split()):
+                tokens.append((token, str(person_id), person_id))
+
+        sorted_names = sorted((name, str(person_id), person_id) for person_id, name in names.items())
+        tokens.sort()
+        with self._lock:
+            self._names = names
+            self._sorted_names = sorted_names
+            self._sorted_tokens = tokens
+            self._postings = dict(postings)
+            self._trigram_counts = trigram_counts
+            self.signature = signature
+            self.checked_at = time.monotonic()
+
+    def is_stale(self, max_age_seconds):
+        return time.monotonic() - self.checked_at >= max_age_seconds
+
+    def touch(self):
+        self.checked_at = time.monotonic()
+
+    def search(self, query, limit=None):
+        """Return person ids ranked exact > prefix > token prefix > substring > fuzzy."""
+        if not query:
+            return []
+
+        with self._lock:
+            names = self._names
+            sorted_names = self._sorted_names
+            sorted_tokens = self._sorted_tokens
+            postings = self._postings
+            trigram_counts = self._trigram_counts
+
+        ranked = []
+        seen = set()
+
+        def collect(person_ids):
+            for person_id in person_ids:
+                if person_id in seen:
+                    continue
+                seen.add(person_id)
+                ranked.append(person_id)
+                if limit and len(ranked) >= limit:
+                    return True
+            return False
+
+        prefixed = prefix_range(sorted_names, query)
+        exact = [entry[2] for entry in prefixed if entry[0] == query]
+        if collect(exact):
+            return ranked
+        if collect(entry[2] for entry in prefixed):
+            return ranked
+
+        token_matches = sorted(
+            (names[entry[2]], entry[1], entry[2]) for entry in prefix_range(sorted_tokens, query)
+        )
+        if collect(entry[2] for entry in token_matches):
+            return ranked
+
+        required = inner_trigrams(query)
+        if required:
+            lists = sorted((postings.get(gram, set()) for gram in required), key=len)
+            candidates = set(lists[0]).intersection(*lists[1:]) if lists[0] else set()
+            substring = sorted(
+                (names[person_id], str(person_id), person_id)
+                for person_id in candidates
+                if person_id not in seen and query in names[person_id]
+            )
+            if collect(entry[2] for entry in substring):
+                return ranked
+
+        query_grams = trigrams(query)
+        shared = defaultdict(int)
+        for gram in query_grams:
+            for person_id in postings.get(gram, ()):
+                if person_id not in seen:
+                    shared[person_id] += 1
+
+        scored = []
+        for person_id, overlap in shared.items():
+            union = len(query_grams) + trigram_counts[person_id] - overlap
+            similarity = overlap / union if union else 0.0
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                scored.append((-similarity, names[person_id], str(person_id), person_id))
+        scored.sort()
+        collect(entry[3] for entry in scored)
+        return ranked
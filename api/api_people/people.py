@@ -1,29 +1,197 @@
-import json
+import logging
 import os
+import threading
+import time
+import unicodedata
+from functools import partial
 
-from flask import Flask, jsonify, request
-from pymongo import MongoClient
-import redis
+import click
+from flask import Blueprint, Flask, jsonify, request
+from pymongo import ASCENDING, IndexModel, UpdateOne
+from pymongo.errors import PyMongoError
 
+from common.backfill import Backfill
+from common.cache import (
+    cache_get_many,
+    cache_set_many,
+    cache_stats,
+    cached,
+    dumps,
+    json_response,
+    make_entry,
+    namespace_version,
+    namespaced_key,
+)
+from common.clients import LazyCollection, LazyRedis, register_health_routes
+from common.fields import canonical_fields, parse_fields
+from common.indexes import HotQuery, prepare_indexes, register_index_commands
+from common.logs import get_logger, log_event
+from common.metrics import register_metrics
+from name_search import NameIndex
 
-app = Flask(__name__)
 
-client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"))
-db = client["api_people"]
-people_collection = db["people"]
+bp = Blueprint("people", __name__, cli_group=None)
+register_health_routes(bp)
+register_metrics(bp)
+log = get_logger("people")
 
-r = redis.Redis(
-    host=os.environ.get("REDIS_HOST", "localhost"),
-    port=int(os.environ.get("REDIS_PORT", 6379)),
-    db=int(os.environ.get("REDIS_DB", 0)),
-)
+people_collection = LazyCollection("api_people", "people")
+r = LazyRedis()
 
 CACHE_TTL_SECONDS = int(os.environ.get("CACHE_TTL_SECONDS", 60))
+CACHE_NAMESPACE = "people"
+MAX_LOOKUP_NAMES = int(os.environ.get("MAX_LOOKUP_NAMES", 100))
+INTERNAL_FIELDS = {"name_normalized"}
+# Named projections for ?fields=; None means the whole document.
+FIELD_PRESETS = {
+    "card": ("name", "imdb_name_id", "photo_url", "role", "url"),
+    "full": None,
+}
+NAME_INDEX_REFRESH_SECONDS = int(os.environ.get("NAME_INDEX_REFRESH_SECONDS", 300))
+NAME_INDEX_MAX_AGE_SECONDS = int(os.environ.get("NAME_INDEX_MAX_AGE_SECONDS", 3600))
+
+name_index = NameIndex()
+# The refresh thread of this process, and when it last built the index.
+_name_refresh = {"thread": None, "built_at": float("-inf")}
+_name_refresh_lock = threading.Lock()
+
+
+def normalize_name(name):
+    """Case-fold, strip accents and collapse whitespace: 'Zoë  Saldaña' -> 'zoe saldana'."""
+    decomposed = unicodedata.normalize("NFKD", name or "")
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(stripped.casefold().split())
+
+
+def backfill_normalized_names(refresh_all=False):
+    """Migration: store name_normalized on people written before the field existed."""
+    query = {} if refresh_all else {"name_normalized": {"$exists": False}}
+    updates = []
+    for doc in people_collection.find(query, {"name": 1, "name_normalized": 1}):
+        name = normalize_name(doc.get("name"))
+        if doc.get("name_normalized") != name:
+            updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"name_normalized": name}}))
+    if updates:
+        people_collection.bulk_write(updates, ordered=False)
+    return len(updates)
+
+
+names_backfill = Backfill("name_normalized", backfill_normalized_names)
+
+
+def detail_query(person_id):
+    return {"$or": [{"_id": person_id}, {"imdb_name_id": person_id}]}
+
+
+INDEX_REGISTRY = [
+    (
+        people_collection,
+        [
+            IndexModel([("imdb_name_id", ASCENDING)]),
+            IndexModel([("name_normalized", ASCENDING)]),
+        ],
+        [
+            HotQuery("detail by _id or imdb_name_id", detail_query("nm0000000")),
+            HotQuery("lookup by normalized name", {"name_normalized": {"$in": ["jane doe"]}}),
+            HotQuery("search hits by _id", {"_id": {"$in": ["p000000000000"]}}),
+        ],
+    ),
+]
+register_index_commands(bp, INDEX_REGISTRY)
+
+
+@bp.cli.command("backfill-names")
+def backfill_names_command():
+    """Recompute name_normalized on every person."""
+    click.echo(f"updated {backfill_normalized_names(refresh_all=True)} people")
+
+
+def prepare_database():
+    prepare_indexes(INDEX_REGISTRY)
+    names_backfill.start()
+
+
+def find_unnormalized_names(names):
+    """
+    {normalized name: document} for people the name_normalized backfill has
+    not reached yet, matching their raw names case- and accent-insensitively.
+    """
+    documents = {}
+    query = {"name_normalized": {"$exists": False}, "name": {"$in": names}}
+    cursor = people_collection.find(query, collation={"locale": "en", "strength": 1}).sort("_id", ASCENDING)
+    for document in cursor:
+        documents.setdefault(normalize_name(document.get("name")), serialize_document(document))
+    return documents
+
+
+def get_name_index():
+    """
+    Return the name index. It is refreshed in the background every
+    NAME_INDEX_REFRESH_SECONDS while requests keep using the current one;
+    only the very first use waits for it to be built.
+    """
+    if name_index.signature is None:
+        refresh_name_index(wait=True)
+        if name_index.signature is None:
+            raise PyMongoError("the name index could not be built")
+    elif name_index.is_stale(NAME_INDEX_REFRESH_SECONDS):
+        refresh_name_index()
+    return name_index
+
+
+def refresh_name_index(wait=False):
+    """Start sync_name_index() in a background thread unless one is running; `wait` joins it."""
+    with _name_refresh_lock:
+        thread = _name_refresh["thread"]
+        if thread is None or not thread.is_alive():
+            name_index.touch()
+            thread = threading.Thread(target=sync_name_index, name="name-index-refresh", daemon=True)
+            _name_refresh["thread"] = thread
+            thread.start()
+    if wait:
+        thread.join()
+
+
+def sync_name_index():
+    """
+    Rebuild the name index when people were added or removed, or once it is
+    NAME_INDEX_MAX_AGE_SECONDS old: a rename does not change the count.
+    """
+    try:
+        signature = people_collection.estimated_document_count()
+        age = time.monotonic() - _name_refresh["built_at"]
+        if signature == name_index.signature and age < NAME_INDEX_MAX_AGE_SECONDS:
+            return
+
+        cursor = people_collection.find({}, {"name": 1, "name_normalized": 1})
+        name_index.build(
+            (
+                (doc["_id"], doc.get("name_normalized") or normalize_name(doc.get("name")))
+                for doc in cursor
+            ),
+            signature,
+        )
+        _name_refresh["built_at"] = time.monotonic()
+        log_event(log, "name_index_rebuilt", names=len(name_index))
+    except PyMongoError as exc:
+        log_event(log, "name_index_refresh_failed", logging.WARNING, error=str(exc))
+
+
+def search_people(search, limit, projection=None):
+    person_ids = get_name_index().search(search, limit)
+    if not person_ids:
+        return []
+
+    cursor = people_collection.find({"_id": {"$in": person_ids}}, projection)
+    by_id = {doc["_id"]: doc for doc in cursor}
+    return [serialize_document(by_id[person_id]) for person_id in person_ids if person_id in by_id]
 
 
 def serialize_document(document):
     serialized = {}
     for key, value in document.items():
+        if key in INTERNAL_FIELDS:
+            continue
         if key == "_id":
             serialized[key] = str(value)
         else:
@@ -31,57 +199,122 @@ def serialize_document(document):
     return serialized
 
 
-def build_cache_key(prefix, *parts):
-    normalized_parts = [part or "all" for part in parts]
-    return ":".join([prefix, *normalized_parts])
+def parse_limit(value):
+    """?limit= as a positive int, or None for no limit."""
+    try:
+        limit = int(value) if value else None
+    except ValueError:
+        return None
+    return max(limit, 1) if limit else None
+
 
+def people_cache_key(*parts, version=None):
+    if version is None:
+        version = namespace_version(r, CACHE_NAMESPACE)
+    return namespaced_key(CACHE_NAMESPACE, version, *parts)
 
-@app.route("/people", methods=["GET"])
+
+@bp.route("/cache/stats", methods=["GET"])
+def get_cache_stats():
+    return jsonify(cache_stats())
+
+
+# Keyed on the canonical query: "?q=Zoë&limit=01" and "?limit=1&q=zoe" share an entry.
+PEOPLE_QUERY = {"q": normalize_name, "limit": parse_limit, "fields": partial(canonical_fields, FIELD_PRESETS)}
+
+
+@bp.route("/people", methods=["GET"])
+@cached(CACHE_NAMESPACE, CACHE_TTL_SECONDS, query=PEOPLE_QUERY)
 def get_people():
-    search = request.args.get("q")
-    limit_param = request.args.get("limit")
+    search = normalize_name(request.args.get("q"))
+    limit = parse_limit(request.args.get("limit"))
 
     try:
-        limit = int(limit_param) if limit_param else None
-    except ValueError:
-        limit = None
+        _, projection = parse_fields(FIELD_PRESETS)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
 
-    cache_key = build_cache_key("people", search or "", limit_param or "")
-    cached = r.get(cache_key)
-    if cached:
-        print("people cache hit!")
-        return jsonify(json.loads(cached))
-
-    query = {}
+    log_event(log, "people_cache_miss", sample=True, search=bool(search))
     if search:
-        query["name"] = {"$regex": search, "$options": "i"}
+        return search_people(search, limit, projection)
 
-    cursor = people_collection.find(query)
+    cursor = people_collection.find({}, projection)
     if limit:
-        cursor = cursor.limit(max(limit, 1))
+        cursor = cursor.limit(limit)
+    return [serialize_document(item) for item in cursor]
+
+
+@bp.route("/people/lookup", methods=["POST"])
+def lookup_people():
+    data = request.get_json(silent=True) or {}
+    names = data.get("names") if isinstance(data, dict) else None
+    if not isinstance(names, list):
+        return jsonify({"error": "please provide a list of names"}), 400
+
+    names = [name for name in names if isinstance(name, str) and name.strip()]
+    normalized = {name: normalize_name(name) for name in names}
+    unique_names = list(dict.fromkeys(normalized.values()))
+    if len(unique_names) > MAX_LOOKUP_NAMES:
+        return jsonify({"error": f"at most {MAX_LOOKUP_NAMES} names per request"}), 400
+
+    version = namespace_version(r, CACHE_NAMESPACE)
+    cache_keys = {name: people_cache_key("lookup", name, version=version) for name in unique_names}
+    resolved = {}
+    if unique_names:
+        for name, entry in zip(unique_names, cache_get_many(r, list(cache_keys.values()))):
+            if entry is not None:
+                resolved[name] = entry
+
+    misses = [name for name in unique_names if name not in resolved]
+    if misses:
+        log_event(log, "lookup_cache_miss", sample=True, names=len(misses))
+        documents = {}
+        cursor = people_collection.find({"name_normalized": {"$in": misses}}).sort("_id", ASCENDING)
+        for document in cursor:
+            documents.setdefault(document["name_normalized"], serialize_document(document))
 
-    documents = [serialize_document(item) for item in cursor]
-    r.setex(cache_key, CACHE_TTL_SECONDS, json.dumps(documents))
-    return jsonify(documents)
+        # Unknown names are cached as null so repeated cast panels stay cheap,
+        # except while the backfill may still give them a name_normalized.
+        uncached = set()
+        if names_backfill.pending and len(documents) < len(misses):
+            unknown = set(misses).difference(documents)
+            documents.update(find_unnormalized_names([name for name in names if normalized[name] in unknown]))
+            uncached = {name for name in misses if name not in documents}
+            resolved.update((name, make_entry(dumps(None))) for name in uncached)
 
+        cacheable = [name for name in misses if name not in uncached]
+        entries = cache_set_many(r, {cache_keys[name]: documents.get(name) for name in cacheable}, CACHE_TTL_SECONDS)
+        resolved.update((name, entries[cache_keys[name]]) for name in cacheable)
 
-@app.route("/people/<id>", methods=["GET"])
+    # Cached entries are spliced into the response without being decoded.
+    members = [
+        dumps(name) + b":" + resolved[normalized[name]].body for name in dict.fromkeys(names)
+    ]
+    return json_response(make_entry(b"{" + b",".join(members) + b"}"))
+
+
+@bp.route("/people/<id>", methods=["GET"])
+@cached(CACHE_NAMESPACE, CACHE_TTL_SECONDS, query={"fields": partial(canonical_fields, FIELD_PRESETS)})
 def get_person(id):
-    cache_key = build_cache_key("people_detail", id)
-    cached = r.get(cache_key)
-    if cached:
-        print("people detail cache hit!")
-        return jsonify(json.loads(cached))
-
-    query = {"$or": [{"_id": id}, {"imdb_name_id": id}]}
-    document = people_collection.find_one(query)
+    try:
+        _, projection = parse_fields(FIELD_PRESETS)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    document = people_collection.find_one(detail_query(id), projection)
     if not document:
         return jsonify({"error": "Person not found"}), 404
 
-    serialized = serialize_document(document)
-    r.setex(cache_key, CACHE_TTL_SECONDS, json.dumps(serialized))
-    return jsonify(serialized)
+    return serialize_document(document)
+
+
+def create_app():
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+    if os.environ.get("PREPARE_DATABASE", "1") != "0":
+        prepare_database()
+    return app
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5002, debug=True)
+    create_app().run(host="0.0.0.0", port=5002, debug=os.environ.get("FLASK_DEBUG") == "1")
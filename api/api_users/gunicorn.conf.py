@@ -0,0 +1,6 @@
+# Multi-worker WSGI serving, e.g.:
+#
+#     gunicorn -c gunicorn.conf.py "users:create_app()"
+#
+# The settings are shared by all services (common/gunicorn_settings.py).
+from common.gunicorn_settings import *  # noqa: F401,F403
@@ -1,28 +1,72 @@
+import logging
 import os
-import json
-from bson import ObjectId
-from flask import Flask, jsonify, request
-from pymongo import MongoClient
+import re
+import threading
+
+import click
 import redis
+from bson import ObjectId
+from flask import Blueprint, Flask, jsonify, request
+from pymongo import ASCENDING, IndexModel, UpdateOne
+from pymongo.errors import PyMongoError
+
+from common.backfill import Backfill
+from common.cache import (
+    FILL_LOCK_MS,
+    FILL_LOCK_PREFIX,
+    bump_namespace,
+    cache_get,
+    cache_get_many,
+    cache_set,
+    cache_set_many,
+    cache_stats,
+    cached,
+    cached_fill,
+    dumps,
+    execute,
+    json_response,
+    loads,
+    make_entry,
+    namespace_version,
+    namespaced_key,
+    report_error,
+)
+from common.clients import LazyCollection, LazyRedis, register_health_routes
+from common.indexes import HotQuery, prepare_indexes, register_index_commands
+from common.logs import get_logger, log_event
+from common.metrics import count_cache, register_metrics
+from common.movies import MOVIE_CARD_FIELDS, MOVIES_CACHE_NAMESPACE, movie_detail_key, movie_detail_tags
 
-app = Flask(__name__)
+bp = Blueprint("users", __name__, cli_group=None)
+register_health_routes(bp)
+register_metrics(bp)
+log = get_logger("users")
 
 # ---- Connections -------------------------------------------------------------
-MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-client = MongoClient(MONGO_URI)
-db = client["api_users"]
-
-my_friends_collection = db["my_friends"]
-users_collection = db["users"]
-
-r = redis.Redis(
-    host=os.environ.get("REDIS_HOST", "localhost"),
-    port=int(os.environ.get("REDIS_PORT", 6379)),
-    db=int(os.environ.get("REDIS_DB", 0)),
-    decode_responses=True,  # store/read strings -> simpler json.dumps/loads
-)
+# Resolved lazily per process; see common/clients.py.
+my_friends_collection = LazyCollection("api_users", "my_friends")
+users_collection = LazyCollection("api_users", "users")
+
+# Favorites are hydrated straight from the movies service's database.
+movies_collection = LazyCollection("api_movies_series", "movies_series")
+
+r = LazyRedis()
 
 CACHE_TTL_SECONDS = int(os.environ.get("CACHE_TTL_SECONDS", 60))
+FRIENDS_CACHE_NAMESPACE = "my_friends"
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Redis sets mirroring each user's favorite movie ids. Every set holds the
+# sentinel too, so an existing key always means "mirrored", even when empty.
+FAVORITES_SET_PREFIX = "favorites_set:"
+FAVORITES_SET_SENTINEL = "\x00"
+FAVORITES_SET_TTL_SECONDS = int(os.environ.get("FAVORITES_SET_TTL_SECONDS", 24 * 3600))
+
+# Lower-cased _id and imdb_user_id, so any spelling of a user id is one
+# indexed equality match. Must be refreshed whenever either id is written.
+ID_KEYS_FIELD = "id_keys"
 
 
 # ---- Helpers -----------------------------------------------------------------
@@ -31,50 +75,467 @@ def serialize_id(doc):
     if not doc:
         return doc
     out = dict(doc)
+    out.pop(ID_KEYS_FIELD, None)
     if "_id" in out and not isinstance(out["_id"], str):
         out["_id"] = str(out["_id"])
     return out
 
 
+def canonical_user_id(user_id) -> str:
+    return str(user_id).strip().lower()
+
+
+def canonical_id_keys(doc):
+    """Value of the id_keys field for a user document."""
+    keys = {canonical_user_id(doc["_id"])}
+    if doc.get("imdb_user_id"):
+        keys.add(canonical_user_id(doc["imdb_user_id"]))
+    return sorted(keys)
+
+
+def user_id_query(user_id: str):
+    return {ID_KEYS_FIELD: canonical_user_id(user_id)}
+
+
+def unbackfilled_users_query(user_ids):
+    """
+    Users the id_keys backfill has not reached yet whose _id or
+    imdb_user_id is one of `user_ids` (case-insensitive, not indexed).
+    """
+    patterns = [re.compile(f"^{re.escape(canonical_user_id(user_id))}$", re.IGNORECASE) for user_id in user_ids]
+    return {
+        ID_KEYS_FIELD: {"$exists": False},
+        "$or": [{"_id": {"$in": patterns}}, {"imdb_user_id": {"$in": patterns}}],
+    }
+
+
+def user_id_queries(user_id):
+    """user_id_query(), then while the id_keys backfill is pending, unbackfilled_users_query()."""
+    yield user_id_query(user_id)
+    if user_ids_backfill.pending:
+        yield unbackfilled_users_query([user_id])
+
+
 def find_user_any_id(user_id: str, projection=None):
     """
     Find a user by either imdb_user_id or _id (case-insensitive).
     Works with values like 'ur123...' or 'U000000000001' (or lower-case).
     """
-    query = {
-        "$or": [
-            {"imdb_user_id": user_id},
-            {"_id": user_id},
-            {"imdb_user_id": {"$regex": f"^{user_id}$", "$options": "i"}},
-            {"_id": {"$regex": f"^{user_id}$", "$options": "i"}},
+    for query in user_id_queries(user_id):
+        doc = users_collection.find_one(query, projection)
+        if doc:
+            return doc
+    return None
+
+
+def user_namespace(user_id):
+    return f"user:{canonical_user_id(user_id)}"
+
+
+def request_user_namespace():
+    """Cache namespace of the user the current request is about."""
+    return user_namespace(request.args.get("user_id", "ur12345678"))
+
+
+def user_cache_key(user_id, *parts):
+    """Per-user cache key; invalidate_user_cache() drops all of a user's keys at once."""
+    namespace = user_namespace(user_id)
+    return namespaced_key(namespace, namespace_version(r, namespace), *parts)
+
+
+def invalidate_user_cache(user_id):
+    bump_namespace(r, user_namespace(user_id))
+
+
+def invalidate_favorites(user_id):
+    """
+    After a favorites write: drop the user's caches and their mirrored set.
+    The API does not write favorites; whatever does runs invalidate-favorites.
+    """
+    invalidate_user_cache(user_id)
+    try:
+        r.delete(favorites_set_key(user_id))
+    except redis.RedisError as exc:
+        report_error(exc)
+
+
+def hydrate_favorites(favorites):
+    """
+    Replace favorite references by movie cards: one MGET over the movies
+    service's cached cards, then one $in query for the misses, which are
+    written back to the shared cache.
+    """
+    movie_ids = [fav["_id"] for fav in favorites if isinstance(fav, dict) and fav.get("_id")]
+    version = namespace_version(r, MOVIES_CACHE_NAMESPACE)
+    keys = [movie_detail_key("card", movie_id, version) for movie_id in movie_ids]
+    cards = {}
+    for movie_id, entry in zip(movie_ids, cache_get_many(r, keys)):
+        if entry is not None:
+            cards[movie_id] = loads(entry.body)
+
+    misses = [movie_id for movie_id in dict.fromkeys(movie_ids) if movie_id not in cards]
+    if misses:
+        id_values = misses + [ObjectId(movie_id) for movie_id in misses if ObjectId.is_valid(movie_id)]
+        projection = {field: 1 for field in MOVIE_CARD_FIELDS}
+        loaded = {}
+        for doc in movies_collection.find({"_id": {"$in": id_values}}, projection):
+            card = serialize_id(doc)
+            loaded[movie_detail_key("card", card["_id"], version)] = cards[card["_id"]] = card
+        cache_set_many(
+            r,
+            loaded,
+            CACHE_TTL_SECONDS,
+            tags={key: movie_detail_tags(card["_id"]) for key, card in loaded.items()},
+        )
+
+    # Favorites whose movie no longer exists are returned as plain references.
+    return [cards.get(movie_id, {"_id": movie_id}) for movie_id in movie_ids]
+
+
+def parse_offset_page_args(always=False):
+    """
+    Return (offset, limit) when the request asks for a page (or `always`),
+    else None. `after` takes the next_cursor of a previous page, `offset` a
+    raw array position.
+    """
+    position = request.args.get("after") or request.args.get("offset")
+    limit_param = request.args.get("limit")
+    if position is None and limit_param is None and not always:
+        return None
+
+    try:
+        limit = int(limit_param) if limit_param else DEFAULT_PAGE_SIZE
+    except ValueError:
+        limit = DEFAULT_PAGE_SIZE
+    try:
+        offset = int(position) if position else 0
+    except ValueError:
+        raise ValueError("after/offset must be a non-negative integer")
+    if offset < 0:
+        raise ValueError("after/offset must be a non-negative integer")
+    return offset, min(max(limit, 1), MAX_PAGE_SIZE)
+
+
+def favorites_cache_keys(user_id):
+    """The favorites Redis list and the key holding its length."""
+    return user_cache_key(user_id, "favorites"), user_cache_key(user_id, "favorites_total")
+
+
+def read_cached_favorites(keys, start=0, stop=-1):
+    """
+    Return (total, favorites[start:stop + 1]) from the cached Redis list at
+    `keys` (see favorites_cache_keys), or None when it is not cached. The
+    length lives in its own key because Redis cannot store an empty list.
+    """
+    list_key, total_key = keys
+    pipe = r.pipeline(transaction=False)
+    pipe.get(total_key)
+    pipe.lrange(list_key, start, stop)
+    results = execute(pipe)
+    if results is None:
+        return None
+    total, items = results
+    if total is None or (int(total) and not items and start < int(total)):
+        count_cache(list_key, "miss")
+        return None
+    count_cache(list_key, "l2_hit")
+    return int(total), [loads(item) for item in items]
+
+
+def cache_favorites(keys, favorites):
+    list_key, total_key = keys
+    pipe = r.pipeline()
+    pipe.delete(list_key)
+    if favorites:
+        pipe.rpush(list_key, *(dumps(fav) for fav in favorites))
+        pipe.expire(list_key, CACHE_TTL_SECONDS)
+    pipe.setex(total_key, CACHE_TTL_SECONDS, len(favorites))
+    execute(pipe)
+
+
+def load_favorites(user_id):
+    """A user's whole favorites array from Mongo, or None for an unknown user."""
+    doc = find_user_any_id(user_id, projection={"_id": 0, "favorites": 1})
+    if not doc or "favorites" not in doc:
+        return None
+    return doc["favorites"] or []
+
+
+def fill_favorites_in_background(user_id, keys):
+    """
+    Cache a user's whole favorites list at `keys` off the request path, at
+    most once per FILL_LOCK_MS across workers. The keys are taken before
+    Mongo is read, so a fill that overlaps a favorites write lands in the
+    namespace version the write already dropped.
+    """
+    try:
+        if not r.set(f"{FILL_LOCK_PREFIX}{keys[0]}", 1, nx=True, px=FILL_LOCK_MS):
+            return
+    except redis.RedisError as exc:
+        report_error(exc, keys[0])
+        return
+
+    def fill():
+        try:
+            favorites = load_favorites(user_id)
+        except PyMongoError as exc:
+            log_event(log, "favorites_fill_failed", logging.WARNING, error=str(exc))
+            return
+        if favorites is not None:
+            cache_favorites(keys, favorites)
+
+    threading.Thread(target=fill, name="favorites-fill", daemon=True).start()
+
+
+def read_favorites(user_id, page_args=None):
+    """
+    (total, favorites) of a user, or of the (offset, limit) page of them;
+    None for an unknown user. Served from the cached Redis list; on a miss
+    the whole array is loaded and cached, or for a page, the page is
+    $sliced out of Mongo and the list filled in the background.
+    """
+    keys = favorites_cache_keys(user_id)
+    if page_args is None:
+        cached = read_cached_favorites(keys)
+        if cached is not None:
+            return cached
+        log_event(log, "favorites_cache_miss", sample=True)
+        favorites = load_favorites(user_id)
+        if favorites is None:
+            return None
+        # The whole array is cached once; every page is then an LRANGE.
+        cache_favorites(keys, favorites)
+        return len(favorites), favorites
+
+    offset, limit = page_args
+    cached = read_cached_favorites(keys, offset, offset + limit - 1)
+    if cached is not None:
+        return cached
+    log_event(log, "favorites_page_cache_miss", sample=True, offset=offset, limit=limit)
+    page = fetch_array_page(user_id, "favorites", offset, limit)
+    if page is not None:
+        fill_favorites_in_background(user_id, keys)
+    return page
+
+
+def fetch_array_page(user_id, field, offset, limit):
+    """
+    Return (total, page) of a user's array `field` straight from Mongo:
+    $slice and $size run server-side, so only the requested page is
+    transferred.
+    """
+    array = f"${field}"
+    for query in user_id_queries(user_id):
+        pipeline = [
+            {"$match": query},
+            {"$limit": 1},
+            {
+                "$project": {
+                    "_id": 0,
+                    "total": {"$cond": [{"$isArray": array}, {"$size": array}, None]},
+                    "items": {"$slice": [{"$ifNull": [array, []]}, offset, limit]},
+                }
+            },
         ]
+        doc = next(users_collection.aggregate(pipeline), None)
+        if doc:
+            return None if doc.get("total") is None else (doc["total"], doc["items"])
+    return None
+
+
+def favorites_set_key(user_id):
+    return f"{FAVORITES_SET_PREFIX}{canonical_user_id(user_id)}"
+
+
+def load_favorite_ids(user_ids):
+    """{canonical user id: favorite movie ids} from Mongo with one $in; unknown users get []."""
+    favorites = {canonical_user_id(user_id): [] for user_id in user_ids}
+    query = {ID_KEYS_FIELD: {"$in": list(favorites)}}
+    if user_ids_backfill.pending:
+        query = {"$or": [query, unbackfilled_users_query(favorites)]}
+    for doc in users_collection.find(query, {ID_KEYS_FIELD: 1, "imdb_user_id": 1, "favorites": 1}):
+        movie_ids = [fav["_id"] for fav in doc.get("favorites") or [] if isinstance(fav, dict) and fav.get("_id")]
+        for key in doc.get(ID_KEYS_FIELD) or canonical_id_keys(doc):
+            if key in favorites:
+                favorites[key] = movie_ids
+    return favorites
+
+
+def ensure_favorites_sets(user_ids):
+    """Mirror the favorites of `user_ids` into Redis sets, loading missing ones with one $in."""
+    user_ids = list(dict.fromkeys(canonical_user_id(user_id) for user_id in user_ids))
+    pipe = r.pipeline(transaction=False)
+    for user_id in user_ids:
+        pipe.exists(favorites_set_key(user_id))
+    missing = [user_id for user_id, exists in zip(user_ids, pipe.execute()) if not exists]
+    if not missing:
+        return
+
+    # Unknown users get an empty mirror so they are not looked up again.
+    favorites = load_favorite_ids(missing)
+    pipe = r.pipeline()
+    for user_id, movie_ids in favorites.items():
+        key = favorites_set_key(user_id)
+        pipe.delete(key)
+        pipe.sadd(key, FAVORITES_SET_SENTINEL, *movie_ids)
+        pipe.expire(key, FAVORITES_SET_TTL_SECONDS)
+    pipe.execute()
+
+
+def common_favorites_key(user_id, friend_id):
+    # Embeds both users' namespace versions: a favorites change on either
+    # side (invalidate_user_cache) makes the cached intersection unreachable.
+    parts = []
+    for member in sorted((canonical_user_id(user_id), canonical_user_id(friend_id))):
+        parts.extend([member, f"v{namespace_version(r, user_namespace(member))}"])
+    return ":".join(["common_favorites", *parts])
+
+
+def intersect_favorites(user_id, friend_ids):
+    """{friend_id: sorted common movie ids}, intersecting the mirrored sets with SINTER."""
+    ensure_favorites_sets([user_id, *friend_ids])
+    pipe = r.pipeline(transaction=False)
+    for friend_id in friend_ids:
+        pipe.sinter(favorites_set_key(user_id), favorites_set_key(friend_id))
+    return {
+        friend_id: sorted(member.decode() for member in members if member.decode() != FAVORITES_SET_SENTINEL)
+        for friend_id, members in zip(friend_ids, pipe.execute())
     }
-    return users_collection.find_one(query, projection)
+
+
+def common_favorites(user_id, friend_ids):
+    """Return {friend_id: sorted common movie ids}; intersected in Python when Redis is down."""
+    keys = [common_favorites_key(user_id, friend_id) for friend_id in friend_ids]
+    common = {}
+    for friend_id, entry in zip(friend_ids, cache_get_many(r, keys)):
+        if entry is not None:
+            common[friend_id] = loads(entry.body)
+
+    misses = [friend_id for friend_id in friend_ids if friend_id not in common]
+    if not misses:
+        return common
+
+    try:
+        computed = intersect_favorites(user_id, misses)
+    except redis.RedisError as exc:
+        report_error(exc)
+        favorites = load_favorite_ids([user_id, *misses])
+        mine = set(favorites[canonical_user_id(user_id)])
+        computed = {
+            friend_id: sorted(mine.intersection(favorites[canonical_user_id(friend_id)]))
+            for friend_id in misses
+        }
+    common.update(computed)
+    cache_set_many(
+        r,
+        {common_favorites_key(user_id, friend_id): movie_ids for friend_id, movie_ids in computed.items()},
+        CACHE_TTL_SECONDS,
+    )
+    return common
+
+
+def backfill_user_id_keys(refresh_all=False):
+    """Migration: store id_keys on users written before the field existed."""
+    query = {} if refresh_all else {ID_KEYS_FIELD: {"$exists": False}}
+    updates = []
+    for doc in users_collection.find(query, {"imdb_user_id": 1, ID_KEYS_FIELD: 1}):
+        keys = canonical_id_keys(doc)
+        if doc.get(ID_KEYS_FIELD) != keys:
+            updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": {ID_KEYS_FIELD: keys}}))
+    if updates:
+        users_collection.bulk_write(updates, ordered=False)
+    return len(updates)
+
+
+user_ids_backfill = Backfill("id_keys", backfill_user_id_keys)
+
+
+# ---- Indexes -----------------------------------------------------------------
+INDEX_REGISTRY = [
+    (
+        users_collection,
+        [IndexModel([(ID_KEYS_FIELD, ASCENDING)])],
+        [HotQuery("user by any id", user_id_query("ur00000000"))],
+    ),
+    (
+        my_friends_collection,
+        [],
+        [HotQuery("friend by _id", {"_id": "f000000000000"})],
+    ),
+]
+register_index_commands(bp, INDEX_REGISTRY)
+
+
+@bp.cli.command("invalidate-favorites")
+@click.argument("user_ids", nargs=-1, required=True)
+def invalidate_favorites_command(user_ids):
+    """Drop the cached favorites of USER_IDS after writing them to Mongo."""
+    for user_id in user_ids:
+        invalidate_favorites(user_id)
+    click.echo(f"invalidated {len(user_ids)} users")
+
+
+@bp.cli.command("backfill-user-ids")
+def backfill_user_ids_command():
+    """Recompute id_keys on every user document."""
+    click.echo(f"updated {backfill_user_id_keys(refresh_all=True)} users")
+
+
+def prepare_database():
+    prepare_indexes(INDEX_REGISTRY)
+    user_ids_backfill.start()
 
 
 # ---- Routes: Friends ---------------------------------------------------------
-@app.route("/myfriends", methods=["GET"])
+@bp.route("/myfriends", methods=["GET"])
 def get_my_friends():
-    cache_key = "my_friends_list"
-    cached = r.get(cache_key)
-    if cached:
-        print("cache hit! /myfriends")
-        return jsonify(json.loads(cached))
+    if request.args.get("user_id"):
+        return get_user_friends(request.args["user_id"])
 
-    print("cache miss /myfriends -> Mongo")
-    friends = [serialize_id(x) for x in my_friends_collection.find()]
-    r.setex(cache_key, CACHE_TTL_SECONDS, json.dumps(friends))
-    return jsonify(friends)
+    def load_friends():
+        return [serialize_id(x) for x in my_friends_collection.find()]
 
+    friends = cached_fill(r, "my_friends_list", CACHE_TTL_SECONDS, load_friends)
+    return json_response(friends, private=True)
 
-@app.route("/my_friends/<friend_id>", methods=["GET"])
-def get_my_friend(friend_id):
-    cache_key = f"friend:{friend_id}"
-    cached = r.get(cache_key)
-    if cached:
-        print("cache hit! /my_friends/<id>")
-        return jsonify(json.loads(cached))
 
+def get_user_friends(user_id):
+    """
+    One page of a user's friends, each with the favorites they have in
+    common with the user. The page itself is $sliced out of `friends`.
+    """
+    try:
+        offset, limit = parse_offset_page_args(always=True)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    page = fetch_array_page(user_id, "friends", offset, limit)
+    if page is None:
+        return jsonify({"error": "Friends not found"}), 404
+
+    total, friends = page
+    friend_ids = [friend["_id"] for friend in friends if isinstance(friend, dict) and friend.get("_id")]
+    common = common_favorites(user_id, friend_ids)
+    items = [
+        {
+            "_id": friend_id,
+            "common_favorites": common[friend_id],
+            "common_favorites_count": len(common[friend_id]),
+        }
+        for friend_id in friend_ids
+    ]
+    next_offset = offset + len(friends)
+    return json_response(make_entry(dumps({
+        "items": items,
+        "total_friends": total,
+        "next_cursor": str(next_offset) if next_offset < total else None,
+        "limit": limit,
+    })), private=True)
+
+
+@bp.route("/my_friends/<friend_id>", methods=["GET"])
+@cached(FRIENDS_CACHE_NAMESPACE, CACHE_TTL_SECONDS, private=True)
+def get_my_friend(friend_id):
     # Try ObjectId, then string _id
     try:
         doc = my_friends_collection.find_one({"_id": ObjectId(friend_id)})
@@ -84,60 +545,80 @@ def get_my_friend(friend_id):
     if not doc:
         return jsonify({"error": "Friend not found"}), 404
 
-    doc = serialize_id(doc)
-    r.setex(cache_key, CACHE_TTL_SECONDS, json.dumps(doc))
-    return jsonify(doc)
+    return serialize_id(doc)
 
 
 # ---- Routes: Profile & Favorites --------------------------------------------
-@app.route("/myprofile", methods=["GET"])
+@bp.route("/myprofile", methods=["GET"])
+@cached(request_user_namespace, CACHE_TTL_SECONDS, private=True)
 def get_profile():
-    user_id = request.args.get("user_id", "ur12345678")
-    cache_key = f"profile:{user_id}"
-    cached = r.get(cache_key)
-    if cached:
-        print("cache hit! /myprofile")
-        return jsonify(json.loads(cached))
-
-    print("cache miss /myprofile -> Mongo")
-    user = find_user_any_id(user_id)
+    user = find_user_any_id(request.args.get("user_id", "ur12345678"))
     if not user:
         return jsonify({"error": "Profile not found"}), 404
 
-    user = serialize_id(user)
-    r.setex(cache_key, CACHE_TTL_SECONDS, json.dumps(user))
-    return jsonify(user)
+    return serialize_id(user)
 
 
-@app.route("/mylist", methods=["GET"])
+@bp.route("/mylist", methods=["GET"])
 def get_my_list():
     user_id = request.args.get("user_id", "ur12345678")
-    limit_param = request.args.get("limit")
     try:
-        limit = int(limit_param) if limit_param else None
-    except ValueError:
-        limit = None
+        page_args = parse_offset_page_args()
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
 
-    cache_key = f"favorites:{user_id}:{limit if limit else 'all'}"
-    cached = r.get(cache_key)
-    if cached:
-        print("cache hit! /mylist")
-        return jsonify(json.loads(cached))
+    expand = request.args.get("expand")
+    if expand not in (None, "card"):
+        return jsonify({"error": "expand must be 'card'"}), 400
 
-    print("cache miss /mylist -> Mongo")
-    doc = find_user_any_id(user_id, projection={"_id": 0, "favorites": 1})
-    if not doc or "favorites" not in doc:
+    if expand:
+        # Cards change with the movies catalog, not only with the favorites.
+        movies_version = namespace_version(r, MOVIES_CACHE_NAMESPACE)
+        cache_key = user_cache_key(user_id, "favorites", "card", movies_version, *(page_args or ("all",)))
+        cached = cache_get(r, cache_key)
+        if cached is not None:
+            return json_response(cached, private=True)
+
+    favorites = read_favorites(user_id, page_args)
+    if favorites is None:
         return jsonify({"error": "Favorites not found"}), 404
 
-    favorites = doc["favorites"] or []
-    if limit is not None and limit > 0:
-        favorites = favorites[:limit]
+    total, items = favorites
+    if expand:
+        items = hydrate_favorites(items)
+    if page_args is None:
+        body = items
+    else:
+        offset, limit = page_args
+        next_offset = offset + len(items)
+        body = {
+            "items": items,
+            "total_favorites": total,
+            "next_cursor": str(next_offset) if next_offset < total else None,
+            "limit": limit,
+        }
+
+    if expand:
+        return json_response(cache_set(r, cache_key, body, CACHE_TTL_SECONDS), private=True)
+    return json_response(make_entry(dumps(body)), private=True)
+
+
+# ---- Routes: Diagnostics -----------------------------------------------------
+@bp.route("/cache/stats", methods=["GET"])
+def get_cache_stats():
+    return jsonify(cache_stats())
+
 
-    r.setex(cache_key, CACHE_TTL_SECONDS, json.dumps(favorites))
-    return jsonify(favorites)
+# ---- App factory -------------------------------------------------------------
+def create_app():
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+    if os.environ.get("PREPARE_DATABASE", "1") != "0":
+        prepare_database()
+    return app
 
 
 # ---- Main --------------------------------------------------------------------
 if __name__ == "__main__":
     # Port 5004 to match your docker-compose and proxy
-    app.run(host="0.0.0.0", port=5004, debug=True)
+    create_app().run(host="0.0.0.0", port=5004, debug=os.environ.get("FLASK_DEBUG") == "1")
@@ -0,0 +1,75 @@
+"""
+Startup migrations storing a derived, indexed field on existing documents
+(people's name_normalized, titles' list_kind, users' id_keys).
+
+A Backfill runs when the app starts. When Mongo is not reachable yet it is
+retried in the background every BACKFILL_RETRY_SECONDS until it succeeds;
+meanwhile it is `pending`, /readyz answers 503 (see clients.py) and the
+service must not trust a miss on the field: fall back to a query on the
+source field, or at least do not cache the miss.
+
+With PREPARE_DATABASE=0 no backfill is started and none is pending: the
+database is then expected to be migrated by hand (the services' backfill
+CLI commands).
+"""
+
+import logging
+import os
+import threading
+import time
+
+from pymongo.errors import PyMongoError
+
+from .logs import get_logger, log_event
+
+BACKFILL_RETRY_SECONDS = float(os.environ.get("BACKFILL_RETRY_SECONDS", 10))
+
+log = get_logger("backfill")
+
+# The backfills started in this process, for readiness checks.
+started_backfills = []
+
+
+class Backfill:
+    """A startup migration; `run()` updates the documents missing the field and returns how many."""
+
+    def __init__(self, name, run):
+        self.name = name
+        self.run = run
+        self.started = False
+        self.done = False
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self):
+        return self.started and not self.done
+
+    def attempt(self):
+        try:
+            updated = self.run()
+        except PyMongoError as exc:
+            log_event(log, "backfill_failed", logging.WARNING, backfill=self.name, error=str(exc))
+            return False
+        self.done = True
+        if updated:
+            log_event(log, "backfilled", backfill=self.name, documents=updated)
+        return True
+
+    def start(self):
+        """Run the backfill now; when that fails, keep retrying it in a background thread."""
+        with self._lock:
+            if not self.started:
+                self.started = True
+                started_backfills.append(self)
+        if self.done or self.attempt():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._retry, name=f"backfill-{self.name}", daemon=True)
+                self._thread.start()
+
+    def _retry(self):
+        while not self.done:
+            time.sleep(BACKFILL_RETRY_SECONDS)
+            self.attempt()
@@ -0,0 +1,832 @@
+"""
+Redis cache shared by the API services.
+
+Values are stored as pre-encoded JSON bytes prefixed with a strong ETag
+computed once at fill time. A hit is served as-is with json_response(),
+which answers If-None-Match with a 304, instead of being decoded and
+re-encoded per request.
+
+Reads go through two tiers: a bounded per-process LRU (L1) in front of Redis
+(L2). L1 holds the encoded bytes for at most L1_CACHE_TTL_SECONDS; writes
+publish on a Redis channel so every worker drops the affected L1 entries.
+
+Keys live in versioned namespaces: every key embeds the namespace's current
+generation (``<namespace>:v<N>:...``), and a write invalidates the whole
+namespace with a single INCR. Entries from older generations are never read
+again and simply expire through their TTL. Query parameters enter keys in
+canonical form (see canonical_query()), so ``?limit=01`` and ``?limit=1``
+share an entry.
+
+Misses are filled single-flight: one worker takes a short-lived Redis lock
+and recomputes the value while the others serve the last known copy or wait
+briefly for the fill, so an expiring key costs one Mongo query, not one per
+concurrent request.
+
+The cache never fails a request: when Redis errors, reads count as misses,
+writes and invalidations are dropped (entries then live until their TTL),
+namespace lookups fall back to the last version this process saw, and the
+error is counted in cache_stats() and reported at most every
+ERROR_REPORT_SECONDS.
+
+Writes that affect only part of a namespace use tags instead: an entry
+lists the tags it depends on (``list:all``, ``doc:<id>``...), its key is
+added to a Redis sorted set per tag, scored by when its stale copy expires
+(members past that are dropped as new ones arrive, and a set expires with
+its last member), and invalidate_tags() deletes just the keys in the
+touched sets. A fill
+registers its key before computing and only stores the result if the
+registration survived, so a value computed from pre-write data is never
+cached after the write's invalidation.
+
+Lists that only ever grow can be kept as a Redis list of ids instead
+(cached_ids()): a write appends its ids in place with append_ids(), and
+the response is assembled from the per-item entries and kept in L1 only
+(local_entry()).
+
+Lookups, fills and errors are also counted per namespace in the
+cache_requests_total metric (see metrics.py).
+"""
+
+import functools
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+
+import redis
+from flask import Response, request
+
+from .clients import get_redis
+from .logs import get_logger, log_event
+from .metrics import count_cache
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - falls back to the stdlib encoder
+    orjson = None
+
+NAMESPACE_VERSION_PREFIX = "cache_ns:"
+FILL_LOCK_PREFIX = "fill_lock:"
+STALE_PREFIX = "stale:"
+# Sorted sets; the plain sets once kept under "cache_tag:" expire on their own.
+TAG_PREFIX = "cache_tags:"
+INVALIDATION_CHANNEL = os.environ.get("CACHE_INVALIDATION_CHANNEL", "cache_invalidation")
+
+FILL_LOCK_MS = int(os.environ.get("CACHE_FILL_LOCK_MS", 5000))
+FILL_WAIT_SECONDS = float(os.environ.get("CACHE_FILL_WAIT_SECONDS", 2.0))
+FILL_POLL_SECONDS = 0.02
+STALE_TTL_FACTOR = 10
+
+CACHE_MAX_AGE_SECONDS = int(os.environ.get("CACHE_TTL_SECONDS", 60))
+ETAG_LENGTH = 32
+
+L1_MAX_ENTRIES = int(os.environ.get("L1_CACHE_MAX_ENTRIES", 2048))
+L1_MAX_BYTES = int(os.environ.get("L1_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+L1_TTL_SECONDS = float(os.environ.get("L1_CACHE_TTL_SECONDS", 30))
+
+log = get_logger("cache")
+
+ERROR_REPORT_SECONDS = 10.0
+# Key parts longer than this are replaced by their hash.
+MAX_KEY_PART_LENGTH = 128
+INTEGER_PATTERN = re.compile(r"^[+-]?\d+$")
+
+# Only the lock owner may release it; a slow filler whose lock already
+# expired must not delete the lock of the worker that took over.
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# Register the key ARGV[1] in the tag sets until ARGV[3] (Unix time), drop
+# the members that expired by ARGV[2] and keep each set until its last member
+# expires.
+TAG_ENTRY_SCRIPT = """
+for _, tag_key in ipairs(KEYS) do
+    redis.call("zremrangebyscore", tag_key, "-inf", ARGV[2])
+    redis.call("zadd", tag_key, ARGV[3], ARGV[1])
+    local last = redis.call("zrange", tag_key, -1, -1, "withscores")
+    redis.call("expireat", tag_key, math.ceil(tonumber(last[2])))
+end
+return #KEYS
+"""
+
+# Store a filled entry and its stale copy only while the key is still in
+# every tag set it registered in: an invalidation since then removed it.
+SET_IF_TAGGED_SCRIPT = """
+for i = 3, #KEYS do
+    if not redis.call("zscore", KEYS[i], KEYS[1]) then
+        return 0
+    end
+end
+redis.call("setex", KEYS[1], ARGV[1], ARGV[3])
+redis.call("setex", KEYS[2], ARGV[2], ARGV[3])
+return 1
+"""
+
+# Delete every key in the tag sets, its stale copy and the sets; returns the keys.
+INVALIDATE_TAGS_SCRIPT = """
+local deleted = {}
+for _, tag_key in ipairs(KEYS) do
+    local members = redis.call("zrange", tag_key, 0, -1)
+    for first = 1, #members, 500 do
+        local batch = {}
+        for i = first, math.min(first + 499, #members) do
+            batch[#batch + 1] = members[i]
+            batch[#batch + 1] = ARGV[1] .. members[i]
+            deleted[#deleted + 1] = members[i]
+        end
+        redis.call("del", unpack(batch))
+    end
+    redis.call("del", tag_key)
+end
+return deleted
+"""
+
+# Id lists start with a placeholder so that an empty list can be cached.
+ID_LIST_PLACEHOLDER = ""
+
+# Store a filled id list unless an append_ids() found it missing meanwhile
+# (and dropped the fill's registration) or another fill stored it first.
+STORE_IDS_SCRIPT = """
+if not redis.call("zscore", KEYS[2], KEYS[1]) or redis.call("exists", KEYS[1]) == 1 then
+    return 0
+end
+for first = 2, #ARGV, 1000 do
+    redis.call("rpush", KEYS[1], unpack(ARGV, first, math.min(first + 999, #ARGV)))
+end
+redis.call("expire", KEYS[1], ARGV[1])
+return 1
+"""
+
+# Append ids to a cached id list; when it is not cached, cancel any fill in flight.
+APPEND_IDS_SCRIPT = """
+if redis.call("exists", KEYS[1]) == 0 then
+    redis.call("zrem", KEYS[2], KEYS[1])
+    return 0
+end
+for first = 1, #ARGV, 1000 do
+    redis.call("rpush", KEYS[1], unpack(ARGV, first, math.min(first + 999, #ARGV)))
+end
+return 1
+"""
+
+# An encoded JSON payload and its strong ETag (hex digest of the body).
+CacheEntry = namedtuple("CacheEntry", ["etag", "body"])
+
+
+class LocalCache:
+    """Thread-safe LRU with per-entry TTL, bounded by entry count and bytes."""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] <= now:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, size, ttl):
+        if size > self.max_bytes or ttl <= 0:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + ttl)
+            self._size_bytes += size
+            while len(self._entries) > self.max_entries or self._size_bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._size_bytes -= evicted_size
+                self.evictions += 1
+
+    def delete(self, keys=(), prefixes=()):
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._remove(key)
+            if prefixes:
+                prefixes = tuple(prefixes)
+                for key in [key for key in self._entries if key.startswith(prefixes)]:
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._size_bytes -= size
+
+
+local_cache = LocalCache(L1_MAX_ENTRIES, L1_MAX_BYTES)
+redis_stats = {"hits": 0, "misses": 0, "errors": 0}
+_listener = {"pid": None}
+_listener_lock = threading.Lock()
+_last_versions = {}
+_last_error_report = [0.0]
+
+
+class _Uncached(Exception):
+    """Raised inside a fill to hand a view's own response back uncached."""
+
+    def __init__(self, response):
+        super().__init__()
+        self.response = response
+
+
+def report_error(exc, key=None):
+    """Count a Redis error (against `key`'s namespace); log it at most every ERROR_REPORT_SECONDS."""
+    redis_stats["errors"] += 1
+    count_cache(key or "unknown", "error")
+    now = time.monotonic()
+    if now - _last_error_report[0] >= ERROR_REPORT_SECONDS:
+        _last_error_report[0] = now
+        log_event(log, "cache_unavailable", logging.WARNING, error=str(exc))
+
+
+def dumps(value):
+    """Encode `value` as compact JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+def loads(raw):
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+def make_entry(body):
+    etag = hashlib.blake2b(body, digest_size=ETAG_LENGTH // 2).hexdigest()
+    return CacheEntry(etag, body)
+
+
+def pack_entry(entry):
+    return entry.etag.encode() + entry.body
+
+
+def unpack_entry(raw):
+    return CacheEntry(raw[:ETAG_LENGTH].decode(), raw[ETAG_LENGTH:])
+
+
+def json_response(entry, status=200, private=False):
+    """
+    Send an already-encoded CacheEntry with its ETag and a Cache-Control
+    max-age matching the cache TTL; a matching If-None-Match gets a 304.
+
+    A `private` response (per-user data) is kept out of shared caches and
+    revalidated by the browser on every use, so a user sees their own
+    writes at once: "Cache-Control: private, no-cache".
+    """
+    response = Response(entry.body, status=status, mimetype="application/json")
+    response.set_etag(entry.etag)
+    set_cache_control(response, private)
+    return response.make_conditional(request)
+
+
+def set_cache_control(response, private=False):
+    if private:
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    else:
+        response.cache_control.public = True
+        response.cache_control.max_age = CACHE_MAX_AGE_SECONDS
+
+
+def cache_stats():
+    return {"l1": local_cache.stats(), "l2": dict(redis_stats)}
+
+
+def key_part(value):
+    text = str(value)
+    if len(text) <= MAX_KEY_PART_LENGTH:
+        return text
+    return "h" + hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def canonical_value(value):
+    """Strip whitespace and write integers without sign or leading zeros: ' 01' -> '1'."""
+    value = value.strip()
+    return str(int(value)) if INTEGER_PATTERN.match(value) else value
+
+
+def canonical_query(args, params):
+    """
+    Canonical ``name=value&...`` string of the query parameters `params`
+    (names, or a {name: canonicalizer} dict) found in `args`. Parameters
+    are sorted, empty ones dropped and repeated ones joined in order.
+    """
+    if not isinstance(params, dict):
+        params = {name: canonical_value for name in params}
+    parts = []
+    for name in sorted(params):
+        values = []
+        for value in args.getlist(name):
+            try:
+                value = params[name](value)
+            except (TypeError, ValueError):
+                value = value.strip()
+            if value is not None and str(value) != "":
+                values.append(str(value))
+        if values:
+            parts.append(f"{name}={','.join(values)}")
+    return "&".join(parts)
+
+
+def apply_invalidation(message):
+    local_cache.delete(message.get("keys", ()), message.get("prefixes", ()))
+
+
+def publish_invalidation(r, keys=(), prefixes=()):
+    """Drop keys/prefixes from L1 here and in every other worker."""
+    message = {"keys": list(keys), "prefixes": list(prefixes)}
+    apply_invalidation(message)
+    try:
+        r.publish(INVALIDATION_CHANNEL, dumps(message))
+    except redis.RedisError as exc:
+        report_error(exc, INVALIDATION_CHANNEL)
+
+
+def _listen_for_invalidations(r):
+    while True:
+        try:
+            pubsub = r.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Polling keeps an idle channel from hitting the socket timeout.
+            while True:
+                message = pubsub.get_message(timeout=1.0)
+                if message is not None:
+                    apply_invalidation(loads(message["data"]))
+        except (redis.RedisError, ValueError) as exc:
+            # Messages may have been missed while disconnected.
+            log_event(log, "invalidation_listener_error", logging.WARNING, error=str(exc))
+            local_cache.clear()
+            time.sleep(1)
+
+
+def ensure_invalidation_listener(r):
+    """Start this process's pub/sub listener (again after a fork)."""
+    pid = os.getpid()
+    if _listener["pid"] == pid:
+        return
+    with _listener_lock:
+        if _listener["pid"] == pid:
+            return
+        if _listener["pid"] is not None:
+            local_cache.clear()
+        threading.Thread(
+            target=_listen_for_invalidations,
+            args=(r,),
+            name="cache-invalidation",
+            daemon=True,
+        ).start()
+        _listener["pid"] = pid
+
+
+def _remember(r, key, raw):
+    ensure_invalidation_listener(r)
+    entry = unpack_entry(raw)
+    local_cache.set(key, entry, len(raw), L1_TTL_SECONDS)
+    return entry
+
+
+def execute(pipe):
+    """Run a pipeline of cache writes; returns its results, or None if Redis failed."""
+    try:
+        return pipe.execute()
+    except redis.RedisError as exc:
+        report_error(exc)
+        return None
+
+
+def cache_get(r, key):
+    """Return the CacheEntry for `key` from L1, then Redis, or None."""
+    entry = local_cache.get(key)
+    if entry is not None:
+        count_cache(key, "l1_hit")
+        return entry
+
+    try:
+        raw = r.get(key)
+    except redis.RedisError as exc:
+        report_error(exc, key)
+        return None
+    if raw is None:
+        redis_stats["misses"] += 1
+        count_cache(key, "miss")
+        return None
+    redis_stats["hits"] += 1
+    count_cache(key, "l2_hit")
+    return _remember(r, key, raw)
+
+
+def cache_get_many(r, keys, local=True):
+    """
+    Like cache_get for many keys, with one MGET for the L1 misses. Without
+    `local`, the entries read from Redis are not kept in L1 (for large
+    one-off reads that would evict the hot entries).
+    """
+    values = [local_cache.get(key) for key in keys]
+    pending = [index for index, entry in enumerate(values) if entry is None]
+    if len(pending) < len(keys):
+        count_cache(keys[0], "l1_hit", len(keys) - len(pending))
+    if not pending:
+        return values
+
+    try:
+        raws = r.mget([keys[index] for index in pending])
+    except redis.RedisError as exc:
+        report_error(exc, keys[0])
+        return values
+    for index, raw in zip(pending, raws):
+        if raw is None:
+            redis_stats["misses"] += 1
+            count_cache(keys[index], "miss")
+            continue
+        redis_stats["hits"] += 1
+        count_cache(keys[index], "l2_hit")
+        values[index] = _remember(r, keys[index], raw) if local else unpack_entry(raw)
+    return values
+
+
+def namespace_tags(namespace, *tags):
+    """Tags scoped to `namespace`: namespace_tags("movies_series", "list:all") -> ["movies_series:list:all"]."""
+    return [f"{namespace}:{tag}" for tag in tags]
+
+
+def tag_key(tag):
+    return f"{TAG_PREFIX}{tag}"
+
+
+def tag_entry(pipe, key, tags, ttl):
+    """Queue adding `key` to the set of each tag until its stale copy expires (TAG_ENTRY_SCRIPT)."""
+    if tags:
+        now = time.time()
+        pipe.eval(TAG_ENTRY_SCRIPT, len(tags), *map(tag_key, tags), key, now, now + ttl * STALE_TTL_FACTOR)
+
+
+def cache_set(r, key, value, ttl, pipe=None, tags=(), local=True):
+    """
+    SETEX `value` as JSON, registered under `tags`, and keep it in L1 if
+    `local`; returns its CacheEntry. On `pipe` the write is only queued:
+    run the pipeline with execute().
+    """
+    entry = make_entry(dumps(value))
+    raw = pack_entry(entry)
+    if pipe is not None:
+        pipe.setex(key, ttl, raw)
+        tag_entry(pipe, key, tags, ttl)
+    else:
+        try:
+            if tags:
+                pipe = r.pipeline(transaction=False)
+                pipe.setex(key, ttl, raw)
+                tag_entry(pipe, key, tags, ttl)
+                pipe.execute()
+            else:
+                r.setex(key, ttl, raw)
+        except redis.RedisError as exc:
+            report_error(exc, key)
+            return entry
+    if local:
+        ensure_invalidation_listener(r)
+        local_cache.set(key, entry, len(raw), min(ttl, L1_TTL_SECONDS))
+    return entry
+
+
+def cache_set_many(r, values, ttl, tags=None, local=True):
+    """
+    Cache every {key: value} in one pipelined round trip, each under its
+    {key: tags}; returns {key: CacheEntry}.
+    """
+    tags = tags or {}
+    pipe = r.pipeline(transaction=False)
+    entries = {
+        key: cache_set(r, key, value, ttl, pipe=pipe, tags=tags.get(key, ()), local=local)
+        for key, value in values.items()
+    }
+    if entries:
+        execute(pipe)
+    return entries
+
+
+def namespace_version(r, namespace):
+    version_key = f"{NAMESPACE_VERSION_PREFIX}{namespace}"
+    version = local_cache.get(version_key)
+    if version is None:
+        ensure_invalidation_listener(r)
+        try:
+            raw = r.get(version_key)
+        except redis.RedisError as exc:
+            report_error(exc, namespace)
+            return _last_versions.get(namespace, 0)
+        version = int(raw) if raw else 0
+        _last_versions[namespace] = version
+        local_cache.set(version_key, version, len(version_key), L1_TTL_SECONDS)
+    return version
+
+
+def namespaced_key(namespace, version, *parts):
+    return ":".join([namespace, f"v{version}", *(key_part(part) for part in parts)])
+
+
+def bump_namespace(r, namespace):
+    """Invalidate every key of `namespace`; returns the new generation (None if Redis failed)."""
+    try:
+        version = r.incr(f"{NAMESPACE_VERSION_PREFIX}{namespace}")
+    except redis.RedisError as exc:
+        report_error(exc, namespace)
+        version = None
+    publish_invalidation(
+        r,
+        keys=[f"{NAMESPACE_VERSION_PREFIX}{namespace}"],
+        prefixes=[f"{namespace}:"],
+    )
+    return version
+
+
+def invalidate_tags(r, tags):
+    """Delete every entry registered under one of `tags`, here and in L1; returns how many."""
+    try:
+        keys = r.eval(INVALIDATE_TAGS_SCRIPT, len(tags), *map(tag_key, tags), STALE_PREFIX)
+    except redis.RedisError as exc:
+        report_error(exc, tags[0] if tags else None)
+        return 0
+    keys = [key.decode() if isinstance(key, bytes) else key for key in keys]
+    if keys:
+        publish_invalidation(r, keys=keys)
+    return len(keys)
+
+
+def _store_tagged(r, cache_key, entry, ttl, tags):
+    """Store a fill under SET_IF_TAGGED_SCRIPT; False when an invalidation got there first."""
+    raw = pack_entry(entry)
+    tag_keys = [tag_key(tag) for tag in tags]
+    try:
+        stored = r.eval(
+            SET_IF_TAGGED_SCRIPT,
+            2 + len(tag_keys),
+            cache_key,
+            f"{STALE_PREFIX}{cache_key}",
+            *tag_keys,
+            ttl,
+            ttl * STALE_TTL_FACTOR,
+            raw,
+        )
+    except redis.RedisError as exc:
+        report_error(exc, cache_key)
+        return False
+    if stored:
+        ensure_invalidation_listener(r)
+        local_cache.set(cache_key, entry, len(raw), min(ttl, L1_TTL_SECONDS))
+    return bool(stored)
+
+
+def cached_fill(r, cache_key, ttl, compute, tags=()):
+    """
+    Return the CacheEntry cached under `cache_key`, calling `compute()` on a
+    miss. Across all workers sharing Redis only the holder of the fill lock
+    runs `compute()`; the rest get the stale copy kept next to the key, or
+    poll for up to FILL_WAIT_SECONDS before computing themselves. The entry
+    is registered under `tags` (see invalidate_tags()).
+    """
+    cached = cache_get(r, cache_key)
+    if cached is not None:
+        return cached
+
+    def fill():
+        count_cache(cache_key, "fill")
+        return compute()
+
+    stale_key = f"{STALE_PREFIX}{cache_key}"
+    lock_key = f"{FILL_LOCK_PREFIX}{cache_key}"
+    token = uuid.uuid4().hex
+    try:
+        locked = r.set(lock_key, token, nx=True, px=FILL_LOCK_MS)
+    except redis.RedisError as exc:
+        report_error(exc, cache_key)
+        return make_entry(dumps(fill()))
+
+    if locked:
+        try:
+            # The previous lock holder may have filled the key meanwhile.
+            if tags:
+                pipe = r.pipeline(transaction=False)
+                tag_entry(pipe, cache_key, tags, ttl)
+                pipe.get(cache_key)
+                raw = pipe.execute()[-1]
+            else:
+                raw = r.get(cache_key)
+            if raw is not None:
+                return _remember(r, cache_key, raw)
+
+            if tags:
+                entry = make_entry(dumps(fill()))
+                _store_tagged(r, cache_key, entry, ttl, tags)
+                return entry
+
+            pipe = r.pipeline(transaction=False)
+            entry = cache_set(r, cache_key, fill(), ttl, pipe=pipe)
+            pipe.setex(stale_key, ttl * STALE_TTL_FACTOR, pack_entry(entry))
+            execute(pipe)
+            return entry
+        except redis.RedisError as exc:
+            report_error(exc, cache_key)
+            return make_entry(dumps(fill()))
+        finally:
+            try:
+                r.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+            except redis.RedisError as exc:
+                report_error(exc, cache_key)
+
+    try:
+        stale = r.get(stale_key)
+        if stale is not None:
+            count_cache(cache_key, "stale")
+            return unpack_entry(stale)
+
+        deadline = time.monotonic() + FILL_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(FILL_POLL_SECONDS)
+            raw = r.get(cache_key)
+            if raw is not None:
+                return _remember(r, cache_key, raw)
+    except redis.RedisError as exc:
+        report_error(exc, cache_key)
+
+    return make_entry(dumps(fill()))
+
+
+def _remember_ids(r, key, ids):
+    ensure_invalidation_listener(r)
+    local_cache.set(key, ids, sum(map(len, ids)) + len(ids), L1_TTL_SECONDS)
+    return ids
+
+
+def cached_ids(r, key, ttl, load_ids, tag):
+    """
+    Return the ids cached in the Redis list `key`, calling `load_ids()` on a
+    miss. Fills are single-flight as in cached_fill() and registered under
+    `tag`, so a fill that an append_ids() overtook is not stored.
+    """
+    ids = local_cache.get(key)
+    if ids is not None:
+        count_cache(key, "l1_hit")
+        return ids
+
+    def fill():
+        count_cache(key, "fill")
+        return [str(value) for value in load_ids()]
+
+    try:
+        raw = r.lrange(key, 0, -1)
+    except redis.RedisError as exc:
+        report_error(exc, key)
+        return fill()
+    if raw:
+        redis_stats["hits"] += 1
+        count_cache(key, "l2_hit")
+        return _remember_ids(r, key, [value.decode() for value in raw[1:]])
+    redis_stats["misses"] += 1
+    count_cache(key, "miss")
+
+    lock_key = f"{FILL_LOCK_PREFIX}{key}"
+    token = uuid.uuid4().hex
+    try:
+        if not r.set(lock_key, token, nx=True, px=FILL_LOCK_MS):
+            deadline = time.monotonic() + FILL_WAIT_SECONDS
+            while time.monotonic() < deadline:
+                time.sleep(FILL_POLL_SECONDS)
+                raw = r.lrange(key, 0, -1)
+                if raw:
+                    return _remember_ids(r, key, [value.decode() for value in raw[1:]])
+            return fill()
+    except redis.RedisError as exc:
+        report_error(exc, key)
+        return fill()
+
+    ids = None
+    try:
+        pipe = r.pipeline(transaction=False)
+        tag_entry(pipe, key, [tag], ttl)
+        pipe.lrange(key, 0, -1)
+        raw = pipe.execute()[-1]
+        if raw:
+            return _remember_ids(r, key, [value.decode() for value in raw[1:]])
+        ids = fill()
+        if r.eval(STORE_IDS_SCRIPT, 2, key, tag_key(tag), ttl, ID_LIST_PLACEHOLDER, *ids):
+            _remember_ids(r, key, ids)
+        return ids
+    except redis.RedisError as exc:
+        report_error(exc, key)
+        return ids if ids is not None else fill()
+    finally:
+        try:
+            r.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+        except redis.RedisError as exc:
+            report_error(exc, key)
+
+
+def append_ids(pipe, key, ids, tag):
+    """
+    Queue appending `ids` to the id list `key` if it is cached. Run the
+    pipeline with execute(), then drop the list from L1 with
+    publish_invalidation().
+    """
+    pipe.eval(APPEND_IDS_SCRIPT, 2, key, tag_key(tag), *ids)
+
+
+def local_entry(r, key, build):
+    """
+    The CacheEntry `build()` returns, kept under `key` in this process's L1
+    only: for responses assembled from other entries. publish_invalidation()
+    drops it in every worker.
+    """
+    entry = local_cache.get(key)
+    if entry is not None:
+        count_cache(key, "l1_hit")
+        return entry
+    entry = build()
+    ensure_invalidation_listener(r)
+    local_cache.set(key, entry, len(entry.body), L1_TTL_SECONDS)
+    return entry
+
+
+def view_key_parts(endpoint, view_args, args, query=()):
+    """Key parts of a view's response: endpoint, URL arguments, canonical query."""
+    parts = [endpoint, *(view_args[name] for name in sorted(view_args))]
+    canonical = canonical_query(args, query)
+    return parts + [canonical] if canonical else parts
+
+
+def cached(namespace, ttl, query=(), tags=(), private=False):
+    """
+    Cache a Flask view's JSON result in `namespace` (a name, or a callable
+    returning one for the current request) for `ttl` seconds, registered
+    under `tags` (or a callable returning them from the URL arguments).
+    `private` responses are sent as in json_response().
+
+    The key holds the endpoint, its URL arguments and the canonical form of
+    the query parameters listed in `query` (see canonical_query()). The view
+    returns JSON-serializable data, which is cached and sent with an ETag;
+    when it returns a response of its own (e.g. a 400 or 404) that response
+    is sent as-is and nothing is cached.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            r = get_redis()
+            name = namespace() if callable(namespace) else namespace
+            cache_key = namespaced_key(
+                name,
+                namespace_version(r, name),
+                *view_key_parts(request.endpoint, kwargs, request.args, query),
+            )
+
+            def compute():
+                result = view(*args, **kwargs)
+                if isinstance(result, (Response, tuple)):
+                    raise _Uncached(result)
+                return result
+
+            entry_tags = tags(**kwargs) if callable(tags) else tags
+            try:
+                return json_response(cached_fill(r, cache_key, ttl, compute, entry_tags), private=private)
+            except _Uncached as uncached:
+                return uncached.response
+
+        return wrapper
+
+    return decorator
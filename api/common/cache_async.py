@@ -0,0 +1,384 @@
+"""
+asyncio counterparts of the cache helpers in cache.py, for the async
+serving mode (movies_series_async.py).
+
+Keys, stored values, ETags, namespaces and the single-flight fill protocol
+are exactly those of cache.py, so both serving modes can share one Redis.
+The per-process L1 and its stats are cache.py's; its invalidations are
+received by an asyncio task instead of a thread. Redis errors are handled
+as in cache.py: the cache degrades, the request does not fail.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+
+import redis
+from quart import Response, request
+
+from .cache import (
+    FILL_LOCK_MS,
+    FILL_LOCK_PREFIX,
+    FILL_POLL_SECONDS,
+    FILL_WAIT_SECONDS,
+    ID_LIST_PLACEHOLDER,
+    INVALIDATE_TAGS_SCRIPT,
+    INVALIDATION_CHANNEL,
+    L1_TTL_SECONDS,
+    NAMESPACE_VERSION_PREFIX,
+    RELEASE_LOCK_SCRIPT,
+    SET_IF_TAGGED_SCRIPT,
+    STALE_PREFIX,
+    STORE_IDS_SCRIPT,
+    STALE_TTL_FACTOR,
+    _last_versions,
+    apply_invalidation,
+    dumps,
+    loads,
+    local_cache,
+    log,
+    make_entry,
+    pack_entry,
+    redis_stats,
+    report_error,
+    set_cache_control,
+    tag_entry,
+    tag_key,
+    unpack_entry,
+)
+from .logs import log_event
+from .metrics import count_cache
+
+
+async def json_response(entry, status=200, private=False):
+    """Quart version of cache.json_response()."""
+    response = Response(entry.body, status=status, mimetype="application/json")
+    response.set_etag(entry.etag)
+    set_cache_control(response, private)
+    return await response.make_conditional(request)
+
+
+async def publish_invalidation(r, keys=(), prefixes=()):
+    message = {"keys": list(keys), "prefixes": list(prefixes)}
+    apply_invalidation(message)
+    try:
+        await r.publish(INVALIDATION_CHANNEL, dumps(message))
+    except redis.RedisError as exc:
+        report_error(exc, INVALIDATION_CHANNEL)
+
+
+async def listen_for_invalidations(r):
+    """Run for the lifetime of the app: drop L1 entries invalidated by any worker."""
+    while True:
+        try:
+            async with r.pubsub(ignore_subscribe_messages=True) as pubsub:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    apply_invalidation(loads(message["data"]))
+        except (redis.RedisError, ValueError) as exc:
+            # Messages may have been missed while disconnected.
+            log_event(log, "invalidation_listener_error", logging.WARNING, error=str(exc))
+            local_cache.clear()
+            await asyncio.sleep(1)
+
+
+def _remember(key, raw):
+    entry = unpack_entry(raw)
+    local_cache.set(key, entry, len(raw), L1_TTL_SECONDS)
+    return entry
+
+
+async def cache_get(r, key):
+    entry = local_cache.get(key)
+    if entry is not None:
+        count_cache(key, "l1_hit")
+        return entry
+
+    try:
+        raw = await r.get(key)
+    except redis.RedisError as exc:
+        report_error(exc, key)
+        return None
+    if raw is None:
+        redis_stats["misses"] += 1
+        count_cache(key, "miss")
+        return None
+    redis_stats["hits"] += 1
+    count_cache(key, "l2_hit")
+    return _remember(key, raw)
+
+
+async def cache_get_many(r, keys, local=True):
+    values = [local_cache.get(key) for key in keys]
+    pending = [index for index, entry in enumerate(values) if entry is None]
+    if len(pending) < len(keys):
+        count_cache(keys[0], "l1_hit", len(keys) - len(pending))
+    if not pending:
+        return values
+
+    try:
+        raws = await r.mget([keys[index] for index in pending])
+    except redis.RedisError as exc:
+        report_error(exc, keys[0])
+        return values
+    for index, raw in zip(pending, raws):
+        if raw is None:
+            redis_stats["misses"] += 1
+            count_cache(keys[index], "miss")
+            continue
+        redis_stats["hits"] += 1
+        count_cache(keys[index], "l2_hit")
+        values[index] = _remember(keys[index], raw) if local else unpack_entry(raw)
+    return values
+
+
+async def cache_set(r, key, value, ttl, pipe=None, tags=(), local=True):
+    """SETEX `value` as JSON, registered under `tags`; on `pipe` the write is only queued."""
+    entry = make_entry(dumps(value))
+    raw = pack_entry(entry)
+    if pipe is not None:
+        pipe.setex(key, ttl, raw)
+        tag_entry(pipe, key, tags, ttl)
+    else:
+        try:
+            if tags:
+                pipe = r.pipeline(transaction=False)
+                pipe.setex(key, ttl, raw)
+                tag_entry(pipe, key, tags, ttl)
+                await pipe.execute()
+            else:
+                await r.setex(key, ttl, raw)
+        except redis.RedisError as exc:
+            report_error(exc, key)
+            return entry
+    if local:
+        local_cache.set(key, entry, len(raw), min(ttl, L1_TTL_SECONDS))
+    return entry
+
+
+async def execute(pipe):
+    try:
+        return await pipe.execute()
+    except redis.RedisError as exc:
+        report_error(exc)
+        return None
+
+
+async def cache_set_many(r, values, ttl, tags=None, local=True):
+    tags = tags or {}
+    pipe = r.pipeline(transaction=False)
+    entries = {
+        key: await cache_set(r, key, value, ttl, pipe=pipe, tags=tags.get(key, ()), local=local)
+        for key, value in values.items()
+    }
+    if entries:
+        await execute(pipe)
+    return entries
+
+
+async def namespace_version(r, namespace):
+    version_key = f"{NAMESPACE_VERSION_PREFIX}{namespace}"
+    version = local_cache.get(version_key)
+    if version is None:
+        try:
+            raw = await r.get(version_key)
+        except redis.RedisError as exc:
+            report_error(exc, namespace)
+            return _last_versions.get(namespace, 0)
+        version = int(raw) if raw else 0
+        _last_versions[namespace] = version
+        local_cache.set(version_key, version, len(version_key), L1_TTL_SECONDS)
+    return version
+
+
+async def bump_namespace(r, namespace):
+    try:
+        version = await r.incr(f"{NAMESPACE_VERSION_PREFIX}{namespace}")
+    except redis.RedisError as exc:
+        report_error(exc, namespace)
+        version = None
+    await publish_invalidation(
+        r,
+        keys=[f"{NAMESPACE_VERSION_PREFIX}{namespace}"],
+        prefixes=[f"{namespace}:"],
+    )
+    return version
+
+
+async def invalidate_tags(r, tags):
+    try:
+        keys = await r.eval(INVALIDATE_TAGS_SCRIPT, len(tags), *map(tag_key, tags), STALE_PREFIX)
+    except redis.RedisError as exc:
+        report_error(exc, tags[0] if tags else None)
+        return 0
+    keys = [key.decode() if isinstance(key, bytes) else key for key in keys]
+    if keys:
+        await publish_invalidation(r, keys=keys)
+    return len(keys)
+
+
+async def _store_tagged(r, cache_key, entry, ttl, tags):
+    raw = pack_entry(entry)
+    tag_keys = [tag_key(tag) for tag in tags]
+    try:
+        stored = await r.eval(
+            SET_IF_TAGGED_SCRIPT,
+            2 + len(tag_keys),
+            cache_key,
+            f"{STALE_PREFIX}{cache_key}",
+            *tag_keys,
+            ttl,
+            ttl * STALE_TTL_FACTOR,
+            raw,
+        )
+    except redis.RedisError as exc:
+        report_error(exc, cache_key)
+        return False
+    if stored:
+        local_cache.set(cache_key, entry, len(raw), min(ttl, L1_TTL_SECONDS))
+    return bool(stored)
+
+
+async def cached_fill(r, cache_key, ttl, compute, tags=()):
+    """cache.cached_fill() with an async `compute`."""
+    cached = await cache_get(r, cache_key)
+    if cached is not None:
+        return cached
+
+    async def fill():
+        count_cache(cache_key, "fill")
+        return await compute()
+
+    stale_key = f"{STALE_PREFIX}{cache_key}"
+    lock_key = f"{FILL_LOCK_PREFIX}{cache_key}"
+    token = uuid.uuid4().hex
+    try:
+        locked = await r.set(lock_key, token, nx=True, px=FILL_LOCK_MS)
+    except redis.RedisError as exc:
+        report_error(exc, cache_key)
+        return make_entry(dumps(await fill()))
+
+    if locked:
+        try:
+            if tags:
+                pipe = r.pipeline(transaction=False)
+                tag_entry(pipe, cache_key, tags, ttl)
+                pipe.get(cache_key)
+                raw = (await pipe.execute())[-1]
+            else:
+                raw = await r.get(cache_key)
+            if raw is not None:
+                return _remember(cache_key, raw)
+
+            if tags:
+                entry = make_entry(dumps(await fill()))
+                await _store_tagged(r, cache_key, entry, ttl, tags)
+                return entry
+
+            pipe = r.pipeline(transaction=False)
+            entry = await cache_set(r, cache_key, await fill(), ttl, pipe=pipe)
+            pipe.setex(stale_key, ttl * STALE_TTL_FACTOR, pack_entry(entry))
+            await execute(pipe)
+            return entry
+        except redis.RedisError as exc:
+            report_error(exc, cache_key)
+            return make_entry(dumps(await fill()))
+        finally:
+            try:
+                await r.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+            except redis.RedisError as exc:
+                report_error(exc, cache_key)
+
+    try:
+        stale = await r.get(stale_key)
+        if stale is not None:
+            count_cache(cache_key, "stale")
+            return unpack_entry(stale)
+
+        deadline = time.monotonic() + FILL_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            await asyncio.sleep(FILL_POLL_SECONDS)
+            raw = await r.get(cache_key)
+            if raw is not None:
+                return _remember(cache_key, raw)
+    except redis.RedisError as exc:
+        report_error(exc, cache_key)
+
+    return make_entry(dumps(await fill()))
+
+
+def _remember_ids(key, ids):
+    local_cache.set(key, ids, sum(map(len, ids)) + len(ids), L1_TTL_SECONDS)
+    return ids
+
+
+async def cached_ids(r, key, ttl, load_ids, tag):
+    """cache.cached_ids() with an async `load_ids`."""
+    ids = local_cache.get(key)
+    if ids is not None:
+        count_cache(key, "l1_hit")
+        return ids
+
+    async def fill():
+        count_cache(key, "fill")
+        return [str(value) for value in await load_ids()]
+
+    try:
+        raw = await r.lrange(key, 0, -1)
+    except redis.RedisError as exc:
+        report_error(exc, key)
+        return await fill()
+    if raw:
+        redis_stats["hits"] += 1
+        count_cache(key, "l2_hit")
+        return _remember_ids(key, [value.decode() for value in raw[1:]])
+    redis_stats["misses"] += 1
+    count_cache(key, "miss")
+
+    lock_key = f"{FILL_LOCK_PREFIX}{key}"
+    token = uuid.uuid4().hex
+    try:
+        if not await r.set(lock_key, token, nx=True, px=FILL_LOCK_MS):
+            deadline = time.monotonic() + FILL_WAIT_SECONDS
+            while time.monotonic() < deadline:
+                await asyncio.sleep(FILL_POLL_SECONDS)
+                raw = await r.lrange(key, 0, -1)
+                if raw:
+                    return _remember_ids(key, [value.decode() for value in raw[1:]])
+            return await fill()
+    except redis.RedisError as exc:
+        report_error(exc, key)
+        return await fill()
+
+    ids = None
+    try:
+        pipe = r.pipeline(transaction=False)
+        tag_entry(pipe, key, [tag], ttl)
+        pipe.lrange(key, 0, -1)
+        raw = (await pipe.execute())[-1]
+        if raw:
+            return _remember_ids(key, [value.decode() for value in raw[1:]])
+        ids = await fill()
+        if await r.eval(STORE_IDS_SCRIPT, 2, key, tag_key(tag), ttl, ID_LIST_PLACEHOLDER, *ids):
+            _remember_ids(key, ids)
+        return ids
+    except redis.RedisError as exc:
+        report_error(exc, key)
+        return ids if ids is not None else await fill()
+    finally:
+        try:
+            await r.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+        except redis.RedisError as exc:
+            report_error(exc, key)
+
+
+async def local_entry(key, build):
+    """cache.local_entry() with an async `build`."""
+    entry = local_cache.get(key)
+    if entry is not None:
+        count_cache(key, "l1_hit")
+        return entry
+    entry = await build()
+    local_cache.set(key, entry, len(entry.body), L1_TTL_SECONDS)
+    return entry
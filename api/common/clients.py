@@ -0,0 +1,136 @@
+"""
+Lazily created, fork-safe Mongo and Redis clients for the API services.
+
+Nothing connects at import time. The first use in a process creates one
+pooled MongoClient and one Redis connection pool; a forked worker notices
+the pid change and builds its own instead of sharing the parent's sockets.
+Modules hold LazyCollection / LazyRedis handles, which resolve to the
+current process's clients on every attribute access.
+
+Pool sizes and timeouts come from the environment (see the constants).
+Both clients report their commands to metrics.py.
+"""
+
+import os
+import threading
+
+import redis
+from flask import jsonify
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from .backfill import started_backfills
+from .metrics import InstrumentedRedis, mongo_command_metrics
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", 50))
+MONGO_MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", 0))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get("MONGO_MAX_IDLE_TIME_MS", 60000))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", 5000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get("MONGO_SOCKET_TIMEOUT_MS", 10000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+
+REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
+REDIS_DB = int(os.environ.get("REDIS_DB", 0))
+REDIS_MAX_CONNECTIONS = int(os.environ.get("REDIS_MAX_CONNECTIONS", 50))
+REDIS_SOCKET_TIMEOUT = float(os.environ.get("REDIS_SOCKET_TIMEOUT", 2.0))
+REDIS_CONNECT_TIMEOUT = float(os.environ.get("REDIS_CONNECT_TIMEOUT", 2.0))
+REDIS_SOCKET_KEEPALIVE = os.environ.get("REDIS_SOCKET_KEEPALIVE", "1") != "0"
+REDIS_HEALTH_CHECK_INTERVAL = int(os.environ.get("REDIS_HEALTH_CHECK_INTERVAL", 30))
+
+_clients = {"pid": None, "mongo": None, "redis": None}
+_clients_lock = threading.Lock()
+
+
+def _current():
+    """This process's client slots, emptied after a fork."""
+    pid = os.getpid()
+    if _clients["pid"] != pid:
+        with _clients_lock:
+            if _clients["pid"] != pid:
+                # The parent's clients are left alone: closing them here
+                # would tear down sockets the parent is still using.
+                _clients.update(pid=pid, mongo=None, redis=None)
+    return _clients
+
+
+def get_mongo():
+    clients = _current()
+    if clients["mongo"] is None:
+        with _clients_lock:
+            if clients["mongo"] is None:
+                clients["mongo"] = MongoClient(
+                    MONGO_URI,
+                    maxPoolSize=MONGO_MAX_POOL_SIZE,
+                    minPoolSize=MONGO_MIN_POOL_SIZE,
+                    maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+                    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+                    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+                    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                    event_listeners=[mongo_command_metrics],
+                )
+    return clients["mongo"]
+
+
+def get_redis():
+    clients = _current()
+    if clients["redis"] is None:
+        with _clients_lock:
+            if clients["redis"] is None:
+                clients["redis"] = InstrumentedRedis(
+                    host=REDIS_HOST,
+                    port=REDIS_PORT,
+                    db=REDIS_DB,
+                    max_connections=REDIS_MAX_CONNECTIONS,
+                    socket_timeout=REDIS_SOCKET_TIMEOUT,
+                    socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+                    socket_keepalive=REDIS_SOCKET_KEEPALIVE,
+                    health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+                )
+    return clients["redis"]
+
+
+class LazyRedis:
+    """Stand-in for redis.Redis that resolves to this process's client."""
+
+    def __getattr__(self, name):
+        return getattr(get_redis(), name)
+
+
+class LazyCollection:
+    """Stand-in for a pymongo Collection that resolves to this process's client."""
+
+    def __init__(self, database, collection):
+        self.database = database
+        self.collection = collection
+
+    def __getattr__(self, name):
+        return getattr(get_mongo()[self.database][self.collection], name)
+
+
+def register_health_routes(blueprint):
+    @blueprint.route("/healthz", methods=["GET"])
+    def liveness():
+        """The process is up and serving requests."""
+        return jsonify({"status": "ok"})
+
+    @blueprint.route("/readyz", methods=["GET"])
+    def readiness():
+        """Mongo and Redis are reachable and the startup backfills are done; answers 503 otherwise."""
+        checks = {}
+        try:
+            get_mongo().admin.command("ping")
+            checks["mongo"] = "ok"
+        except PyMongoError as exc:
+            checks["mongo"] = str(exc)
+        try:
+            get_redis().ping()
+            checks["redis"] = "ok"
+        except redis.RedisError as exc:
+            checks["redis"] = str(exc)
+        for backfill in started_backfills:
+            checks[f"backfill:{backfill.name}"] = "pending" if backfill.pending else "ok"
+
+        ready = all(status == "ok" for status in checks.values())
+        return jsonify({"status": "ok" if ready else "unavailable", "checks": checks}), 200 if ready else 503
@@ -0,0 +1,128 @@
+"""
+Async counterparts of clients.py for the movies API's async serving mode
+(movies_series_async.py): an AsyncMongoClient and a redis.asyncio client,
+with the same pool sizes and timeouts (clients.py's constants).
+
+Nothing connects at import time. Async clients belong to the event loop
+they were created on, so one pair is created per process and loop on first
+use; a forked worker or a new loop builds its own instead of sharing the
+previous sockets.
+"""
+
+import asyncio
+import os
+
+import redis
+from pymongo import AsyncMongoClient
+from pymongo.errors import PyMongoError
+from quart import jsonify
+
+from .backfill import started_backfills
+from .clients import (
+    MONGO_CONNECT_TIMEOUT_MS,
+    MONGO_MAX_IDLE_TIME_MS,
+    MONGO_MAX_POOL_SIZE,
+    MONGO_MIN_POOL_SIZE,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    MONGO_SOCKET_TIMEOUT_MS,
+    MONGO_URI,
+    REDIS_CONNECT_TIMEOUT,
+    REDIS_DB,
+    REDIS_HEALTH_CHECK_INTERVAL,
+    REDIS_HOST,
+    REDIS_MAX_CONNECTIONS,
+    REDIS_PORT,
+    REDIS_SOCKET_KEEPALIVE,
+    REDIS_SOCKET_TIMEOUT,
+)
+from .metrics import InstrumentedAsyncRedis, mongo_command_metrics
+
+_clients = {"pid": None, "loop": None, "mongo": None, "redis": None}
+
+
+def _current():
+    """This process's and event loop's client slots, emptied after a fork or on a new loop."""
+    pid = os.getpid()
+    loop = asyncio.get_running_loop()
+    if _clients["pid"] != pid or _clients["loop"] is not loop:
+        # As in clients.py, the previous clients are left alone rather than
+        # closed from a process or loop that does not own them.
+        _clients.update(pid=pid, loop=loop, mongo=None, redis=None)
+    return _clients
+
+
+def get_mongo():
+    clients = _current()
+    if clients["mongo"] is None:
+        clients["mongo"] = AsyncMongoClient(
+            MONGO_URI,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            minPoolSize=MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+            connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+            socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+            serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            event_listeners=[mongo_command_metrics],
+        )
+    return clients["mongo"]
+
+
+def get_redis():
+    clients = _current()
+    if clients["redis"] is None:
+        clients["redis"] = InstrumentedAsyncRedis(
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            db=REDIS_DB,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+            socket_keepalive=REDIS_SOCKET_KEEPALIVE,
+            health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+        )
+    return clients["redis"]
+
+
+class LazyRedis:
+    """Stand-in for redis.asyncio.Redis that resolves to this process's and loop's client."""
+
+    def __getattr__(self, name):
+        return getattr(get_redis(), name)
+
+
+class LazyCollection:
+    """Stand-in for an async pymongo Collection that resolves to this process's and loop's client."""
+
+    def __init__(self, database, collection):
+        self.database = database
+        self.collection = collection
+
+    def __getattr__(self, name):
+        return getattr(get_mongo()[self.database][self.collection], name)
+
+
+def register_health_routes(blueprint):
+    @blueprint.route("/healthz", methods=["GET"])
+    async def liveness():
+        """The process is up and serving requests."""
+        return jsonify({"status": "ok"})
+
+    @blueprint.route("/readyz", methods=["GET"])
+    async def readiness():
+        """Mongo and Redis are reachable and the startup backfills are done; answers 503 otherwise."""
+        checks = {}
+        try:
+            await get_mongo().admin.command("ping")
+            checks["mongo"] = "ok"
+        except PyMongoError as exc:
+            checks["mongo"] = str(exc)
+        try:
+            await get_redis().ping()
+            checks["redis"] = "ok"
+        except redis.RedisError as exc:
+            checks["redis"] = str(exc)
+        for backfill in started_backfills:
+            checks[f"backfill:{backfill.name}"] = "pending" if backfill.pending else "ok"
+
+        ready = all(status == "ok" for status in checks.values())
+        return jsonify({"status": "ok" if ready else "unavailable", "checks": checks}), 200 if ready else 503
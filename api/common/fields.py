@@ -0,0 +1,40 @@
+"""
+?fields= projections of the API services. A value is either the name of
+one of the service's presets ({name: field tuple, or None for the whole
+document}) or a comma-separated list of field paths.
+"""
+
+import re
+
+from flask import request
+
+FIELD_NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z0-9_]+)*$")
+MAX_FIELDS = 50
+
+
+def parse_fields(presets, args=None):
+    """
+    Read ?fields= (from `args`, the current request by default) as a name
+    of `presets` or a comma-separated list of fields.
+    Returns (cache_key_part, mongo_projection); raises ValueError on bad input.
+    """
+    args = request.args if args is None else args
+    value = (args.get("fields") or "full").strip()
+    if value in presets:
+        fields = presets[value]
+        return value, ({field: 1 for field in fields} if fields else None)
+
+    fields = sorted({field.strip() for field in value.split(",") if field.strip()})
+    if not fields or len(fields) > MAX_FIELDS or not all(map(FIELD_NAME_PATTERN.match, fields)):
+        names = ", ".join(presets)
+        raise ValueError(f"fields must be one of {names} or a comma-separated list of field names")
+    # Mongo rejects a projection of both a field and a path inside it.
+    nested = [field for field in fields if any(field.startswith(f"{other}.") for other in fields)]
+    if nested:
+        raise ValueError(f"fields must not include both a field and a path inside it: {', '.join(nested)}")
+    return ",".join(fields), {field: 1 for field in fields}
+
+
+def canonical_fields(presets, value):
+    """Canonical cache key part of a ?fields= value."""
+    return parse_fields(presets, {"fields": value})[0]
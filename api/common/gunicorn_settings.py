@@ -0,0 +1,52 @@
+"""
+gunicorn settings shared by the services' gunicorn.conf.py, which import
+them and add their own worker hooks.
+
+Every setting can be overridden from the environment. Each worker builds
+its own app and, on first use, its own Mongo and Redis pools
+(common/clients.py), so the per-worker pool sizes multiply by the number of
+workers. With PROMETHEUS_MULTIPROC_DIR set, /metrics adds up all workers.
+"""
+
+import multiprocessing
+import os
+import shutil
+
+from prometheus_client import multiprocess
+
+__all__ = [
+    "bind",
+    "workers",
+    "threads",
+    "timeout",
+    "graceful_timeout",
+    "keepalive",
+    "max_requests",
+    "max_requests_jitter",
+    "accesslog",
+    "on_starting",
+    "child_exit",
+]
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", min(multiprocessing.cpu_count() * 2 + 1, 8)))
+threads = int(os.environ.get("WEB_THREADS", 4))
+timeout = int(os.environ.get("WEB_TIMEOUT", 30))
+graceful_timeout = int(os.environ.get("WEB_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("WEB_KEEPALIVE", 5))
+max_requests = int(os.environ.get("WEB_MAX_REQUESTS", 10000))
+max_requests_jitter = int(os.environ.get("WEB_MAX_REQUESTS_JITTER", 1000))
+accesslog = os.environ.get("WEB_ACCESS_LOG", "-")
+
+
+def on_starting(server):
+    # Samples of a previous run would otherwise be added to this one's.
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,82 @@
+"""
+Declarative Mongo index management for the API services.
+
+Each service declares an index registry: a list of
+``(collection, [IndexModel, ...], [HotQuery, ...])`` tuples. The indexes are
+created idempotently at startup or with ``flask --app <module>
+ensure-indexes``, and ``flask --app <module> verify-indexes`` explains every
+hot query and fails if one of them would fall back to a COLLSCAN.
+"""
+
+import logging
+from collections import namedtuple
+
+import click
+from pymongo.errors import PyMongoError
+
+from .logs import get_logger, log_event
+
+log = get_logger("indexes")
+
+
+# A query the service runs on its hot path; `sort` is a pymongo sort spec.
+HotQuery = namedtuple("HotQuery", ["name", "filter", "sort"], defaults=[None])
+
+
+def ensure_indexes(registry):
+    """Create every registered index; existing ones are left untouched."""
+    created = []
+    for collection, index_models, _ in registry:
+        if index_models:
+            created.extend(collection.create_indexes(index_models))
+    return created
+
+
+def plan_stages(plan):
+    """Yield every stage name of an explain() plan tree."""
+    yield plan.get("stage")
+    for child_key in ("inputStage", "queryPlan"):
+        if child_key in plan:
+            yield from plan_stages(plan[child_key])
+    for child in plan.get("inputStages", []):
+        yield from plan_stages(child)
+
+
+def find_collscans(registry):
+    """Return the names of registered hot queries whose winning plan scans the collection."""
+    failures = []
+    for collection, _, hot_queries in registry:
+        for query in hot_queries:
+            cursor = collection.find(query.filter)
+            if query.sort:
+                cursor = cursor.sort(query.sort)
+            winning_plan = cursor.explain()["queryPlanner"]["winningPlan"]
+            if "COLLSCAN" in plan_stages(winning_plan):
+                failures.append(f"{collection.name}: {query.name}")
+    return failures
+
+
+def prepare_indexes(registry):
+    """Startup hook: create indexes without taking the service down if Mongo is unavailable."""
+    try:
+        ensure_indexes(registry)
+    except PyMongoError as exc:
+        log_event(log, "index_creation_failed", logging.WARNING, error=str(exc))
+
+
+def register_index_commands(app, registry):
+    @app.cli.command("ensure-indexes")
+    def ensure_indexes_command():
+        """Create the service's registered Mongo indexes."""
+        for name in ensure_indexes(registry):
+            click.echo(f"ensured index {name}")
+
+    @app.cli.command("verify-indexes")
+    def verify_indexes_command():
+        """Fail if a registered hot query is planned as a COLLSCAN."""
+        failures = find_collscans(registry)
+        for failure in failures:
+            click.echo(f"COLLSCAN: {failure}", err=True)
+        if failures:
+            raise click.ClickException(f"{len(failures)} hot queries are not index-backed")
+        click.echo("all hot queries use an index")
@@ -0,0 +1,60 @@
+"""
+Structured logging for the API services: one JSON object per line on stderr,
+tagged with the route of the request being served.
+
+Hot-path events (cache misses and the like) are logged with sample=True and
+only LOG_SAMPLE_RATE of them are written, each carrying the rate so counts
+can be scaled back; exact counts live in the metrics (see metrics.py).
+"""
+
+import json
+import logging
+import os
+import random
+import sys
+
+from .metrics import current_route
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", 0.01))
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+            "route": current_route.get(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def _configure():
+    root = logging.getLogger("api")
+    if not root.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(JsonFormatter())
+        root.addHandler(handler)
+        root.setLevel(LOG_LEVEL)
+        root.propagate = False
+    return root
+
+
+def get_logger(name):
+    _configure()
+    return logging.getLogger(f"api.{name}")
+
+
+def log_event(logger, event, level=logging.INFO, sample=False, **fields):
+    """Log `event` with `fields`; with `sample`, only a LOG_SAMPLE_RATE share of calls."""
+    if sample:
+        if random.random() >= LOG_SAMPLE_RATE:
+            return
+        fields["sample_rate"] = LOG_SAMPLE_RATE
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields})
@@ -0,0 +1,205 @@
+"""
+Prometheus metrics for the API services, served on GET /metrics.
+
+Every request is timed per route template and status, with its response
+size. The cache counts lookups per namespace and result, Mongo commands are
+timed through pymongo's command monitoring and Redis round trips by the
+instrumented clients below. Mongo and Redis samples carry the route of the
+request that issued them, so a slow or chatty endpoint shows up by name.
+
+Under gunicorn set PROMETHEUS_MULTIPROC_DIR (the images do): every worker
+then writes its samples there and /metrics adds up all workers.
+"""
+
+import contextvars
+import os
+import time
+
+import redis
+import redis.asyncio as aioredis
+from flask import Response, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIZE_BUCKETS = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152, 8388608)
+
+if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+    # Also when not started by gunicorn (flask CLI, hypercorn).
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+# Route template of the request being served, e.g. "/movies-series/<movie_id>".
+current_route = contextvars.ContextVar("current_route", default="none")
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes",
+    "Response body size by route template",
+    ["route"],
+    buckets=SIZE_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Cache lookups (l1_hit, l2_hit, miss), fills (fill, stale) and errors by route and namespace",
+    ["route", "namespace", "result"],
+)
+MONGO_DURATION = Histogram(
+    "mongo_command_duration_seconds",
+    "Mongo command duration by originating route",
+    ["route", "collection", "command", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+REDIS_DURATION = Histogram(
+    "redis_command_duration_seconds",
+    "Redis round trip by originating route; a pipeline counts as one PIPELINE",
+    ["route", "command"],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+def cache_namespace(key):
+    """Metric label of a cache key: its first segment ("user:<id>:v3:..." -> "user")."""
+    return key.split(":", 1)[0]
+
+
+def count_cache(key, result, amount=1):
+    CACHE_REQUESTS.labels(current_route.get(), cache_namespace(key), result).inc(amount)
+
+
+def route_of(url_rule):
+    return url_rule.rule if url_rule is not None else "unmatched"
+
+
+def observe_request(method, status, seconds, size):
+    route = current_route.get()
+    REQUEST_LATENCY.labels(method, route, str(status)).observe(seconds)
+    if size is not None:
+        RESPONSE_SIZE.labels(route).observe(size)
+
+
+def render_metrics():
+    """The text exposition of every metric, and its content type."""
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every Mongo command; pass it to the client's event_listeners."""
+
+    def __init__(self):
+        self._pending = {}
+
+    def started(self, event):
+        command = event.command
+        # getMore names its collection in a separate field.
+        collection = command.get("collection") if event.command_name == "getMore" else command.get(event.command_name)
+        self._pending[(event.connection_id, event.request_id)] = (
+            current_route.get(),
+            collection if isinstance(collection, str) else "",
+        )
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
+
+    def _finish(self, event, outcome):
+        route, collection = self._pending.pop((event.connection_id, event.request_id), (current_route.get(), ""))
+        MONGO_DURATION.labels(route, collection, event.command_name, outcome).observe(event.duration_micros / 1e6)
+
+
+mongo_command_metrics = MongoCommandMetrics()
+
+
+def _command_name(args):
+    name = args[0] if args else "unknown"
+    return (name.decode() if isinstance(name, bytes) else str(name)).upper()
+
+
+def _observe_redis(command, started):
+    REDIS_DURATION.labels(current_route.get(), command).observe(time.perf_counter() - started)
+
+
+class InstrumentedPipeline(redis.client.Pipeline):
+    def execute(self, raise_on_error=True):
+        started = time.perf_counter()
+        try:
+            return super().execute(raise_on_error)
+        finally:
+            _observe_redis("PIPELINE", started)
+
+
+class InstrumentedRedis(redis.Redis):
+    """redis.Redis timing every command and pipeline round trip."""
+
+    def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            _observe_redis(_command_name(args), started)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class InstrumentedAsyncPipeline(aioredis.client.Pipeline):
+    async def execute(self, raise_on_error=True):
+        started = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            _observe_redis("PIPELINE", started)
+
+
+class InstrumentedAsyncRedis(aioredis.Redis):
+    """redis.asyncio.Redis timing every command and pipeline round trip."""
+
+    async def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            _observe_redis(_command_name(args), started)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedAsyncPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+def register_metrics(blueprint):
+    """Time every request of the app `blueprint` is registered on, and serve GET /metrics."""
+
+    @blueprint.before_app_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        current_route.set(route_of(request.url_rule))
+
+    @blueprint.after_app_request
+    def record_request(response):
+        started = g.pop("request_started", None)
+        if started is not None:
+            size = None if response.is_streamed else response.calculate_content_length()
+            observe_request(request.method, response.status_code, time.perf_counter() - started, size)
+        return response
+
+    @blueprint.route("/metrics", methods=["GET"])
+    def metrics():
+        body, content_type = render_metrics()
+        return Response(body, content_type=content_type)
@@ -0,0 +1,33 @@
+"""
+Cache layout of the movies service's title details. The users service
+hydrates favorites from, and fills, the same cached cards, so both build
+the keys and tags here.
+"""
+
+from .cache import namespace_tags, namespaced_key
+
+MOVIES_CACHE_NAMESPACE = "movies_series"
+MOVIE_DETAIL_CACHE_PREFIX = "movie_detail"
+# The "card" projection of a title (?fields=card).
+MOVIE_CARD_FIELDS = (
+    "imdb_id",
+    "title",
+    "poster_url",
+    "imdb_type",
+    "year",
+    "release_date",
+    "rating",
+    "genres",
+    "duration",
+    "content_rating",
+)
+
+
+def movie_detail_key(fields_key, movie_id, version):
+    """Key of a title's detail in the `fields_key` projection, at movies namespace `version`."""
+    return namespaced_key(MOVIES_CACHE_NAMESPACE, version, MOVIE_DETAIL_CACHE_PREFIX, fields_key, movie_id)
+
+
+def movie_detail_tags(movie_id):
+    """Tags a title's cached details are registered under."""
+    return namespace_tags(MOVIES_CACHE_NAMESPACE, f"doc:{movie_id}")
@@ -0,0 +1,46 @@
+"""
+Fixtures for the API tests: in-memory Mongo (mongomock) and Redis
+(fakeredis, with Lua) in place of this process's clients.
+
+Run from api/:
+
+    pip install -r tests/requirements.txt
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+
+import fakeredis
+import mongomock
+import pytest
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (API_DIR, *(os.path.join(API_DIR, service) for service in ("api_movies_series", "api_people", "api_users"))):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+os.environ.setdefault("PREPARE_DATABASE", "0")
+
+from common import cache, clients  # noqa: E402
+
+
+@pytest.fixture
+def mongo():
+    return mongomock.MongoClient()
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(server=fakeredis.FakeServer())
+
+
+@pytest.fixture(autouse=True)
+def fake_clients(monkeypatch, mongo, redis_client):
+    """Resolve every LazyCollection / LazyRedis to the in-memory clients."""
+    monkeypatch.setitem(clients._clients, "pid", os.getpid())
+    monkeypatch.setitem(clients._clients, "mongo", mongo)
+    monkeypatch.setitem(clients._clients, "redis", redis_client)
+    cache.local_cache.clear()
+    yield
+    cache.local_cache.clear()
@@ -0,0 +1,67 @@
+"""POST /movies-series/bulk reports what was stored when a chunk fails outright."""
+
+import json
+
+import pytest
+from pymongo.errors import AutoReconnect
+
+
+class FailingInserts:
+    """A collection whose insert_many calls after the first `succeed` raise AutoReconnect."""
+
+    def __init__(self, collection, succeed):
+        self.collection = collection
+        self.succeed = succeed
+        self.inserts = 0
+
+    def insert_many(self, documents, **kwargs):
+        self.inserts += 1
+        if self.inserts > self.succeed:
+            raise AutoReconnect("connection closed")
+        return self.collection.insert_many(documents, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+
+@pytest.fixture
+def movies(monkeypatch):
+    import movies_series
+
+    monkeypatch.setattr(movies_series, "BULK_CHUNK_SIZE", 2)
+    return movies_series
+
+
+def post_ndjson(client, items):
+    body = "\n".join(json.dumps(item) for item in items)
+    return client.post("/movies-series/bulk", data=body, content_type="application/x-ndjson")
+
+
+ITEMS = [{"title": "One"}, {"title": "Two"}, {"title": "Three"}, {}, {"title": "Four"}, {"title": "Five"}]
+
+
+def test_a_failed_chunk_fails_it_and_the_rest(movies, monkeypatch):
+    collection = FailingInserts(movies.movies_collection, succeed=1)
+    monkeypatch.setattr(movies, "movies_collection", collection)
+    response = post_ndjson(movies.create_app().test_client(), ITEMS)
+
+    assert response.status_code == 207
+    body = response.get_json()
+    assert body["inserted"] == 2 and len(body["ids"]) == 2
+    errors = {error["index"]: error["error"] for error in body["errors"]}
+    assert sorted(errors) == [2, 3, 4, 5]
+    assert "may not be stored" in errors[2] and "may not be stored" in errors[4]
+    assert errors[3] == "please provide at least a title"
+    assert "earlier chunk failed" in errors[5]
+    # The remaining chunk was never sent.
+    assert collection.inserts == 2
+
+
+def test_a_failed_first_chunk_is_a_server_error(movies, monkeypatch):
+    monkeypatch.setattr(movies, "movies_collection", FailingInserts(movies.movies_collection, succeed=0))
+    response = post_ndjson(movies.create_app().test_client(), ITEMS)
+
+    assert response.status_code == 500
+    body = response.get_json()
+    assert body["inserted"] == 0 and body["failed"] == len(ITEMS)
+    assert "error" in body
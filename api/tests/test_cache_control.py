@@ -0,0 +1,39 @@
+"""Per-user responses must stay out of shared caches; catalog responses may be stored."""
+
+import pytest
+
+
+@pytest.fixture
+def users(mongo):
+    import users
+
+    mongo["api_users"]["users"].insert_one(
+        {
+            "_id": "u000000000001",
+            "imdb_user_id": "ur12345678",
+            "id_keys": ["u000000000001", "ur12345678"],
+            "favorites": [{"_id": "ms000000000001"}],
+        }
+    )
+    return users.create_app().test_client()
+
+
+@pytest.mark.parametrize("url", ["/myprofile", "/mylist", "/mylist?limit=1"])
+def test_user_responses_are_private(users, url):
+    response = users.get(url + ("&" if "?" in url else "?") + "user_id=ur12345678")
+    assert response.status_code == 200
+    assert response.cache_control.private
+    assert response.cache_control.no_cache
+    assert not response.cache_control.public
+    assert response.cache_control.max_age is None
+
+    revalidated = users.get(response.request.full_path, headers={"If-None-Match": response.headers["ETag"]})
+    assert revalidated.status_code == 304
+
+
+def test_catalog_responses_are_public(mongo):
+    import movies_series
+
+    response = movies_series.create_app().test_client().get("/movies-series")
+    assert response.cache_control.public
+    assert response.cache_control.max_age == movies_series.CACHE_TTL_SECONDS
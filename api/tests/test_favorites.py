@@ -0,0 +1,113 @@
+"""/mylist serves pages and hydrated cards from the per-user cache after one Mongo read."""
+
+import time
+
+import pytest
+
+USER_ID = "ur12345678"
+MOVIE_IDS = [f"ms{index:012d}" for index in range(1, 6)]
+
+
+class CallCounter:
+    """A collection whose method calls are counted by name."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.calls = {}
+
+    def __getattr__(self, name):
+        attribute = getattr(self.collection, name)
+        if not callable(attribute):
+            return attribute
+
+        def counted(*args, **kwargs):
+            self.calls[name] = self.calls.get(name, 0) + 1
+            return attribute(*args, **kwargs)
+
+        return counted
+
+
+@pytest.fixture
+def users(monkeypatch, mongo):
+    import users
+
+    mongo["api_users"]["users"].insert_one(
+        {
+            "_id": "u000000000001",
+            "imdb_user_id": USER_ID,
+            "id_keys": ["u000000000001", USER_ID.lower()],
+            "favorites": [{"_id": movie_id} for movie_id in MOVIE_IDS],
+        }
+    )
+    mongo["api_movies_series"]["movies_series"].insert_many(
+        [{"_id": movie_id, "title": f"Title {movie_id}", "imdb_type": "Movie"} for movie_id in MOVIE_IDS]
+    )
+    counters = {
+        "users": CallCounter(users.users_collection),
+        "movies": CallCounter(users.movies_collection),
+    }
+    monkeypatch.setattr(users, "users_collection", counters["users"])
+    monkeypatch.setattr(users, "movies_collection", counters["movies"])
+    return users, users.create_app().test_client(), counters
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_pages_fill_the_cached_list(users):
+    module, client, counters = users
+    first = client.get(f"/mylist?user_id={USER_ID}&limit=2")
+    assert first.get_json()["items"] == [{"_id": movie_id} for movie_id in MOVIE_IDS[:2]]
+
+    # The whole list is filled in the background after the first page.
+    list_key, _ = module.favorites_cache_keys(USER_ID)
+    wait_for(lambda: module.r.exists(list_key))
+    assert counters["users"].calls == {"aggregate": 1, "find_one": 1}
+
+    for _ in range(2):
+        assert client.get(f"/mylist?user_id={USER_ID}&limit=2").get_data() == first.get_data()
+    page = client.get(f"/mylist?user_id={USER_ID}&limit=2&after=4").get_json()
+    assert page["items"] == [{"_id": MOVIE_IDS[4]}]
+    assert page["total_favorites"] == len(MOVIE_IDS)
+    assert counters["users"].calls == {"aggregate": 1, "find_one": 1}
+
+
+@pytest.mark.parametrize("query", ["expand=card", "expand=card&limit=2"])
+def test_hydrated_favorites_are_cached_per_user(users, query):
+    module, client, counters = users
+    first = client.get(f"/mylist?user_id={USER_ID}&{query}")
+    assert first.status_code == 200
+    list_key, _ = module.favorites_cache_keys(USER_ID)
+    wait_for(lambda: module.r.exists(list_key))
+    calls = dict(counters["users"].calls), dict(counters["movies"].calls)
+    assert calls[1] == {"find": 1}
+
+    again = client.get(f"/mylist?user_id={USER_ID}&{query}")
+    assert again.get_data() == first.get_data()
+    assert (counters["users"].calls, counters["movies"].calls) == calls
+
+
+def test_hydrated_cards_are_the_movies_service_cards(users, monkeypatch):
+    import movies_series
+    from common.cache import invalidate_tags, local_cache
+    from common.movies import movie_detail_tags
+
+    _, client, _ = users
+    cards = client.get(f"/mylist?user_id={USER_ID}&expand=card").get_json()
+
+    movies = CallCounter(movies_series.movies_collection)
+    monkeypatch.setattr(movies_series, "movies_collection", movies)
+    movies_client = movies_series.create_app().test_client()
+    for card in cards:
+        assert movies_client.get(f"/movies-series/{card['_id']}?fields=card").get_json() == card
+    assert movies.calls == {}
+
+    # Updating a title evicts the card the users service cached.
+    invalidate_tags(movies_series.r, movie_detail_tags(MOVIE_IDS[0]))
+    local_cache.clear()
+    assert movies_client.get(f"/movies-series/{MOVIE_IDS[0]}?fields=card").get_json() == cards[0]
+    assert movies.calls == {"find_one": 1}
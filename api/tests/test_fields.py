@@ -0,0 +1,50 @@
+"""?fields= projections are the same whichever route fills the shared detail entry."""
+
+import pytest
+
+
+@pytest.fixture
+def client(mongo):
+    import movies_series
+
+    mongo["api_movies_series"]["movies_series"].insert_one(
+        {"_id": "ms000000000001", "imdb_id": "tt0000001", "title": "One", "imdb_type": "Movie", "year": 2000}
+    )
+    return movies_series.create_app().test_client()
+
+
+@pytest.mark.parametrize("first", ["batch", "detail"])
+def test_batch_and_detail_share_projected_entries(client, first):
+    urls = {
+        "batch": "/movies-series/batch?ids=tt0000001,ms000000000001&fields=title",
+        "detail": "/movies-series/ms000000000001?fields=title",
+    }
+    responses = {name: client.get(urls[name]).get_json() for name in sorted(urls, key=lambda name: name != first)}
+
+    expected = {"_id": "ms000000000001", "title": "One"}
+    assert responses["detail"] == expected
+    assert responses["batch"]["items"] == [expected, expected]
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "/movies-series/batch?ids=tt0000001&fields=title,title.x",
+        "/movies-series/ms000000000001?fields=title.x,title",
+        "/movies-series?limit=5&fields=genres,genres.name",
+        "/movies?fields=a,a.b.c",
+        "/movies-series/ms000000000001/similar?fields=a.b,a",
+    ],
+)
+def test_overlapping_field_paths_are_rejected(client, url):
+    response = client.get(url)
+
+    assert response.status_code == 400
+    assert "path inside it" in response.get_json()["error"]
+
+
+def test_sibling_field_paths_are_accepted(client):
+    response = client.get("/movies-series/ms000000000001?fields=title,titles.x,year")
+
+    assert response.status_code == 200
+    assert response.get_json() == {"_id": "ms000000000001", "title": "One", "year": 2000}
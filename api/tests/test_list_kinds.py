@@ -0,0 +1,68 @@
+"""
+/movies and /series match the stored list_kind; while the startup backfill
+is pending they also include the titles still missing it.
+"""
+
+import pytest
+from pymongo.errors import PyMongoError
+
+import movies_series
+from common import backfill, clients
+
+TITLES = [
+    {"_id": "ms000000000001", "title": "Kinded movie", "imdb_type": "Movie", "list_kind": "movies"},
+    {"_id": "ms000000000002", "title": "Kinded series", "imdb_type": "TVSeries", "list_kind": "series"},
+    {"_id": "ms000000000003", "title": "Unkinded movie", "imdb_type": "movie"},
+    {"_id": "ms000000000004", "title": "Unkinded series", "imdb_type": "TVMiniSeries"},
+]
+
+
+@pytest.fixture
+def client(mongo):
+    mongo["api_movies_series"]["movies_series"].insert_many([dict(title) for title in TITLES])
+    return movies_series.create_app().test_client()
+
+
+def titles(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    body = response.get_json()
+    return [item["title"] for item in (body["items"] if isinstance(body, dict) else body)]
+
+
+@pytest.mark.parametrize("query", ["", "?limit=10"])
+def test_pending_backfill_lists_include_unkinded_titles(monkeypatch, client, query):
+    monkeypatch.setattr(movies_series.list_kinds_backfill, "started", True)
+
+    assert titles(client, f"/movies{query}") == ["Kinded movie", "Unkinded movie"]
+    assert titles(client, f"/series{query}") == ["Kinded series", "Unkinded series"]
+
+
+def test_lists_match_list_kind_once_backfilled(client):
+    assert titles(client, "/movies") == ["Kinded movie"]
+
+
+def test_failed_backfill_is_retried_and_reported_not_ready(monkeypatch, client):
+    attempts = []
+
+    def run():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise PyMongoError("not reachable yet")
+        return 0
+
+    started = []
+    monkeypatch.setattr(backfill, "started_backfills", started)
+    monkeypatch.setattr(clients, "started_backfills", started)
+    monkeypatch.setattr(backfill, "BACKFILL_RETRY_SECONDS", 0.01)
+    job = backfill.Backfill("test", run)
+    job.start()
+
+    assert job.pending
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.get_json()["checks"]["backfill:test"] == "pending"
+
+    job._thread.join(5)
+    assert len(attempts) == 3
+    assert client.get("/readyz").status_code == 200
@@ -0,0 +1,56 @@
+"""
+The people name index is built once per worker, even under concurrent
+searches, and later refreshes run in the background.
+"""
+
+import pytest
+
+import people
+from name_search import NameIndex
+from test_single_flight import Counter, run_concurrently
+
+
+class CountingIndex(NameIndex):
+    """A name index whose builds are slowed down and counted."""
+
+    def __init__(self):
+        super().__init__()
+        self.builds = Counter()
+
+    def build(self, rows, signature=None):
+        super().build(self.builds(list(rows)), signature)
+
+
+@pytest.fixture
+def index(monkeypatch, mongo):
+    mongo["api_people"]["people"].insert_many([
+        {"_id": f"p{index}", "name": f"Jane Doe {index}", "name_normalized": f"jane doe {index}"}
+        for index in range(10)
+    ])
+    index = CountingIndex()
+    monkeypatch.setattr(people, "name_index", index)
+    monkeypatch.setattr(people, "_name_refresh", {"thread": None, "built_at": float("-inf")})
+    return index
+
+
+def test_concurrent_cold_searches_build_once(index):
+    client = people.create_app().test_client()
+    # Distinct limits so that every request misses the response cache.
+    limits = iter(range(1, 100))
+    responses = run_concurrently(lambda: client.get(f"/people?q=jane&limit={next(limits)}"))
+
+    assert index.builds.calls == 1
+    assert {response.status_code for response in responses} == {200}
+    assert all(response.get_json() for response in responses)
+
+
+def test_stale_index_is_refreshed_in_the_background(monkeypatch, mongo, index):
+    people.get_name_index()
+    mongo["api_people"]["people"].insert_one({"_id": "p10", "name": "John Roe", "name_normalized": "john roe"})
+    monkeypatch.setattr(people, "NAME_INDEX_REFRESH_SECONDS", 0)
+
+    assert people.get_name_index().search("john roe", 5) == []
+    people._name_refresh["thread"].join()
+
+    assert index.builds.calls == 2
+    assert people.get_name_index().search("john roe", 5) == ["p10"]
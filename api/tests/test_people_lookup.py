@@ -0,0 +1,48 @@
+"""
+/people/lookup resolves names through name_normalized; people the startup
+backfill has not reached yet are still found, and misses are not cached
+until it is done.
+"""
+
+import pytest
+
+import people
+
+
+@pytest.fixture
+def client(mongo):
+    mongo["api_people"]["people"].insert_many([
+        {"_id": "p1", "name": "Jane Doe", "name_normalized": "jane doe"},
+        {"_id": "p2", "name": "John Roe"},
+    ])
+    return people.create_app().test_client()
+
+
+def lookup(client, *names):
+    response = client.post("/people/lookup", json={"names": list(names)})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_backfilled_names_resolve(client):
+    assert lookup(client, "JANE  doe", "Nobody") == {
+        "JANE  doe": {"_id": "p1", "name": "Jane Doe"},
+        "Nobody": None,
+    }
+
+
+def test_pending_backfill_falls_back_and_does_not_cache_misses(monkeypatch, client, redis_client):
+    monkeypatch.setattr(people.names_backfill, "started", True)
+
+    assert lookup(client, "John Roe", "Nobody") == {"John Roe": {"_id": "p2", "name": "John Roe"}, "Nobody": None}
+    cached = {key.decode() for key in redis_client.keys("people:*lookup*")}
+    assert any(key.endswith(":john roe") for key in cached)
+    assert not any(key.endswith(":nobody") for key in cached)
+
+
+def test_misses_are_cached_once_backfilled(monkeypatch, client, redis_client):
+    monkeypatch.setattr(people.names_backfill, "started", True)
+    monkeypatch.setattr(people.names_backfill, "done", True)
+
+    assert lookup(client, "John Roe") == {"John Roe": None}
+    assert any(key.endswith(b":john roe") for key in redis_client.keys("people:*lookup*"))
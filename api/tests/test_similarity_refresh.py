@@ -0,0 +1,59 @@
+"""
+The similarity index is built once per worker, even under concurrent
+requests, and titles other workers insert are added to it incrementally.
+"""
+
+import pytest
+from bson import ObjectId
+
+from similarity import SimilarityIndex
+from test_single_flight import Counter, run_concurrently
+
+
+class CountingIndex(SimilarityIndex):
+    """A similarity index whose full builds are slowed down and counted."""
+
+    def __init__(self):
+        super().__init__()
+        self.builds = Counter()
+
+    def build(self, documents, signature=None):
+        super().build(self.builds(list(documents)), signature)
+
+
+def title(index, **fields):
+    return {"title": f"Title {index}", "imdb_type": "Movie", "genres": ["Drama"], "keywords": [f"k{index % 3}"], **fields}
+
+
+@pytest.fixture
+def movies(monkeypatch, mongo):
+    import movies_series
+
+    collection = mongo["api_movies_series"]["movies_series"]
+    collection.insert_many([title(index, _id=f"ms{index:012d}") for index in range(10)])
+    index = CountingIndex()
+    monkeypatch.setattr(movies_series, "similarity_index", index)
+    monkeypatch.setattr(movies_series, "_similarity_refresh", {"thread": None, "synced_at": None})
+    return movies_series, collection, index
+
+
+def test_concurrent_cold_requests_build_once(movies):
+    movies_series, _, index = movies
+    client = movies_series.create_app().test_client()
+    responses = run_concurrently(lambda: client.get(f"/movies-series/ms{0:012d}/similar"))
+
+    assert index.builds.calls == 1
+    assert {response.status_code for response in responses} == {200}
+
+
+def test_other_workers_inserts_are_caught_up(movies):
+    movies_series, collection, index = movies
+    movies_series.sync_similarity_index()
+    inserted = collection.insert_one(title(10, _id=ObjectId())).inserted_id
+
+    movies_series.sync_similarity_index()
+
+    assert index.builds.calls == 1
+    assert len(index) == 11
+    assert index.signature == 11
+    assert index.similar(str(inserted), 5)
@@ -0,0 +1,119 @@
+"""
+Concurrent misses on one cache key must compute the value once: one fill
+across all callers, the rest wait for it (cache.cached_fill, cache.cached_ids).
+"""
+
+import threading
+import time
+
+import pytest
+
+from common import cache
+
+THREADS = 20
+# Long enough for every thread to miss before the first fill is stored.
+SLOW_SECONDS = 0.2
+
+
+def run_concurrently(target, threads=THREADS):
+    """Call target() from `threads` threads released together; return their results."""
+    barrier = threading.Barrier(threads)
+    results = [None] * threads
+    errors = []
+
+    def worker(index):
+        barrier.wait()
+        try:
+            results[index] = target()
+        except Exception as exc:
+            errors.append(exc)
+
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    assert not errors, errors
+    return results
+
+
+class Counter:
+    def __init__(self):
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, value):
+        with self.lock:
+            self.calls += 1
+        time.sleep(SLOW_SECONDS)
+        return value
+
+
+class CountingCollection:
+    """A collection whose find() is slowed down and counted."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.finds = Counter()
+
+    def find(self, *args, **kwargs):
+        return self.finds(self.collection.find(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+
+def test_cached_fill_computes_once(redis_client):
+    counter = Counter()
+    entries = run_concurrently(
+        lambda: cache.cached_fill(redis_client, "test:v0:list", 60, lambda: counter(["a", "b"]))
+    )
+
+    assert counter.calls == 1
+    assert {entry.body for entry in entries} == {b'["a","b"]'}
+
+
+def test_tagged_cached_fill_computes_once(redis_client):
+    counter = Counter()
+    entries = run_concurrently(
+        lambda: cache.cached_fill(redis_client, "test:v0:list", 60, lambda: counter(["a"]), tags=["test:list"])
+    )
+
+    assert counter.calls == 1
+    assert {entry.body for entry in entries} == {b'["a"]'}
+
+
+def test_cached_ids_loads_once(redis_client):
+    counter = Counter()
+    results = run_concurrently(
+        lambda: cache.cached_ids(redis_client, "test:v0:ids", 60, lambda: counter(["a", "b"]), "test:ids")
+    )
+
+    assert counter.calls == 1
+    assert results == [["a", "b"]] * THREADS
+
+
+@pytest.fixture
+def movies(monkeypatch, mongo):
+    import movies_series
+
+    titles = [
+        {"_id": f"ms{index:012d}", "title": f"Title {index}", "imdb_type": "Movie" if index % 2 else "TVSeries"}
+        for index in range(30)
+    ]
+    for title in titles:
+        title[movies_series.LIST_KIND_FIELD] = movies_series.list_kind(title)
+    mongo["api_movies_series"]["movies_series"].insert_many(titles)
+    counting = CountingCollection(movies_series.movies_collection)
+    monkeypatch.setattr(movies_series, "movies_collection", counting)
+    return movies_series.create_app().test_client(), counting
+
+
+@pytest.mark.parametrize("url", ["/movies-series?limit=5", "/movies-series", "/movies", "/series?limit=5"])
+def test_concurrent_list_misses_query_mongo_once(movies, url):
+    client, collection = movies
+    responses = run_concurrently(lambda: client.get(url))
+
+    assert collection.finds.calls == 1
+    assert {response.status_code for response in responses} == {200}
+    assert len({response.get_data() for response in responses}) == 1
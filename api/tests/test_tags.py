@@ -0,0 +1,57 @@
+"""
+Tag sets only hold the keys whose entries (or stale copies) may still
+exist, expire with their last member, and still drive invalidate_tags().
+"""
+
+import time
+
+from common import cache
+
+TTL = 60
+
+
+def register(redis_client, key, tags):
+    pipe = redis_client.pipeline(transaction=False)
+    cache.tag_entry(pipe, key, tags, TTL)
+    pipe.execute()
+
+
+def members(redis_client, tag):
+    return [member.decode() for member in redis_client.zrange(cache.tag_key(tag), 0, -1)]
+
+
+def test_expired_members_are_dropped(monkeypatch, redis_client):
+    register(redis_client, "test:v0:old", ["test:list"])
+    later = time.time() + TTL * cache.STALE_TTL_FACTOR + 1
+    monkeypatch.setattr(cache.time, "time", lambda: later)
+    register(redis_client, "test:v0:new", ["test:list"])
+
+    assert members(redis_client, "test:list") == ["test:v0:new"]
+
+
+def test_tag_set_expires_with_its_last_member(redis_client):
+    register(redis_client, "test:v0:a", ["test:list"])
+
+    lifetime = redis_client.ttl(cache.tag_key("test:list"))
+    assert TTL * cache.STALE_TTL_FACTOR - 2 <= lifetime <= TTL * cache.STALE_TTL_FACTOR + 1
+
+
+def test_invalidate_tags_deletes_tagged_entries(redis_client):
+    cache.cache_set(redis_client, "test:v0:a", ["a"], TTL, tags=["test:list"])
+    cache.cached_fill(redis_client, "test:v0:b", TTL, lambda: ["b"], tags=["test:list", "test:doc:b"])
+    cache.cache_set(redis_client, "test:v0:c", ["c"], TTL, tags=["test:other"])
+
+    assert cache.invalidate_tags(redis_client, ["test:list"]) == 2
+    assert redis_client.exists("test:v0:a", "test:v0:b", f"{cache.STALE_PREFIX}test:v0:b") == 0
+    assert redis_client.exists("test:v0:c", cache.tag_key("test:other")) == 2
+    assert not redis_client.exists(cache.tag_key("test:list"))
+
+
+def test_fill_overtaken_by_invalidation_is_not_stored(redis_client):
+    def compute():
+        cache.invalidate_tags(redis_client, ["test:list"])
+        return ["stale"]
+
+    cache.cached_fill(redis_client, "test:v0:a", TTL, compute, tags=["test:list"])
+
+    assert not redis_client.exists("test:v0:a")
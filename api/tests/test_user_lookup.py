@@ -0,0 +1,68 @@
+"""
+Users are looked up through id_keys; users the startup backfill has not
+reached yet are still found by their raw ids while it is pending.
+"""
+
+import pytest
+
+import users
+
+TITLES = ["ms000000000001", "ms000000000002", "ms000000000003"]
+
+
+@pytest.fixture
+def client(monkeypatch, mongo):
+    mongo["api_users"]["users"].insert_many([
+        {
+            "_id": "u000000000001",
+            "imdb_user_id": "ur12345678",
+            "username": "unbackfilled",
+            "favorites": [{"_id": movie_id} for movie_id in TITLES],
+            "friends": [{"_id": "u000000000002"}],
+        },
+        {
+            "_id": "u000000000002",
+            "imdb_user_id": "ur87654321",
+            "id_keys": ["u000000000002", "ur87654321"],
+            "username": "backfilled",
+            "favorites": [{"_id": TITLES[1]}],
+        },
+    ])
+    monkeypatch.setattr(users.user_ids_backfill, "started", True)
+    return users.create_app().test_client()
+
+
+@pytest.mark.parametrize("user_id", ["UR12345678", "u000000000001"])
+def test_profile_of_unbackfilled_user(client, user_id):
+    response = client.get(f"/myprofile?user_id={user_id}")
+
+    assert response.status_code == 200
+    assert response.get_json()["username"] == "unbackfilled"
+
+
+def test_favorites_of_unbackfilled_user(client):
+    whole = client.get("/mylist?user_id=UR12345678").get_json()
+    page = client.get("/mylist?user_id=ur12345678&limit=2").get_json()
+
+    assert [favorite["_id"] for favorite in whole] == TITLES
+    assert [favorite["_id"] for favorite in page["items"]] == TITLES[:2]
+
+
+def test_common_favorites_with_unbackfilled_user(client):
+    response = client.get("/myfriends?user_id=ur12345678")
+
+    assert response.status_code == 200
+    assert response.get_json()["items"] == [
+        {"_id": "u000000000002", "common_favorites": [TITLES[1]], "common_favorites_count": 1}
+    ]
+
+
+def test_regex_characters_in_user_ids_are_literal(client):
+    assert client.get("/myprofile?user_id=ur1234567.").status_code == 404
+
+
+def test_only_id_keys_once_backfilled(monkeypatch, client):
+    monkeypatch.setattr(users.user_ids_backfill, "done", True)
+
+    assert client.get("/myprofile?user_id=ur12345678").status_code == 404
+    assert client.get("/myprofile?user_id=UR87654321").status_code == 200
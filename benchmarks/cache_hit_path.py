@@ -0,0 +1,67 @@
+"""
+Compare the cache-hit path of the movies list before and after raw-bytes
+passthrough.
+
+before: the cached JSON is decoded and re-encoded by jsonify().
+after:  the cached bytes are wrapped in a Response as-is.
+
+Usage (from the repository root, with the service requirements installed):
+
+    python benchmarks/cache_hit_path.py --size 5000 --repeat 200
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "api"))
+
+from flask import Flask, jsonify  # noqa: E402
+
+from common.cache import dumps, json_response, make_entry, orjson  # noqa: E402
+
+
+def load_catalog(size):
+    with open(os.path.join(ROOT, "data", "movies_data.json"), encoding="utf-8") as handle:
+        seed = json.load(handle)
+    catalog = []
+    for index in range(size):
+        document = dict(seed[index % len(seed)])
+        document["_id"] = f"ms{index:012d}"
+        catalog.append(document)
+    return catalog
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config["JSON_SORT_KEYS"] = False
+    entry = make_entry(dumps(load_catalog(args.size)))
+    raw = entry.body
+
+    def before():
+        return jsonify(json.loads(raw)).get_data()
+
+    def after():
+        return json_response(entry).get_data()
+
+    print(f"movies list: {args.size} documents, {len(raw) / 1024:.0f} KiB cached")
+    print(f"encoder: {'orjson' if orjson is not None else 'json'}")
+    with app.test_request_context():
+        results = {}
+        for name, func in (("before", before), ("after", after)):
+            seconds = min(timeit.repeat(func, number=args.repeat, repeat=3)) / args.repeat
+            results[name] = seconds
+            print(f"{name:>6}: {seconds * 1e3:9.3f} ms/hit  {1 / seconds:12.1f} hits/s")
+    print(f"speedup: {results['before'] / results['after']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""
+Micro-benchmarks of the per-request hot paths: serialization, JSON encoding
+and decoding, cache key construction and the cache hit and miss branches.
+
+Documents are cloned from data/movies_data.json and data/people_data.json
+with fresh ids, and list cases run at every --sizes count. JSON encoders
+are compared with whichever of orjson, ujson and msgspec are installed.
+
+Cache cases run against fakeredis by default (client-side cost only), or
+against a real server with --redis host:port.
+
+Usage (from the repository root, with the service requirements installed):
+
+    python benchmarks/hot_paths.py                          # saves a baseline
+    python benchmarks/hot_paths.py --baseline benchmarks/results/hot-paths-<commit>.json
+    python benchmarks/hot_paths.py --sizes 1000 --filter cache
+
+Each case reports the best of --repeat runs per call and per document, and
+results are saved as JSON under benchmarks/results/. Against a baseline,
+every case shows its change, and one slower than --threshold is flagged.
+"""
+
+import argparse
+import importlib
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+from collections import namedtuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+sys.path.insert(0, os.path.join(ROOT, "api"))
+for directory in ("api_movies_series", "api_people", "api_users"):
+    sys.path.insert(0, os.path.join(ROOT, "api", directory))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from flask import Flask, jsonify  # noqa: E402
+from werkzeug.datastructures import MultiDict  # noqa: E402
+
+from common import cache, clients  # noqa: E402
+
+# One measured callable; `items` is the number of documents it handles per call.
+Case = namedtuple("Case", ["name", "func", "items"])
+
+DEFAULT_SIZES = "1000,10000,100000"
+
+
+def optional(name):
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+def load_seed():
+    with open(os.path.join(ROOT, "data", "movies_data.json"), encoding="utf-8") as handle:
+        movies = json.load(handle)
+    with open(os.path.join(ROOT, "data", "people_data.json"), encoding="utf-8") as handle:
+        people = json.load(handle)["people"]
+    with open(os.path.join(ROOT, "data", "users_data.json"), encoding="utf-8") as handle:
+        user = json.load(handle)
+    return movies, people, user
+
+
+def scale(seed, size, prefix):
+    """`size` shallow copies of the seed documents, each with its own _id."""
+    return [{**seed[index % len(seed)], "_id": f"{prefix}{index + 1:012d}"} for index in range(size)]
+
+
+# ---- Cases ---------------------------------------------------------------------
+def document_cases(modules, movies, people, user):
+    movies_series, people_module, users = modules
+    movie, person = movies[0], people[0]
+    user_doc = {**user, users.ID_KEYS_FIELD: users.canonical_id_keys(user)}
+    payload = {key: value for key, value in movie.items() if key != "_id"}
+    return [
+        Case("serialize_document/movie", lambda: movies_series.serialize_document(movie), 1),
+        Case("serialize_document/person", lambda: people_module.serialize_document(person), 1),
+        Case("serialize_id/user", lambda: users.serialize_id(user_doc), 1),
+        Case("build_payload/movie", lambda: movies_series.build_payload(payload), 1),
+        Case("build_payload/series", lambda: movies_series.build_payload(payload, "TVSeries"), 1),
+    ]
+
+
+def list_cases(modules, movies, people, size):
+    movies_series, people_module, users = modules
+    movie_docs = scale(movies, size, "ms")
+    people_docs = scale(people, size, "p")
+    return [
+        Case(f"serialize_document/movies/{size}", lambda: [movies_series.serialize_document(d) for d in movie_docs], size),
+        Case(f"serialize_document/people/{size}", lambda: [people_module.serialize_document(d) for d in people_docs], size),
+        Case(f"serialize_id/movies/{size}", lambda: [users.serialize_id(d) for d in movie_docs], size),
+        Case(f"build_payload/movies/{size}", lambda: [movies_series.build_payload(d) for d in movie_docs], size),
+    ] + json_cases(movie_docs, size)
+
+
+def json_cases(documents, size):
+    """Every available encoder and decoder on the same list of documents."""
+    app = Flask(__name__)
+    encoders = {
+        "json": lambda: json.dumps(documents).encode(),
+        "json_compact": lambda: json.dumps(documents, separators=(",", ":")).encode(),
+        "cache.dumps": lambda: cache.dumps(documents),
+    }
+    decoders = {"json": json.loads}
+
+    def flask_jsonify():
+        with app.app_context():
+            return jsonify(documents).get_data()
+
+    encoders["flask.jsonify"] = flask_jsonify
+    orjson, ujson, msgspec = optional("orjson"), optional("ujson"), optional("msgspec")
+    if orjson is not None:
+        encoders["orjson"] = lambda: orjson.dumps(documents)
+        decoders["orjson"] = orjson.loads
+    if ujson is not None:
+        encoders["ujson"] = lambda: ujson.dumps(documents).encode()
+        decoders["ujson"] = ujson.loads
+    if msgspec is not None:
+        encoder = msgspec.json.Encoder()
+        encoders["msgspec"] = lambda: encoder.encode(documents)
+        decoders["msgspec"] = msgspec.json.decode
+
+    encoded = cache.dumps(documents)
+    cases = [Case(f"json_encode/{name}/{size}", func, size) for name, func in encoders.items()]
+    cases += [
+        Case(f"json_decode/{name}/{size}", lambda decode=decode: decode(encoded), size)
+        for name, decode in decoders.items()
+    ]
+    return cases
+
+
+def key_cases(modules):
+    movies_series, people_module, users = modules
+    similar_args = MultiDict([("limit", "010"), ("fields", "title, _id,poster_url")])
+    people_args = MultiDict([("q", "  Zoë  Saldaña "), ("limit", "20"), ("fields", "card")])
+    long_ids = ",".join(f"ms{index:012d}" for index in range(50))
+    return [
+        Case("cache_key/namespaced_key", lambda: cache.namespaced_key("movies_series", 7, "detail", "ms000000000001"), 1),
+        Case(
+            "cache_key/similar_view",
+            lambda: cache.namespaced_key(
+                "movies_series",
+                7,
+                *cache.view_key_parts(
+                    "movies_series.get_similar", {"movie_id": "ms000000000001"}, similar_args,
+                    movies_series.SIMILAR_QUERY,
+                ),
+            ),
+            1,
+        ),
+        Case(
+            "cache_key/people_search_view",
+            lambda: cache.namespaced_key(
+                "people", 7, *cache.view_key_parts("people.get_people", {}, people_args, people_module.PEOPLE_QUERY)
+            ),
+            1,
+        ),
+        Case("cache_key/hashed_part", lambda: cache.namespaced_key("movies_series", 7, "batch", long_ids), 1),
+        Case("cache_key/user_namespace", lambda: users.user_namespace("UR12345678"), 1),
+    ]
+
+
+def cache_cases(r, movies):
+    """Hit and miss branches of cache_get / cached_fill for one movie detail and a 20-card list."""
+    detail = movies[0]
+    cards = scale(movies, 20, "ms")
+    cache.cache_set(r, "bench:v0:detail", detail, 3600)
+    cache.cache_set(r, "bench:v0:list", cards, 3600)
+    counter = iter(range(10**12))
+
+    def l2_hit(key):
+        cache.local_cache.delete((key,))
+        return cache.cache_get(r, key)
+
+    def fill_miss():
+        return cache.cached_fill(r, f"bench:v0:miss:{next(counter)}", 60, lambda: detail)
+
+    return [
+        Case("cache/l1_hit/detail", lambda: cache.cache_get(r, "bench:v0:detail"), 1),
+        Case("cache/l1_hit/list", lambda: cache.cache_get(r, "bench:v0:list"), 20),
+        Case("cache/l2_hit/detail", lambda: l2_hit("bench:v0:detail"), 1),
+        Case("cache/l2_hit/list", lambda: l2_hit("bench:v0:list"), 20),
+        Case("cache/miss/get", lambda: cache.cache_get(r, "bench:v0:absent"), 1),
+        Case("cache/namespace_version", lambda: cache.namespace_version(r, "bench"), 1),
+        Case("cache/cached_fill/hit", lambda: cache.cached_fill(r, "bench:v0:detail", 60, lambda: detail), 1),
+        Case("cache/cached_fill/miss", fill_miss, 1),
+        Case("cache/json_response/list", lambda: response_body(cache.cache_get(r, "bench:v0:list")), 20),
+    ]
+
+
+_response_app = Flask(__name__)
+
+
+def response_body(entry):
+    with _response_app.test_request_context():
+        return cache.json_response(entry).get_data()
+
+
+def connect_redis(address):
+    """A Redis client for the cache cases, also installed as the shared client."""
+    if address:
+        host, _, port = address.partition(":")
+        from common.metrics import InstrumentedRedis
+
+        r = InstrumentedRedis(host=host, port=int(port or 6379))
+    else:
+        fakeredis = optional("fakeredis")
+        if fakeredis is None:
+            return None
+        r = fakeredis.FakeRedis()
+    clients._clients.update(pid=os.getpid(), redis=r)
+    return r
+
+
+# ---- Measurement and reporting ---------------------------------------------------
+def measure(case, repeat):
+    timer = timeit.Timer(case.func)
+    number, _ = timer.autorange()
+    runs = [seconds / number for seconds in timer.repeat(repeat=repeat, number=number)]
+    return {"seconds": min(runs), "median_seconds": statistics.median(runs), "items": case.items}
+
+
+def format_seconds(seconds):
+    for unit, factor in (("s", 1), ("ms", 1e3), ("us", 1e6)):
+        if seconds >= 1 / factor:
+            return f"{seconds * factor:8.2f} {unit}"
+    return f"{seconds * 1e9:8.0f} ns"
+
+
+def report_line(name, result, previous, threshold):
+    per_item = result["seconds"] / result["items"]
+    line = f"{name:<44} {format_seconds(result['seconds'])}/call {format_seconds(per_item)}/doc"
+    if previous:
+        change = (result["seconds"] - previous["seconds"]) / previous["seconds"]
+        flag = "  SLOWER" if change > threshold else "  faster" if change < -threshold else ""
+        line += f"   {change * 100:+6.1f}%{flag}"
+    return line
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated list sizes")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--filter", default="", help="only cases whose name contains this")
+    parser.add_argument("--redis", help="host:port of a Redis server (default: fakeredis)")
+    parser.add_argument("--output", help="result file (default benchmarks/results/hot-paths-<commit>.json)")
+    parser.add_argument("--baseline", help="earlier result file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change flagged in the report")
+    args = parser.parse_args()
+
+    logging.getLogger("api").setLevel(logging.WARNING)
+    modules = tuple(importlib.import_module(name) for name in ("movies_series", "people", "users"))
+    movies, people, user = load_seed()
+    sizes = [int(value) for value in args.sizes.split(",") if value.strip()]
+
+    def cases():
+        yield from document_cases(modules, movies, people, user)
+        yield from key_cases(modules)
+        r = connect_redis(args.redis)
+        if r is None:
+            print("cache cases skipped: pip install fakeredis, or pass --redis host:port")
+        else:
+            yield from cache_cases(r, movies)
+        for size in sizes:
+            yield from list_cases(modules, movies, people, size)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            baseline = json.load(handle)["cases"]
+
+    results = {}
+    for case in cases():
+        if args.filter not in case.name:
+            continue
+        results[case.name] = measure(case, args.repeat)
+        print(report_line(case.name, results[case.name], baseline.get(case.name), args.threshold), flush=True)
+
+    if baseline:
+        compared = [name for name in results if name in baseline]
+        slower = [name for name in compared if results[name]["seconds"] > baseline[name]["seconds"] * (1 + args.threshold)]
+        faster = [name for name in compared if results[name]["seconds"] < baseline[name]["seconds"] * (1 - args.threshold)]
+        print(
+            f"\nagainst {os.path.relpath(args.baseline)}: {len(compared)} cases compared,"
+            f" {len(faster)} faster and {len(slower)} slower by more than {args.threshold:.0%}"
+        )
+        for name in slower:
+            print(f"  slower: {name}")
+
+    commit = git_commit()
+    output = args.output or os.path.join(RESULTS_DIR, f"hot-paths-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as handle:
+        json.dump(
+            {
+                "commit": commit,
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "redis": args.redis or "fakeredis",
+                "sizes": sizes,
+                "cases": results,
+            },
+            handle,
+            indent=2,
+        )
+    print(f"results saved to {os.path.relpath(output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,543 @@
+"""
+Load-test the movies, people and users APIs with the request mix of the web app.
+
+Every client thread replays sessions picked from SCENARIOS by weight:
+
+    home          the three card rails (/movies-series, /movies, /series)
+    movie_detail  a title, its cast & crew through /people/lookup and its
+                  "more like this" rail
+    actor_page    a person and their known-for titles through /movies-series/batch
+    profile       /myprofile, the first page of /mylist with cards and /myfriends
+
+Follow-up requests are built from the previous responses, as the pages do,
+and titles, people and users are drawn with a Zipf skew (--skew), so the
+cache sees a realistic mix of hot and cold keys.
+
+The services run in this process on local HTTP servers, backed by either
+  --backend fake   in-memory Mongo and Redis (pip install mongomock fakeredis),
+                   seeded with a synthetic catalog of --movies/--people/--users;
+  --backend local  the Mongo and Redis of MONGO_URI / REDIS_HOST; --seed
+                   replaces their collections with the synthetic catalog.
+With --movies-url, --people-url and --users-url the harness drives already
+running services instead (e.g. docker compose) and --user-ids names the users.
+
+Client threads share the interpreter with in-process services, so compare
+numbers between commits on the same machine rather than reading them as
+production capacity. Usage (from the repository root):
+
+    python benchmarks/load_test.py --concurrency 16 --duration 30
+    python benchmarks/load_test.py --baseline benchmarks/results/load-<commit>.json
+
+Latency percentiles, requests/s and the cache hit ratio of every route (from
+each service's /metrics) are printed and saved as JSON under
+benchmarks/results/.
+"""
+
+import argparse
+import bisect
+import http.client
+import itertools
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict, namedtuple
+from urllib.parse import urlencode, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+SERVICES = {
+    "movies": ("api_movies_series", "movies_series"),
+    "people": ("api_people", "people"),
+    "users": ("api_users", "users"),
+}
+DEFAULT_MIX = "home=3,movie_detail=4,actor_page=2,profile=1"
+
+# One HTTP call of a scenario; `route` is the template results are grouped by.
+Call = namedtuple("Call", ["service", "method", "path", "route", "body"], defaults=[None])
+
+
+def get(service, route, path, **query):
+    query = {name: value for name, value in query.items() if value is not None}
+    return Call(service, "GET", f"{path}?{urlencode(query)}" if query else path, route)
+
+
+class Catalog:
+    """Ids the scenarios draw from, the first ones being the most popular."""
+
+    def __init__(self, movie_ids, person_ids, user_ids, skew):
+        self.movie_ids = movie_ids
+        self.person_ids = person_ids
+        self.user_ids = user_ids
+        self._weights = {}
+        self.skew = skew
+
+    def pick(self, rng, ids):
+        weights = self._weights.get(len(ids))
+        if weights is None:
+            weights = self._weights[len(ids)] = list(
+                itertools.accumulate(1.0 / rank ** self.skew for rank in range(1, len(ids) + 1))
+            )
+        return ids[min(bisect.bisect(weights, rng.random() * weights[-1]), len(ids) - 1)]
+
+
+# ---- Scenarios: generators yielding Calls and receiving the decoded responses.
+def home(rng, catalog):
+    yield get("movies", "GET /movies-series", "/movies-series", fields="card", limit=20)
+    yield get("movies", "GET /movies", "/movies", fields="card", limit=20)
+    yield get("movies", "GET /series", "/series", fields="card", limit=20)
+
+
+def movie_detail(rng, catalog):
+    movie_id = catalog.pick(rng, catalog.movie_ids)
+    movie = yield get("movies", "GET /movies-series/<movie_id>", f"/movies-series/{movie_id}")
+    names = list((movie or {}).get("first_four_actors") or []) + list((movie or {}).get("directors") or [])
+    if names:
+        yield Call("people", "POST", "/people/lookup", "POST /people/lookup", {"names": names})
+    yield get(
+        "movies", "GET /movies-series/<movie_id>/similar", f"/movies-series/{movie_id}/similar", fields="card"
+    )
+
+
+def actor_page(rng, catalog):
+    person_id = catalog.pick(rng, catalog.person_ids)
+    person = yield get("people", "GET /people/<id>", f"/people/{person_id}")
+    movie_ids = list(dict.fromkeys(
+        entry["_id"] for entry in (person or {}).get("movie") or [] if isinstance(entry, dict) and entry.get("_id")
+    ))
+    if movie_ids:
+        yield get("movies", "GET /movies-series/batch", "/movies-series/batch", ids=",".join(movie_ids), fields="card")
+
+
+def profile(rng, catalog):
+    user_id = catalog.pick(rng, catalog.user_ids)
+    yield get("users", "GET /myprofile", "/myprofile", user_id=user_id)
+    yield get("users", "GET /mylist", "/mylist", user_id=user_id, limit=20, expand="card")
+    yield get("users", "GET /myfriends", "/myfriends", user_id=user_id, limit=20)
+
+
+SCENARIOS = {
+    "home": home,
+    "movie_detail": movie_detail,
+    "actor_page": actor_page,
+    "profile": profile,
+}
+
+
+# ---- Synthetic catalog ---------------------------------------------------------
+def synthetic_catalog(n_movies, n_people, n_users, seed=0):
+    """Movies, people and users cloned from data/ with fresh ids and cross-references."""
+    rng = random.Random(seed)
+    with open(os.path.join(ROOT, "data", "movies_data.json"), encoding="utf-8") as handle:
+        seed_movies = json.load(handle)
+    with open(os.path.join(ROOT, "data", "people_data.json"), encoding="utf-8") as handle:
+        seed_people = json.load(handle)["people"]
+    with open(os.path.join(ROOT, "data", "users_data.json"), encoding="utf-8") as handle:
+        seed_user = json.load(handle)
+
+    names = [
+        seed_people[index % len(seed_people)]["name"] + ("" if index < len(seed_people) else f" {index}")
+        for index in range(n_people)
+    ]
+    keywords = [f"keyword-{index}" for index in range(max(n_movies // 4, 50))]
+
+    movies = []
+    for index in range(n_movies):
+        base = seed_movies[index % len(seed_movies)]
+        cast = rng.sample(names, min(8, len(names)))
+        movies.append({
+            **base,
+            "_id": f"ms{index + 1:012d}",
+            "imdb_id": f"tt{9000000 + index}",
+            "title": base["title"] + ("" if index < len(seed_movies) else f" {index}"),
+            "first_four_actors": cast[:4],
+            "main_actors": cast,
+            "directors": rng.sample(names, 1),
+            "keywords": list(base.get("keywords") or []) + rng.sample(keywords, 3),
+        })
+
+    people = []
+    for index, name in enumerate(names):
+        base = seed_people[index % len(seed_people)]
+        known_for = rng.sample(movies, min(rng.randint(3, 8), len(movies)))
+        people.append({
+            **base,
+            "_id": f"p{index + 1:012d}",
+            "imdb_name_id": f"nm{9000000 + index}",
+            "name": name,
+            "movie": [{"_id": movie["_id"], "title": movie["title"]} for movie in known_for],
+        })
+
+    users = []
+    user_ids = [f"u{index + 1:012d}" for index in range(n_users)]
+    for index, user_id in enumerate(user_ids):
+        favorites = rng.sample(movies, min(30, len(movies)))
+        friends = rng.sample(user_ids, min(10, len(user_ids)))
+        users.append({
+            **seed_user,
+            "_id": user_id,
+            "imdb_user_id": f"ur{90000000 + index}",
+            "username": f"{seed_user['username']}_{index}",
+            "favorites": [{"_id": movie["_id"]} for movie in favorites],
+            "friends": [{"_id": friend_id} for friend_id in friends if friend_id != user_id],
+        })
+    return movies, people, users
+
+
+def seed_databases(mongo, movies, people, users, modules):
+    """Replace the services' collections with the synthetic catalog."""
+    movies_module, people_module, users_module = modules["movies"], modules["people"], modules["users"]
+    for doc in movies:
+        doc[movies_module.LIST_KIND_FIELD] = movies_module.list_kind(doc)
+    for doc in people:
+        doc["name_normalized"] = people_module.normalize_name(doc["name"])
+    for doc in users:
+        doc[users_module.ID_KEYS_FIELD] = users_module.canonical_id_keys(doc)
+
+    for database, collection, documents in (
+        ("api_movies_series", "movies_series", movies),
+        ("api_people", "people", people),
+        ("api_users", "users", users),
+    ):
+        mongo[database][collection].drop()
+        mongo[database][collection].insert_many(documents)
+
+
+# ---- Services ------------------------------------------------------------------
+def use_fakes():
+    """Point the shared clients at in-memory Mongo and Redis for this process."""
+    try:
+        import fakeredis
+        import mongomock
+    except ImportError:
+        sys.exit("--backend fake needs mongomock and fakeredis: pip install mongomock fakeredis")
+
+    from common import clients
+    from common.metrics import InstrumentedRedis
+
+    # Keeps the Redis timings of the real client.
+    fake_redis = type("FakeInstrumentedRedis", (InstrumentedRedis, fakeredis.FakeRedis), {})
+    clients._clients.update(pid=os.getpid(), mongo=mongomock.MongoClient(), redis=fake_redis())
+
+
+def start_services(backend, seed, sizes):
+    """Serve the three apps on local ports; returns {service: base URL}."""
+    from werkzeug.serving import make_server
+
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    if backend == "fake":
+        os.environ["PREPARE_DATABASE"] = "0"
+    sys.path.insert(0, os.path.join(ROOT, "api"))
+    for directory, _ in SERVICES.values():
+        sys.path.insert(0, os.path.join(ROOT, "api", directory))
+    if backend == "fake":
+        use_fakes()
+
+    import importlib
+
+    from common.clients import get_mongo
+
+    modules = {service: importlib.import_module(module) for service, (_, module) in SERVICES.items()}
+    if backend == "fake" or seed:
+        seed_databases(get_mongo(), *synthetic_catalog(*sizes), modules)
+
+    urls = {}
+    for service, module in modules.items():
+        app = module.create_app()
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, name=f"serve-{service}", daemon=True).start()
+        urls[service] = f"http://127.0.0.1:{server.server_port}"
+    return urls
+
+
+# ---- Client --------------------------------------------------------------------
+class Connections:
+    def __init__(self, urls):
+        self.urls = {service: urlsplit(url) for service, url in urls.items()}
+        self.open = {}
+
+    def request(self, call):
+        connection = self.open.get(call.service)
+        if connection is None:
+            parts = self.urls[call.service]
+            connection = self.open[call.service] = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+        body = json.dumps(call.body) if call.body is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        try:
+            connection.request(call.method, call.path, body=body, headers=headers)
+            response = connection.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            self.open.pop(call.service, None)
+            raise
+
+    def close(self):
+        for connection in self.open.values():
+            connection.close()
+
+
+def percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] if samples else float("nan")
+
+
+def run_load(urls, catalog, mix, concurrency, duration, seed=0):
+    """Replay sessions for `duration` seconds; returns per-route and per-scenario samples."""
+    names = list(mix)
+    cumulative = list(itertools.accumulate(mix[name] for name in names))
+    deadline = time.monotonic() + duration
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    sessions = defaultdict(int)
+    lock = threading.Lock()
+
+    def worker(worker_seed):
+        rng = random.Random(worker_seed)
+        connections = Connections(urls)
+        local_samples, local_errors, local_sessions = defaultdict(list), defaultdict(int), defaultdict(int)
+        while time.monotonic() < deadline:
+            name = names[bisect.bisect(cumulative, rng.random() * cumulative[-1])]
+            scenario = SCENARIOS[name](rng, catalog)
+            local_sessions[name] += 1
+            response = None
+            try:
+                while True:
+                    call = scenario.send(response)
+                    started = time.perf_counter()
+                    try:
+                        status, body = connections.request(call)
+                    except (OSError, http.client.HTTPException):
+                        local_errors[call.route] += 1
+                        break
+                    local_samples[call.route].append(time.perf_counter() - started)
+                    if status >= 400:
+                        local_errors[call.route] += 1
+                        break
+                    response = json.loads(body) if body else None
+            except StopIteration:
+                pass
+        connections.close()
+        with lock:
+            for route, values in local_samples.items():
+                samples[route].extend(values)
+            for route, count in local_errors.items():
+                errors[route] += count
+            for name, count in local_sessions.items():
+                sessions[name] += count
+
+    threads = [threading.Thread(target=worker, args=(seed * 1000 + index,)) for index in range(concurrency)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, errors, sessions, time.monotonic() - started
+
+
+# ---- Cache hit ratios from /metrics --------------------------------------------
+CACHE_HIT_RESULTS = ("l1_hit", "l2_hit")
+CACHE_LOOKUP_RESULTS = ("l1_hit", "l2_hit", "miss")
+
+
+def scrape_cache_counts(urls):
+    """{(route, result): count} of cache_requests_total summed over the distinct /metrics endpoints."""
+    from prometheus_client.parser import text_string_to_metric_families
+
+    counts = defaultdict(float)
+    for url in dict.fromkeys(urls):
+        parts = urlsplit(url)
+        connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=10)
+        connection.request("GET", "/metrics")
+        text = connection.getresponse().read().decode()
+        connection.close()
+        for family in text_string_to_metric_families(text):
+            for sample in family.samples:
+                if sample.name == "cache_requests_total":
+                    counts[(sample.labels["route"], sample.labels["result"])] += sample.value
+    return counts
+
+
+def cache_hit_ratios(before, after):
+    """{Flask route template: hit ratio} from two scrapes."""
+    lookups, hits = defaultdict(float), defaultdict(float)
+    for (route, result), value in after.items():
+        delta = value - before.get((route, result), 0.0)
+        if result in CACHE_LOOKUP_RESULTS:
+            lookups[route] += delta
+        if result in CACHE_HIT_RESULTS:
+            hits[route] += delta
+    return {route: hits[route] / lookups[route] for route in lookups if lookups[route]}
+
+
+def flask_route(route):
+    """'GET /movies-series/<movie_id>' -> '/movies-series/<movie_id>' (the metrics label)."""
+    return route.split(" ", 1)[1]
+
+
+# ---- Reporting -----------------------------------------------------------------
+def summarize(samples, errors, sessions, elapsed, ratios):
+    routes = {}
+    for route in sorted(set(samples) | set(errors)):
+        latencies = sorted(samples.get(route, []))
+        routes[route] = {
+            "requests": len(latencies),
+            "errors": errors.get(route, 0),
+            "rps": len(latencies) / elapsed,
+            "p50_ms": percentile(latencies, 0.50) * 1e3,
+            "p95_ms": percentile(latencies, 0.95) * 1e3,
+            "p99_ms": percentile(latencies, 0.99) * 1e3,
+            "cache_hit_ratio": ratios.get(flask_route(route)),
+        }
+    latencies = sorted(value for values in samples.values() for value in values)
+    total = {
+        "requests": len(latencies),
+        "errors": sum(errors.values()),
+        "rps": len(latencies) / elapsed,
+        "sessions_per_s": sum(sessions.values()) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1e3,
+        "p95_ms": percentile(latencies, 0.95) * 1e3,
+        "p99_ms": percentile(latencies, 0.99) * 1e3,
+    }
+    return routes, total, dict(sessions)
+
+
+def print_report(routes, total, baseline=None):
+    base_routes = (baseline or {}).get("routes", {})
+    print(f"{'route':<40} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'hit %':>6} {'err':>5}")
+    for route, result in routes.items():
+        ratio = result["cache_hit_ratio"]
+        line = (
+            f"{route:<40} {result['rps']:8.1f} {result['p50_ms']:8.2f} {result['p95_ms']:8.2f}"
+            f" {result['p99_ms']:8.2f} {'-' if ratio is None else f'{ratio * 100:.0f}':>6} {result['errors']:5d}"
+        )
+        previous = base_routes.get(route)
+        if previous:
+            line += (
+                f"   p95 {delta(result['p95_ms'], previous['p95_ms'])}"
+                f" rps {delta(result['rps'], previous['rps'])}"
+            )
+        print(line)
+    print(
+        f"{'total':<40} {total['rps']:8.1f} {total['p50_ms']:8.2f} {total['p95_ms']:8.2f}"
+        f" {total['p99_ms']:8.2f} {'':>6} {total['errors']:5d}"
+    )
+
+
+def delta(current, previous):
+    if not previous:
+        return "n/a"
+    return f"{(current - previous) / previous * 100:+.0f}%"
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def discover_catalog(urls, user_ids, skew):
+    """Title and people ids from the services' own list routes."""
+    connections = Connections(urls)
+    _, body = connections.request(get("movies", "", "/movies-series", fields="card"))
+    movie_ids = [doc["_id"] for doc in json.loads(body)]
+    _, body = connections.request(get("people", "", "/people", fields="card"))
+    person_ids = [doc["_id"] for doc in json.loads(body)]
+    connections.close()
+    return Catalog(movie_ids, person_ids, user_ids, skew)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--backend", choices=("fake", "local"), default="fake")
+    parser.add_argument("--seed", action="store_true", help="with --backend local, replace its data")
+    parser.add_argument("--movies-url")
+    parser.add_argument("--people-url")
+    parser.add_argument("--users-url")
+    parser.add_argument("--user-ids", default="u000000000001", help="comma-separated, for external services")
+    parser.add_argument("--movies", type=int, default=2000)
+    parser.add_argument("--people", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent of id popularity")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--output", help="result file (default benchmarks/results/load-<commit>.json)")
+    parser.add_argument("--baseline", help="earlier result file to compare against")
+    args = parser.parse_args()
+
+    external = {"movies": args.movies_url, "people": args.people_url, "users": args.users_url}
+    if any(external.values()):
+        if not all(external.values()):
+            parser.error("--movies-url, --people-url and --users-url go together")
+        urls, backend = external, "external"
+        user_ids = [value.strip() for value in args.user_ids.split(",") if value.strip()]
+        metrics_urls = list(urls.values())
+    else:
+        urls, backend = start_services(args.backend, args.seed, (args.movies, args.people, args.users)), args.backend
+        user_ids = [f"u{index + 1:012d}" for index in range(args.users)]
+        if args.backend == "local" and not args.seed:
+            user_ids = [value.strip() for value in args.user_ids.split(",") if value.strip()]
+        # One process: the three apps share a single metrics registry.
+        metrics_urls = [urls["movies"]]
+
+    catalog = discover_catalog(urls, user_ids, args.skew)
+    print(
+        f"{backend}: {len(catalog.movie_ids)} titles, {len(catalog.person_ids)} people, {len(user_ids)} users;"
+        f" {args.concurrency} clients for {args.duration:.0f} s"
+    )
+    if args.warmup:
+        run_load(urls, catalog, args.mix, args.concurrency, args.warmup, seed=1)
+
+    before = scrape_cache_counts(metrics_urls)
+    samples, errors, sessions, elapsed = run_load(urls, catalog, args.mix, args.concurrency, args.duration)
+    ratios = cache_hit_ratios(before, scrape_cache_counts(metrics_urls))
+    routes, total, sessions = summarize(samples, errors, sessions, elapsed, ratios)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            baseline = json.load(handle)
+    print_report(routes, total, baseline)
+
+    commit = git_commit()
+    results = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "backend": backend,
+        "concurrency": args.concurrency,
+        "duration_s": elapsed,
+        "mix": args.mix,
+        "skew": args.skew,
+        "catalog": {"movies": len(catalog.movie_ids), "people": len(catalog.person_ids), "users": len(user_ids)},
+        "sessions": sessions,
+        "total": total,
+        "routes": routes,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"load-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as handle:
+        json.dump(results, handle, indent=2)
+    print(f"results saved to {os.path.relpath(output)}")
+
+
+if __name__ == "__main__":
+    main()
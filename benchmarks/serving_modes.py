@@ -0,0 +1,134 @@
+"""
+Load-test the movies API in its Flask and async serving modes side by side.
+
+Start both modes against the same Mongo and Redis, e.g.:
+
+    cd api/api_movies_series
+    export PYTHONPATH=..
+    flask --app movies_series run --port 5000 --with-threads
+    hypercorn "movies_series_async:create_app()" --bind 127.0.0.1:5010
+
+then run (from the repository root):
+
+    python benchmarks/serving_modes.py --flask http://127.0.0.1:5000 \\
+        --async http://127.0.0.1:5010 --concurrency 64 --duration 20
+
+Every client thread keeps one connection open and replays a mix of list,
+page, detail and batch requests; latencies are measured per request.
+"""
+
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+DEFAULT_MIX = [
+    ("/movies-series?fields=card", 1),
+    ("/movies-series?limit=20", 2),
+    ("/movies-series/{id}", 4),
+    ("/movies-series/{id}?fields=card", 4),
+    ("/movies-series/batch?ids={ids}&fields=card", 3),
+]
+
+
+def percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] if samples else float("nan")
+
+
+def discover_ids(base_url):
+    parts = urlsplit(base_url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=10)
+    connection.request("GET", "/movies-series?fields=card")
+    documents = json.loads(connection.getresponse().read())
+    connection.close()
+    return [document["_id"] for document in documents]
+
+
+def run_mode(base_url, paths, concurrency, duration):
+    parts = urlsplit(base_url)
+    deadline = time.monotonic() + duration
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    def worker(seed):
+        rng = random.Random(seed)
+        connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+        local, failed = [], 0
+        while time.monotonic() < deadline:
+            path = rng.choice(paths)
+            started = time.perf_counter()
+            try:
+                connection.request("GET", path)
+                response = connection.getresponse()
+                response.read()
+                if response.status >= 400:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                connection.close()
+                connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+                continue
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(concurrency)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1e3,
+        "p95_ms": percentile(latencies, 0.95) * 1e3,
+        "p99_ms": percentile(latencies, 0.99) * 1e3,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--flask", default="http://127.0.0.1:5000")
+    parser.add_argument("--async", dest="async_url", default="http://127.0.0.1:5010")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--batch-size", type=int, default=10)
+    args = parser.parse_args()
+
+    ids = discover_ids(args.flask)
+    rng = random.Random(0)
+    paths = []
+    for template, weight in DEFAULT_MIX:
+        for _ in range(weight * 25):
+            paths.append(template.format(
+                id=rng.choice(ids),
+                ids=",".join(rng.sample(ids, min(args.batch_size, len(ids)))),
+            ))
+
+    results = {}
+    for mode, url in (("flask", args.flask), ("async", args.async_url)):
+        # Warm the caches and connection pools before measuring.
+        run_mode(url, paths, min(args.concurrency, 8), 2)
+        results[mode] = run_mode(url, paths, args.concurrency, args.duration)
+
+    print(f"{args.concurrency} concurrent clients, {args.duration:.0f} s per mode")
+    print(f"{'mode':>6} {'rps':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for mode, result in results.items():
+        print(
+            f"{mode:>6} {result['rps']:9.1f} {result['p50_ms']:8.2f} {result['p95_ms']:8.2f}"
+            f" {result['p99_ms']:8.2f} {result['errors']:7d}"
+        )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Measure the "more like this" index of the movies API on a synthetic catalog.
+
+The catalog mimics the seed data: every title gets as many values per field
+as the seed documents have on average, drawn from power-law vocabularies
+(a few very common genres, a long tail of actors and keywords).
+
+Usage (from the repository root, with the service requirements installed):
+
+    python benchmarks/similarity.py --size 100000 --queries 2000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "api", "api_movies_series"))
+
+from similarity import SimilarityIndex, full_scores, top_k  # noqa: E402
+
+# field: (vocabulary size as a fraction of the catalog, minimum size,
+#         values per title, power-law exponent)
+FIELD_SHAPES = {
+    "genres": (0.0, 25, 3, 1.0),
+    "genre_interests": (0.0, 400, 16, 1.0),
+    "keywords": (0.3, 1000, 5, 0.7),
+    "directors": (0.05, 100, 1, 0.7),
+    "main_actors": (0.5, 1000, 17, 0.7),
+}
+
+
+def synthetic_catalog(size, seed=0):
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for field, (ratio, minimum, per_title, exponent) in FIELD_SHAPES.items():
+        vocabulary = max(int(size * ratio), minimum)
+        weights = 1.0 / np.arange(1, vocabulary + 1) ** exponent
+        columns[field] = rng.choice(vocabulary, size=(size, per_title), p=weights / weights.sum())
+
+    for index in range(size):
+        document = {"_id": f"ms{index:012d}", "imdb_id": f"tt{index:07d}"}
+        for field, values in columns.items():
+            document[field] = [f"{field}-{value}" for value in values[index]]
+        yield document
+
+
+def percentile(samples, fraction):
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--inserts", type=int, default=500)
+    args = parser.parse_args()
+
+    catalog = list(synthetic_catalog(args.size + args.inserts))
+    index = SimilarityIndex()
+    started = time.perf_counter()
+    index.build(catalog[:args.size])
+    print(f"build: {args.size} titles in {time.perf_counter() - started:.2f} s")
+
+    rng = np.random.default_rng(1)
+    query_ids = [catalog[row]["_id"] for row in rng.integers(0, args.size, args.queries)]
+    index.similar(query_ids[0], args.limit)
+
+    latencies = []
+    for movie_id in query_ids:
+        started = time.perf_counter()
+        index.similar(movie_id, args.limit)
+        latencies.append(time.perf_counter() - started)
+    print(
+        f"single: p50 {percentile(latencies, 0.5) * 1e3:.3f} ms"
+        f"  p95 {percentile(latencies, 0.95) * 1e3:.3f} ms"
+        f"  p99 {percentile(latencies, 0.99) * 1e3:.3f} ms"
+    )
+
+    started = time.perf_counter()
+    index.similar_many(query_ids, args.limit)
+    per_query = (time.perf_counter() - started) / len(query_ids)
+    print(f"batched: {per_query * 1e3:.3f} ms/query")
+
+    # Share of the exact top-k (a full scan of the catalog) the index returns.
+    found = total = 0
+    for movie_id in query_ids[:200]:
+        row = index._rows[movie_id]
+        rows, _ = top_k(*full_scores(index._base, index._row_cols[row], index._row_weights[row]), args.limit + 1)
+        exact = {index._ids[other] for other in rows if other != row}
+        found += len(exact & {other for other, _ in index.similar(movie_id, args.limit)})
+        total += len(exact)
+    print(f"recall@{args.limit} vs full scan: {found / max(total, 1):.3f}")
+
+    started = time.perf_counter()
+    for document in catalog[args.size:]:
+        index.add(document)
+    per_insert = (time.perf_counter() - started) / max(args.inserts, 1)
+    print(f"insert: {per_insert * 1e3:.3f} ms/title ({len(index)} titles indexed)")
+
+    latencies = []
+    for movie_id in query_ids[:200]:
+        started = time.perf_counter()
+        index.similar(movie_id, args.limit)
+        latencies.append(time.perf_counter() - started)
+    print(f"single after inserts: p50 {percentile(latencies, 0.5) * 1e3:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -126,40 +126,21 @@ const MoviePeople = ({ movie }) => {
         setIsLoading(true);
         setError(null);
 
-        const results = await Promise.all(
-          uniqueNames.map(async (name) => {
-            try {
-              const params = new URLSearchParams({
-                q: name,
-                limit: '1',
-              });
-              const response = await fetch(
-                buildPeopleUrl(`/people?${params.toString()}`),
-                {
-                  signal: controller.signal,
-                },
-              );
-
-              if (!response.ok) {
-                throw new Error(`Failed to load data for ${name}`);
-              }
-
-              const payload = await response.json();
-              const person =
-                Array.isArray(payload) && payload.length > 0
-                  ? payload[0]
-                  : null;
-              return [name, person];
-            } catch (fetchError) {
-              console.warn(fetchError);
-              return [name, null];
-            }
-          }),
-        );
+        const response = await fetch(buildPeopleUrl('/people/lookup'), {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ names: uniqueNames }),
+          signal: controller.signal,
+        });
+
+        if (!response.ok) {
+          throw new Error('Failed to load cast & crew profiles');
+        }
 
+        const payload = await response.json();
         if (!cancelled) {
-          const nextProfiles = results.reduce((acc, [name, person]) => {
-            acc[name] = person;
+          const nextProfiles = uniqueNames.reduce((acc, name) => {
+            acc[name] = payload?.[name] ?? null;
             return acc;
           }, {});
           setProfiles(nextProfiles);
@@ -3,6 +3,9 @@ import { Link, useParams } from 'react-router-dom';
 import PersonDetail from '../components/PersonDetail';
 import { buildPeopleUrl, buildMoviesUrl } from '../config';
 
+// MAX_BATCH_IDS of the movies API.
+const MOVIES_BATCH_SIZE = 100;
+
 const ActorDetailPage = () => {
   const { actorId } = useParams();
   const [person, setPerson] = useState(null);
@@ -69,31 +72,39 @@ const ActorDetailPage = () => {
 
     const loadKnownFor = async () => {
       try {
-        const uniqueMovies = Array.from(
-          new Map(
-            person.movie
-              .filter((entry) => entry?._id)
-              .map((entry) => [entry._id, entry]),
-          ).values(),
+        const uniqueIds = Array.from(
+          new Set(
+            person.movie.filter((entry) => entry?._id).map((entry) => entry._id),
+          ),
         );
+        if (uniqueIds.length === 0) {
+          setKnownForDetails([]);
+          return;
+        }
 
-        const results = await Promise.all(
-          uniqueMovies.map(async (entry) => {
-            const endpoint = buildMoviesUrl(`/movies-series/${entry._id}`);
-            try {
-              const response = await fetch(endpoint, {
-                signal: controller.signal,
-              });
-              if (!response.ok) {
-                return null;
-              }
-              return await response.json();
-            } catch (movieErr) {
-              console.warn(movieErr);
-              return null;
+        // The batch endpoint takes at most MOVIES_BATCH_SIZE ids per request.
+        const batches = [];
+        for (let start = 0; start < uniqueIds.length; start += MOVIES_BATCH_SIZE) {
+          batches.push(uniqueIds.slice(start, start + MOVIES_BATCH_SIZE));
+        }
+        const pages = await Promise.all(
+          batches.map(async (ids) => {
+            const params = new URLSearchParams({
+              ids: ids.join(','),
+              fields: 'card',
+            });
+            const response = await fetch(
+              buildMoviesUrl(`/movies-series/batch?${params.toString()}`),
+              { signal: controller.signal },
+            );
+            if (!response.ok) {
+              throw new Error('Unable to load known-for titles');
             }
+            const payload = await response.json();
+            return Array.isArray(payload?.items) ? payload.items : [];
           }),
         );
+        const results = pages.flat();
 
         if (!cancelled) {
           setKnownForDetails(results.filter(Boolean));
@@ -8,6 +8,10 @@ if (db.movies_series.countDocuments() === 0) {
   const movies = JSON.parse(fs.readFileSync(filePath, 'utf-8'));
 
   if (Array.isArray(movies) && movies.length > 0) {
+    // list_kind() of api/api_movies_series/movies_series.py.
+    movies.forEach((movie) => {
+      movie.list_kind = String(movie.imdb_type || '').toLowerCase() === 'movie' ? 'movies' : 'series';
+    });
     db.movies_series.insertMany(movies);
     print(`Inserted ${movies.length} movies/series documents.`);
   } else {
@@ -3,6 +3,18 @@ const fs = require('fs');
 
 db = db.getSiblingDB('api_people');
 
+// normalize_name() of api/api_people/people.py: case-fold, strip accents and
+// collapse whitespace. `flask --app people backfill-names` recomputes it.
+function normalizeName(name) {
+  return String(name || '')
+    .normalize('NFKD')
+    .replace(/\p{Mn}/gu, '')
+    .toLowerCase()
+    .split(/\s+/)
+    .filter(Boolean)
+    .join(' ');
+}
+
 if (db.people.countDocuments() === 0) {
   const filePath = '/docker-entrypoint-initdb.d/people_data.json';
   const payload = JSON.parse(fs.readFileSync(filePath, 'utf-8'));
@@ -14,6 +26,7 @@ if (db.people.countDocuments() === 0) {
   }
 
   if (people.length > 0) {
+    people = people.map((person) => ({ ...person, name_normalized: normalizeName(person.name) }));
     db.people.insertMany(people);
     print(`Inserted ${people.length} people documents.`);
   } else {
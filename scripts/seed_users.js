@@ -16,6 +16,12 @@ if (db.users.countDocuments() === 0) {
   }
 
   if (users.length > 0) {
+    // canonical_id_keys() of api/api_users/users.py: the lower-cased _id and
+    // imdb_user_id, which user lookups match.
+    users.forEach((user) => {
+      const keys = [user._id, user.imdb_user_id].filter(Boolean).map((id) => String(id).trim().toLowerCase());
+      user.id_keys = [...new Set(keys)].sort();
+    });
     db.users.insertMany(users);
     print(`Inserted ${users.length} user documents.`);
   } else {